@@ -1,19 +1,25 @@
 import gradio as gr
 from main import TextToLayoutPipeline
+from src.ratelimit import INTERACTIVE, request_priority
 from PIL import Image
 import os
+import threading
 
-# initialize the layout pipeline once
+# initialize the layout pipeline once; models and data load lazily
 enabled_pipeline = TextToLayoutPipeline()
 
 def generate_layout(user_text: str):
-    # run the pipeline to generate and save the layout image
-    enabled_pipeline.run(user_text=user_text)
+    # run the pipeline to generate and save the layout image; a user is
+    # waiting, so its model calls go ahead of queued batch work
+    with request_priority(INTERACTIVE):
+        enabled_pipeline.run(user_text=user_text)
     output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", "output_poster.png")
     # load the generated image and return it for display
     return Image.open(output_path)
 
 if __name__ == "__main__":
+    # load data and models in the background while the interface comes up
+    threading.Thread(target=enabled_pipeline.warmup, daemon=True).start()
     # create and launch the Gradio interface
     iface = gr.Interface(
         fn=generate_layout,
@@ -22,4 +28,4 @@ if __name__ == "__main__":
         title="Text-to-Layout Generator",
         description="Enter a description of the layout you want, and generate a poster image."
     )
-    iface.launch(share=True)
\ No newline at end of file
+    iface.launch(share=True)
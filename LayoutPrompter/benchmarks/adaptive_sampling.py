@@ -0,0 +1,66 @@
+"""
+Output tokens of a fixed n=num_return request vs the adaptive sampler against
+the local stub server, whose answers fail to parse at `failure_rate`.
+Reports valid layouts per prompt, how often fewer than `min_layouts` came
+back, follow-ups and the tokens the sampler reports as saved.
+
+    python -m benchmarks.adaptive_sampling --num_prompts 200 --failure_rate 0.2
+"""
+import argparse
+import os
+import statistics
+
+from benchmarks.stub_server import start_stub_server
+
+
+class UsageMeter:
+    """
+    Wraps call_model and sums the usage the server reports.
+    """
+
+    def __init__(self, pipeline):
+        self.call_model = pipeline.call_model
+        self.tokens = 0
+        pipeline.call_model = self
+
+    def __call__(self, prompt, n=None, attempt=0):
+        response = self.call_model(prompt, n, attempt)
+        self.tokens += response.usage.total_tokens
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_prompts", type=int, default=200)
+    parser.add_argument("--num_return", type=int, default=10)
+    parser.add_argument("--min_layouts", type=int, default=5)
+    parser.add_argument("--failure_rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=0.0, chunk_delay=0.0, failure_rate=args.failure_rate)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    from main import TextToLayoutPipeline
+
+    prompt_text = "Generate a poster layout. " * 200
+    for name, kwargs in [
+        ("fixed n", {}),
+        ("adaptive", {"adaptive_sampling": True, "min_layouts": args.min_layouts}),
+    ]:
+        pipeline = TextToLayoutPipeline(dataset="webui", num_return=args.num_return, **kwargs)
+        meter = UsageMeter(pipeline)
+        counts = [
+            len(pipeline.get_layouts(f"{prompt_text}#{k}")) for k in range(args.num_prompts)
+        ]
+        short = sum(count < args.min_layouts for count in counts)
+        print(
+            f"{name:8s} layouts {statistics.mean(counts):5.2f}  below {args.min_layouts}: "
+            f"{short:3d}/{args.num_prompts}  tokens {meter.tokens}"
+        )
+        if pipeline.sampler is not None:
+            print("         ", pipeline.sampler.stats())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Recall@num_prompt and per-query latency of the IVF index against the exact
+TextToLayoutExemplarSelection.
+
+    python -m benchmarks.ann_recall --data dataset/webui/processed/text/train.pt
+    python -m benchmarks.ann_recall --size 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from src.ann import IVFIndex
+from src.selection import TextToLayoutExemplarSelection
+from src.utilities import read_pt
+
+
+def make_clustered_data(num_items: int, dim: int = 512, num_topics: int = 200, seed: int = 0):
+    # CLIP text embeddings are far from isotropic; mimic that with topic clusters
+    generator = torch.Generator().manual_seed(seed)
+    topics = torch.randn(num_topics, dim, generator=generator)
+    assign = torch.randint(num_topics, (num_items,), generator=generator)
+    embeddings = topics[assign] + 0.6 * torch.randn(num_items, dim, generator=generator)
+    embeddings /= embeddings.norm(dim=-1, keepdim=True)
+    embeddings = embeddings.to(torch.float16)
+    bboxes = torch.tensor([[10, 10, 50, 20], [10, 40, 80, 30]])
+    return [
+        {"embedding": embeddings[i : i + 1], "discrete_gold_bboxes": bboxes}
+        for i in range(num_items)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default=None)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--num_queries", type=int, default=200)
+    parser.add_argument("--num_prompt", type=int, default=10)
+    parser.add_argument("--num_lists", type=int, nargs="+", default=[None])
+    parser.add_argument("--num_probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    if args.data:
+        data = read_pt(args.data, map_location="cpu")
+    else:
+        data = make_clustered_data(args.size + args.num_queries)
+    train_data, queries = data[: -args.num_queries], data[-args.num_queries :]
+
+    exact = TextToLayoutExemplarSelection(
+        train_data=train_data,
+        candidate_size=-1,
+        num_prompt=args.num_prompt,
+        shuffle=False,
+    )
+    query_embeddings = [q["embedding"].reshape(-1).float().numpy() for q in queries]
+    latencies, truth = [], []
+    for query in queries:
+        start = time.perf_counter()
+        truth.append(set(exact._top_indices(exact.score(query)[0]).tolist()))
+        latencies.append(time.perf_counter() - start)
+    print(f"exact  items={len(train_data)}  p50={np.median(latencies) * 1e3:.2f}ms")
+
+    for num_lists in args.num_lists:
+        start = time.perf_counter()
+        index = IVFIndex.build(exact.train_embeddings, num_lists=num_lists)
+        print(
+            f"ivf    lists={index.num_lists}  build={time.perf_counter() - start:.1f}s"
+        )
+        for num_probe in args.num_probe:
+            if num_probe > index.num_lists:
+                break
+            latencies, hits = [], 0
+            for query, expected in zip(query_embeddings, truth):
+                start = time.perf_counter()
+                candidates, scores = index.probe(query, num_probe)
+                found = exact._top_indices(scores, candidates)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & set(found.tolist()))
+            recall = hits / sum(len(t) for t in truth)
+            print(
+                f"  probe={num_probe:<4d} recall@{args.num_prompt}={recall:.3f}  "
+                f"p50={np.median(latencies) * 1e3:.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
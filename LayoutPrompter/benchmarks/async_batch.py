@@ -0,0 +1,81 @@
+"""
+Throughput of TextToLayoutPipeline model calls against the local stub server:
+serial `call_model` + parse/rank (as `run` does) vs `run_batch`-style
+streaming with a concurrency limit. Checks that results come back in input
+order and match the serial ones.
+
+    python -m benchmarks.async_batch --num_prompts 200 --latency 0.2 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_server import start_stub_server
+
+
+def as_lists(result):
+    labels, bboxes = result
+    return labels.tolist(), bboxes.tolist()
+
+
+async def stream(pipeline, prompts, concurrency):
+    results, order = [], []
+    try:
+        async for i, result in pipeline.astream_prompts(
+            prompts, prompts, concurrency=concurrency, contents=False
+        ):
+            order.append(i)
+            results.append(result)
+    finally:
+        await pipeline.aclose()
+    return results, order
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_prompts", type=int, default=200)
+    parser.add_argument("--num_serial", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--num_return", type=int, default=10)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, jitter=args.jitter)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    from main import TextToLayoutPipeline
+
+    pipeline = TextToLayoutPipeline(dataset="webui", num_return=args.num_return)
+    prompts = [f"prompt #{k}" for k in range(args.num_prompts)]
+
+    start = time.perf_counter()
+    serial = [
+        pipeline._finish(prompt, False, response=pipeline.call_model(prompt))
+        for prompt in prompts[: args.num_serial]
+    ]
+    elapsed = time.perf_counter() - start
+    print(f"serial   {args.num_serial / elapsed:7.1f} prompts/s ({args.num_serial} prompts)")
+
+    server.num_requests = 0
+    start = time.perf_counter()
+    results, order = asyncio.run(stream(pipeline, prompts, args.concurrency))
+    elapsed = time.perf_counter() - start
+    print(
+        f"batched  {args.num_prompts / elapsed:7.1f} prompts/s ({args.num_prompts} prompts, "
+        f"concurrency {args.concurrency})"
+    )
+    assert order == list(range(args.num_prompts))
+    assert server.num_requests == args.num_prompts
+    # the stub answers by prompt, so both paths see the same responses
+    for expected, result in zip(serial, results):
+        assert (expected is None) == (result is None)
+        if expected is not None:
+            assert as_lists(expected) == as_lists(result)
+    print("results in input order and identical to the serial path")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Processor.process_batch (padded batch, array transforms) vs the per-item
+T.Compose path on random layouts, for every layout processor. Random
+transforms are reseeded before each path, so outputs must be equal field
+by field.
+
+    python -m benchmarks.batched_transforms --dataset rico --num_layouts 5000
+"""
+import argparse
+import random
+import time
+
+import torch
+
+from src.preprocess import create_processor
+from src.utilities import ID2LABEL
+
+TASKS = ["gent", "gents", "genr", "completion", "refinement"]
+
+
+def make_layouts(dataset: str, num_layouts: int, max_elements: int, seed: int = 0):
+    rng = random.Random(seed)
+    label_ids = list(ID2LABEL[dataset])
+    layouts = []
+    for _ in range(num_layouts):
+        n = rng.randint(1, max_elements)
+        # coarse grid so ties in the sort keys actually occur
+        bboxes = torch.tensor(
+            [[rng.randint(0, 10) / 10, rng.randint(0, 10) / 10, rng.randint(1, 5) / 10, rng.randint(1, 5) / 10] for _ in range(n)]
+        )
+        labels = torch.tensor([rng.choice(label_ids) for _ in range(n)])
+        layouts.append({"labels": labels, "bboxes": bboxes})
+    return layouts
+
+
+def assert_equal(expected, got, task):
+    assert len(expected) == len(got), task
+    for k, (a, b) in enumerate(zip(expected, got)):
+        assert a.keys() == b.keys(), (task, k)
+        for key in a:
+            assert a[key].dtype == b[key].dtype, (task, k, key)
+            assert a[key].shape == b[key].shape and torch.equal(a[key], b[key]), (task, k, key)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default="rico")
+    parser.add_argument("--num_layouts", type=int, default=5000)
+    parser.add_argument("--max_elements", type=int, default=25)
+    parser.add_argument("--batch_size", type=int, default=1024)
+    args = parser.parse_args()
+
+    layouts = make_layouts(args.dataset, args.num_layouts, args.max_elements)
+    for task in TASKS:
+        random.seed(0)
+        torch.manual_seed(0)
+        processor = create_processor(args.dataset, task)
+        start = time.perf_counter()
+        expected = [processor(data) for data in layouts]
+        per_item = time.perf_counter() - start
+
+        random.seed(0)
+        torch.manual_seed(0)
+        processor = create_processor(args.dataset, task)
+        start = time.perf_counter()
+        got = processor.process_batch(layouts, batch_size=args.batch_size)
+        batched = time.perf_counter() - start
+
+        assert_equal(expected, got, task)
+        print(f"{task:11s} per-item {per_item:6.2f}s  batched {batched:6.2f}s  ({per_item / batched:4.1f}x, equal)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Text-to-layout preprocessing: per-item CLIP encoding vs `process_batch` over
+batch sizes and torch thread counts. Batched embeddings are checked against
+per-item ones to float16 tolerance.
+
+    python -m benchmarks.clip_batch --data dataset/webui/train.json --limit 512
+"""
+import argparse
+import time
+
+import torch
+
+from src.preprocess import create_processor
+from src.utilities import read_json
+
+
+def make_raw_data(num_items: int):
+    types = ["title", "description", "button", "image", "logo"]
+    return [
+        {
+            "text": f"A landing page #{i}# for product number {i}, with a hero image and a sign up button.",
+            "canvas_width": 1280,
+            "elements": [
+                {"type": types[(i + j) % len(types)], "position": [10 * j, 40 * j, 300, 60]}
+                for j in range(1 + i % 5)
+            ],
+        }
+        for i in range(num_items)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default=None)
+    parser.add_argument("--limit", type=int, default=256)
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--num_threads", type=int, nargs="+", default=[torch.get_num_threads()])
+    args = parser.parse_args()
+
+    raw_data = read_json(args.data)[: args.limit] if args.data else make_raw_data(args.limit)
+    processor = create_processor("webui", "text")
+
+    start = time.perf_counter()
+    expected = [processor(rd) for rd in raw_data]
+    serial = time.perf_counter() - start
+    print(f"per-item          {len(raw_data) / serial:8.1f} items/s")
+
+    for num_threads in args.num_threads:
+        torch.set_num_threads(num_threads)
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            got = processor.process_batch(raw_data, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            error = max(
+                (a["embedding"].float() - b["embedding"].float()).abs().max().item()
+                for a, b in zip(expected, got)
+            )
+            assert error <= 1e-3, f"batched embeddings differ by {error}"
+            assert all(torch.equal(a["labels"], b["labels"]) for a, b in zip(expected, got))
+            print(
+                f"threads={num_threads:<3d} batch={batch_size:<4d} "
+                f"{len(raw_data) / elapsed:8.1f} items/s  max_abs_err={error:.1e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Load time and resident memory of a processed split: pickled `.pt` list vs the
+memory-mapped columnar format. Each measurement runs in a fresh interpreter.
+
+    python -m benchmarks.columnar_load --data dataset/webui/processed/text/train.pt
+    python -m benchmarks.columnar_load --size 50000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import torch
+
+from src.columnar import convert_pt_to_columnar
+from src.utilities import write_pt
+
+PROBE = """
+import json, resource, sys, time
+import numpy, torch  # imported up front so only the data load is timed
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+start = time.perf_counter()
+if sys.argv[1] == "pt":
+    from src.utilities import read_pt
+    data = read_pt(sys.argv[2], map_location="cpu")
+else:
+    from src.columnar import ColumnarDataset
+    data = ColumnarDataset(sys.argv[2])
+item = data[len(data) // 2]
+loaded = time.perf_counter() - start
+from src.selection import TextToLayoutExemplarSelection
+TextToLayoutExemplarSelection(data, candidate_size=-1, num_prompt=10)
+ready = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline
+print(json.dumps({"load": loaded, "ready": ready, "rss_mb": rss}))
+"""
+
+
+def make_split(num_items: int, seed: int = 0):
+    generator = torch.Generator().manual_seed(seed)
+    data = []
+    for i in range(num_items):
+        n = int(torch.randint(1, 20, (1,), generator=generator))
+        embedding = torch.randn(1, 512, generator=generator)
+        bboxes = torch.randint(0, 120, (n, 4), generator=generator)
+        data.append(
+            {
+                "text": f"synthetic web page {i} with a title, a button and some text.",
+                "embedding": (embedding / embedding.norm()).to(torch.float16),
+                "labels": torch.randint(0, 10, (n,), generator=generator),
+                "discrete_gold_bboxes": bboxes,
+                "discrete_bboxes": bboxes.clone(),
+            }
+        )
+    return data
+
+
+def measure(fmt, path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, fmt, path],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default=None)
+    parser.add_argument("--size", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dirname:
+        pt_filename = args.data
+        if pt_filename is None:
+            pt_filename = os.path.join(dirname, "train.pt")
+            write_pt(pt_filename, make_split(args.size))
+        columnar = convert_pt_to_columnar(pt_filename, os.path.join(dirname, "train.columnar"))
+        for fmt, path in (("pt", pt_filename), ("columnar", columnar)):
+            result = measure(fmt, path)
+            print(
+                f"{fmt:<9s} load={result['load'] * 1e3:8.1f}ms  "
+                f"ready={result['ready'] * 1e3:8.1f}ms  rss_growth={result['rss_mb']:7.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Content generation for the ranked layouts of one run against the local stub
+server: one generate_contents call per layout (before) vs
+TextToLayoutPipeline.generate_content (one concurrent request per distinct
+label multiset, cached). Label sets are drawn from a small pool, as model
+samples for one prompt mostly agree on them.
+
+    python -m benchmarks.content_batch --num_runs 5 --num_sets 3 --latency 0.5
+"""
+import argparse
+import os
+import random
+import time
+
+import torch
+
+from benchmarks.stub_server import start_stub_server
+
+
+def make_ranked(rng, label_pool, num_layouts):
+    ranked = []
+    for _ in range(num_layouts):
+        labels = list(rng.choice(label_pool))
+        rng.shuffle(labels)
+        ranked.append((torch.tensor(labels), torch.rand(len(labels), 4)))
+    return ranked
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_runs", type=int, default=5)
+    parser.add_argument("--num_layouts", type=int, default=10)
+    parser.add_argument("--num_sets", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    from main import TextToLayoutPipeline
+    from src.contents import generate_contents
+    from src.utilities import ID2LABEL
+
+    pipeline = TextToLayoutPipeline(dataset="webui")
+    rng = random.Random(0)
+    label_ids = list(ID2LABEL["webui"])
+    runs = []
+    for k in range(args.num_runs):
+        pool = [rng.sample(label_ids, rng.randint(2, 6)) for _ in range(args.num_sets)]
+        runs.append((f"poster #{k} about ghana chocolate", make_ranked(rng, pool, args.num_layouts)))
+
+    server.num_requests = 0
+    start = time.perf_counter()
+    for user_text, ranked in runs:
+        for labels, _ in ranked:
+            names = [ID2LABEL["webui"][l.item()] for l in labels]
+            generate_contents(user_text, names)
+    elapsed = time.perf_counter() - start
+    print(f"per layout  {elapsed / args.num_runs:.2f}s per run  requests {server.num_requests}")
+
+    for name in ("grouped", "cached"):
+        server.num_requests = 0
+        start = time.perf_counter()
+        outputs = [pipeline.generate_content(ranked, user_text) for user_text, ranked in runs]
+        elapsed = time.perf_counter() - start
+        print(f"{name:11s} {elapsed / args.num_runs:.2f}s per run  requests {server.num_requests}")
+
+    for (_, ranked), output in zip(runs, outputs):
+        for (labels, _), item in zip(ranked, output):
+            names = {ID2LABEL["webui"][l.item()] for l in labels}
+            assert set(item["content"]) == names
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
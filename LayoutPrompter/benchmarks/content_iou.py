@@ -0,0 +1,91 @@
+"""
+Content-aware exemplar scoring: bit-packed masks and exact box-union areas vs
+per-query rasterization with cv2.
+
+    python -m benchmarks.content_iou --size 10000
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from src.selection import ContentAwareExemplarSelection
+
+
+def make_posters(num_items: int, seed: int = 0):
+    generator = torch.Generator().manual_seed(seed)
+    width, height = ContentAwareExemplarSelection.canvas_width, ContentAwareExemplarSelection.canvas_height
+    posters = []
+    for _ in range(num_items):
+        n = int(torch.randint(1, 5, (1,), generator=generator))
+        lt = torch.rand(n, 2, generator=generator) * torch.tensor([width, height])
+        wh = torch.rand(n, 2, generator=generator) * torch.tensor([width, height]) / 2
+        content = torch.cat([lt, wh], dim=-1).long()
+        posters.append(
+            {
+                "discrete_content_bboxes": content,
+                "discrete_gold_bboxes": torch.tensor([[10, 10, 20, 20]]),
+            }
+        )
+    return posters
+
+
+def legacy_scores(selector, test_data):
+    scores = []
+    test_binary = selector._to_binary_image(test_data["discrete_content_bboxes"])
+    for data in selector.train_data:
+        train_binary = selector._to_binary_image(data["discrete_content_bboxes"])
+        intersection = cv2.bitwise_and(train_binary, test_binary)
+        union = cv2.bitwise_or(train_binary, test_binary)
+        scores.append((np.sum(intersection) + 1) / (np.sum(union) + 1))
+    return np.array(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--num_queries", type=int, default=5)
+    parser.add_argument("--downsample", type=int, default=2)
+    args = parser.parse_args()
+
+    train_data = make_posters(args.size)
+    queries = make_posters(args.num_queries, seed=1)
+
+    configs = [("mask", 1), ("mask", args.downsample), ("box", 1)]
+    selectors = {}
+    for mode, downsample in configs:
+        start = time.perf_counter()
+        selectors[(mode, downsample)] = ContentAwareExemplarSelection(
+            train_data=train_data,
+            candidate_size=-1,
+            num_prompt=10,
+            shuffle=False,
+            iou_mode=mode,
+            downsample=downsample,
+        )
+        print(f"build {mode:<4s} x{downsample}: {(time.perf_counter() - start) * 1e3:.0f}ms")
+
+    timings = {"legacy": []}
+    for query in queries:
+        start = time.perf_counter()
+        expected = legacy_scores(selectors[("mask", 1)], query)
+        timings["legacy"].append(time.perf_counter() - start)
+        for (mode, downsample), selector in selectors.items():
+            start = time.perf_counter()
+            if mode == "mask":
+                scores = selector._mask_scores(query["discrete_content_bboxes"])
+            else:
+                scores = selector._box_scores(query["discrete_content_bboxes"])
+            timings.setdefault(f"{mode} x{downsample}", []).append(time.perf_counter() - start)
+            error = np.abs(scores - expected).max()
+            if downsample == 1:
+                assert error == 0, f"{mode} scores differ from legacy by {error}"
+
+    for name, values in timings.items():
+        print(f"{name:<10s} p50={np.median(values) * 1e3:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Train-split metadata lookup of ContentAwareProcessor: per-poster DataFrame
+filter + eval (group_metadata=False) vs grouping the table once
+(group_metadata=True), on a synthetic PKU-style metadata table. Both modes
+must return identical labels and boxes.
+
+    python -m benchmarks.content_metadata --num_posters 10000
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import torch
+from pandas import DataFrame
+
+from src.preprocess import create_processor
+
+
+def make_metadata(num_posters: int, max_elements: int = 12, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(1, max_elements + 1, size=num_posters)
+    posters = np.repeat(np.arange(num_posters), counts)
+    rng.shuffle(posters)
+    num_rows = len(posters)
+    left, top = rng.integers(0, 400, size=num_rows), rng.integers(0, 600, size=num_rows)
+    right = left + rng.integers(1, 113, size=num_rows)
+    bottom = top + rng.integers(1, 150, size=num_rows)
+    return DataFrame(
+        {
+            "poster_path": [f"train/{i}.png" for i in posters],
+            # 0 marks rows the processor drops
+            "cls_elem": rng.integers(0, 4, size=num_rows),
+            "box_elem": [
+                f"[{l}, {t}, {r}, {b}]" for l, t, r, b in zip(left, top, right, bottom)
+            ],
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_posters", type=int, default=10000)
+    parser.add_argument("--num_legacy", type=int, default=1000)
+    args = parser.parse_args()
+
+    metadata = make_metadata(args.num_posters)
+    print(f"{args.num_posters} posters, {len(metadata)} rows")
+
+    grouped = create_processor("posterlayout", "content", metadata=metadata)
+    start = time.perf_counter()
+    grouped.poster_elements = grouped._group_metadata()
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    results = [grouped._train_elements(i) for i in range(args.num_posters)]
+    lookup = time.perf_counter() - start
+    print(f"grouped: build {build:.2f}s, {args.num_posters} lookups {lookup:.3f}s")
+
+    legacy = create_processor(
+        "posterlayout", "content", metadata=metadata, group_metadata=False
+    )
+    num_legacy = min(args.num_legacy, args.num_posters)
+    # the per-poster filter warns about reindexing a boolean key on every call
+    warnings.simplefilter("ignore", UserWarning)
+    start = time.perf_counter()
+    for i in range(num_legacy):
+        labels, bboxes = legacy._train_elements(i)
+        assert torch.equal(labels, results[i][0]), i
+        if len(labels) == 0:
+            # dropped by the processor either way
+            continue
+        assert bboxes.dtype == results[i][1].dtype and torch.equal(bboxes, results[i][1]), i
+    elapsed = time.perf_counter() - start
+    print(
+        f"legacy: {num_legacy} lookups {elapsed:.2f}s "
+        f"(~{elapsed / num_legacy * args.num_posters:.1f}s for all posters), outputs match"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Per-query cost of rebuilding a selector for every query (the old
+`select_exemplars`) vs querying a prebuilt ExemplarIndex, including concurrent
+queries and a save/load round trip.
+
+    python -m benchmarks.exemplar_index --task gents --size 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.box_matching import make_layouts
+from benchmarks.text_selection import make_train_data
+from src.selection import ExemplarIndex, create_selector
+
+
+def make_data(task: str, num_items: int, seed: int = 0):
+    if task == "text":
+        # own storage per item, as in processed data; views would pickle the whole matrix
+        data = make_train_data(num_items, seed=seed)
+        for item in data:
+            item["embedding"] = item["embedding"].clone()
+        return data
+    return make_layouts(num_items, seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--task", type=str, default="gents")
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--num_queries", type=int, default=20)
+    parser.add_argument("--num_threads", type=int, default=4)
+    args = parser.parse_args()
+
+    train_data = make_data(args.task, args.size)
+    queries = make_data(args.task, args.num_queries, seed=1)
+
+    rebuild = []
+    for query in queries[:5]:
+        start = time.perf_counter()
+        create_selector(args.task, train_data, candidate_size=-1, num_prompt=10)(query)
+        rebuild.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    index = ExemplarIndex("synthetic", args.task, train_data)
+    build = time.perf_counter() - start
+
+    reuse = []
+    for query in queries:
+        start = time.perf_counter()
+        index(query)
+        reuse.append(time.perf_counter() - start)
+
+    expected = [index.rank(query).tolist() for query in queries]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.num_threads) as executor:
+        ranked = list(executor.map(lambda q: index.rank(q).tolist(), queries))
+    concurrent = (time.perf_counter() - start) / len(queries)
+    assert ranked == expected, "concurrent queries disagree with sequential ones"
+
+    with tempfile.TemporaryDirectory() as dirname:
+        filename = os.path.join(dirname, "index.pkl")
+        index.save(filename)
+        start = time.perf_counter()
+        loaded = ExemplarIndex.load(filename, train_data)
+        load = time.perf_counter() - start
+        assert [loaded.rank(q).tolist() for q in queries] == expected
+
+    print(
+        f"task={args.task} size={args.size}\n"
+        f"  rebuild per query   p50={np.median(rebuild) * 1e3:9.1f}ms\n"
+        f"  index build (once)      {build * 1e3:9.1f}ms\n"
+        f"  index query         p50={np.median(reuse) * 1e3:9.1f}ms\n"
+        f"  index query x{args.num_threads} thr  avg={concurrent * 1e3:9.1f}ms\n"
+        f"  index load              {load * 1e3:9.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    main()
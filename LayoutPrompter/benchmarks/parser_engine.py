@@ -0,0 +1,164 @@
+"""
+Parser throughput and recovery over a corpus of model responses: the
+original parser (five findall scans per html prediction, seq pattern rebuilt
+per call, whole prediction dropped on any malformed element) vs the
+single-pass Parser. Responses come from a response cache file when given,
+else they are serialized synthetic layouts, a share of them damaged (unknown
+label, truncated last element, missing box value). Well-formed predictions
+must parse identically.
+
+    python -m benchmarks.parser_engine --num_responses 2000
+    python -m benchmarks.parser_engine --output_format seq --dataset rico
+    python -m benchmarks.parser_engine --response_cache output/responses.sqlite
+"""
+import argparse
+import random
+import re
+import sqlite3
+import time
+
+import torch
+from openai.types.chat import ChatCompletion
+
+from benchmarks.batched_transforms import make_layouts
+from src.parsing import Parser
+from src.preprocess import create_processor
+from src.serialization import create_serializer
+
+
+class LegacyParser(Parser):
+    """
+    Parser before the single-pass engine.
+    """
+
+    def _extract_labels_and_bboxes_from_html(self, predition: str):
+        labels = re.findall('<div class="(.*?)"', predition)[1:]  # remove the canvas
+        x = re.findall(r"left:.?(\d+)px", predition)[1:]
+        y = re.findall(r"top:.?(\d+)px", predition)[1:]
+        w = re.findall(r"width:.?(\d+)px", predition)[1:]
+        h = re.findall(r"height:.?(\d+)px", predition)[1:]
+        if not (len(labels) == len(x) == len(y) == len(w) == len(h)):
+            raise RuntimeError
+        labels = torch.tensor([self.label2id[label] for label in labels])
+        bboxes = torch.tensor(
+            [
+                [
+                    int(x[i]) / self.canvas_width,
+                    int(y[i]) / self.canvas_height,
+                    int(w[i]) / self.canvas_width,
+                    int(h[i]) / self.canvas_height,
+                ]
+                for i in range(len(x))
+            ]
+        )
+        return labels, bboxes
+
+    def _extract_labels_and_bboxes_from_seq(self, prediction: str):
+        label_set = list(self.label2id.keys())
+        seq_pattern = r"(" + "|".join(label_set) + r") (\d+) (\d+) (\d+) (\d+)"
+        res = re.findall(seq_pattern, prediction)
+        labels = torch.tensor([self.label2id[item[0]] for item in res])
+        bboxes = torch.tensor(
+            [
+                [
+                    int(item[1]) / self.canvas_width,
+                    int(item[2]) / self.canvas_height,
+                    int(item[3]) / self.canvas_width,
+                    int(item[4]) / self.canvas_height,
+                ]
+                for item in res
+            ]
+        )
+        return labels, bboxes
+
+    def parse_one(self, prediction: str):
+        try:
+            return self._extract_labels_and_bboxes(prediction)
+        except:
+            return None
+
+
+def damage(rng, prediction: str, output_format: str):
+    lines = prediction.split("\n")
+    kind = rng.choice(["label", "truncate", "value"])
+    if output_format == "seq":
+        return prediction.replace(" ", " unknownlabel ", 1) if kind == "label" else prediction[: len(prediction) * 2 // 3]
+    elements = [i for i, line in enumerate(lines) if line.startswith("<div") and "canvas" not in line]
+    if not elements:
+        return prediction
+    i = rng.choice(elements)
+    if kind == "label":
+        lines[i] = re.sub(r'class="[^"]*"', 'class="unknown-element"', lines[i])
+    elif kind == "value":
+        lines[i] = re.sub(r"height: \d+px", "height: px", lines[i])
+    else:
+        return "\n".join(lines[: elements[-1]]) + "\n" + lines[elements[-1]][:40]
+    return "\n".join(lines)
+
+
+def synthetic_corpus(dataset, output_format, num_responses, damaged):
+    layouts = create_processor(dataset, "gent").process_batch(make_layouts(dataset, num_responses, 20))
+    serializer = create_serializer(dataset, "gent", "seq", output_format, False, True, False)
+    rng = random.Random(0)
+    corpus = []
+    for layout in layouts:
+        prediction = serializer.build_output(layout)
+        is_damaged = rng.random() < damaged
+        corpus.append((damage(rng, prediction, output_format) if is_damaged else prediction, is_damaged))
+    return corpus
+
+
+def recorded_corpus(filename):
+    conn = sqlite3.connect(filename)
+    corpus = []
+    for (value,) in conn.execute("SELECT value FROM responses"):
+        response = ChatCompletion.model_validate_json(value)
+        corpus += [(choice.message.content or "", None) for choice in response.choices]
+    return corpus
+
+
+def same(a, b):
+    return torch.equal(a[0], b[0]) and torch.equal(a[1], b[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default="webui")
+    parser.add_argument("--output_format", type=str, default="html")
+    parser.add_argument("--num_responses", type=int, default=2000)
+    parser.add_argument("--damaged", type=float, default=0.2)
+    parser.add_argument("--response_cache", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.response_cache:
+        corpus = recorded_corpus(args.response_cache)
+    else:
+        corpus = synthetic_corpus(args.dataset, args.output_format, args.num_responses, args.damaged)
+    predictions = [prediction for prediction, _ in corpus]
+    legacy = LegacyParser(args.dataset, args.output_format)
+    engine = Parser(args.dataset, args.output_format)
+
+    results = {}
+    for name, p in [("legacy", legacy), ("single pass", engine)]:
+        elapsed = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[name] = [p.parse_one(prediction) for prediction in predictions]
+            elapsed = min(elapsed, time.perf_counter() - start)
+        kept = sum(result is not None for result in results[name])
+        elements = sum(len(result[0]) for result in results[name] if result is not None)
+        print(
+            f"{name:11s} {1e6 * elapsed / len(predictions):6.1f} us/prediction  "
+            f"{elements / elapsed:8.0f} elements/s  "
+            f"kept {kept}/{len(predictions)}  elements {elements}"
+        )
+
+    for (prediction, is_damaged), old, new in zip(corpus, results["legacy"], results["single pass"]):
+        if is_damaged is False or (is_damaged is None and old is not None):
+            assert new is not None and same(old, new), prediction
+    print("well-formed predictions parse identically")
+
+
+if __name__ == "__main__":
+    main()
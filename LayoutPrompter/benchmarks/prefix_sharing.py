@@ -0,0 +1,102 @@
+"""
+Shared-prefix ratio of prompts over a replayed query log, with exemplars
+shuffled (LayoutPrompter) vs the "prefix" layout (pinned most used exemplars,
+counted toward num_prompt, then the query's own in canonical order). Also
+reports how many of each query's own selected exemplars make it into its
+prompt under the 8000-character cutoff. Exemplar selection is replayed from
+a Zipf-like popularity over the train set; usage is fitted on the first half
+of the log and measured on the second.
+
+    python -m benchmarks.prefix_sharing --task gent --num_pinned 4
+"""
+import argparse
+import random
+
+import numpy as np
+
+from benchmarks.prompt_build import make_data
+from src.prefix import ExemplarUsage, simulate_prefix_cache
+from src.serialization import (
+    SerializedExemplars,
+    build_prompt_from_samples,
+    create_serializer,
+    fit_samples,
+)
+from src.tokens import create_token_counter
+
+
+class ReplayedSelection:
+    """
+    Stands in for an ExemplarIndex: returns the logged selection of a query.
+    """
+
+    def __init__(self, selections):
+        self.selections = selections
+
+    def select(self, test_data, shuffle=None):
+        return list(self.selections[test_data["query_id"]])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default="rico")
+    parser.add_argument("--task", type=str, default="gent")
+    parser.add_argument("--num_train", type=int, default=2000)
+    parser.add_argument("--num_queries", type=int, default=2000)
+    parser.add_argument("--num_prompt", type=int, default=10)
+    parser.add_argument("--num_pinned", type=int, default=4)
+    parser.add_argument("--zipf", type=float, default=1.2)
+    args = parser.parse_args()
+
+    dataset = "webui" if args.task == "text" else args.dataset
+    data = make_data(dataset, args.task, args.num_train + args.num_queries)
+    train_data, test_data = data[: args.num_train], data[args.num_train :]
+    serializer = create_serializer(dataset, args.task, "seq", "html", True, True, False)
+    serialized = SerializedExemplars.build(serializer, train_data)
+    count_tokens = create_token_counter("approx")
+
+    rng = np.random.default_rng(0)
+    popularity = 1.0 / np.arange(1, args.num_train + 1) ** args.zipf
+    popularity = rng.permutation(popularity / popularity.sum())
+    selections = [
+        rng.choice(args.num_train, args.num_prompt, replace=False, p=popularity).tolist()
+        for _ in test_data
+    ]
+    for query_id, test in enumerate(test_data):
+        test["query_id"] = query_id
+    half = len(test_data) // 2
+    index = ReplayedSelection(selections)
+    usage = ExemplarUsage.fit(index, test_data[:half], num_pinned=args.num_pinned)
+
+    shuffle_rng = random.Random(0)
+    layouts = {"shuffled": [], "prefix": []}
+    own_kept = {"shuffled": 0, "prefix": 0}
+    for test in test_data[half:]:
+        ranked = index.select(test)
+        shuffled = list(ranked)
+        shuffle_rng.shuffle(shuffled)
+        positions = usage.prioritize(ranked, args.num_prompt)
+        order = {p: k for k, p in enumerate(usage.arrange(positions))}
+        kept = fit_samples(
+            serializer, serialized.samples(positions), dataset, max_samples=args.num_prompt
+        )
+        arranged = sorted((positions[k] for k in kept), key=order.get)
+        for name, order in [("shuffled", shuffled), ("prefix", arranged)]:
+            prompt = build_prompt_from_samples(
+                serializer, serialized.samples(order), test, dataset
+            )
+            layouts[name].append(prompt)
+            own_kept[name] += sum(sample in prompt for sample in serialized.samples(ranked))
+
+    for name, prompts in layouts.items():
+        for min_tokens in (0, 1024):
+            stats = simulate_prefix_cache(prompts, count_tokens, min_tokens=min_tokens)
+            print(
+                f"{name:8s} min_tokens {min_tokens:4d}  tokens {stats['prompt_tokens']:8d}  "
+                f"shared {stats['shared_prefix_ratio']:.3f}  cached {stats['cached_ratio']:.3f}"
+            )
+        print(f"{name:8s} query's own exemplars per prompt {own_kept[name] / len(prompts):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Prompt assembly: the original build_prompt (serialize every exemplar and
+re-join the prompt for each length check) vs SerializedExemplars +
+build_prompt_from_samples. Prompts must be identical for every query and
+max_length.
+
+    python -m benchmarks.prompt_build --num_train 5000 --num_prompt 50
+"""
+import argparse
+import random
+import time
+
+from benchmarks.batched_transforms import make_layouts
+from src.preprocess import create_processor
+from src.serialization import (
+    PREAMBLE,
+    SerializedExemplars,
+    build_prompt,
+    build_prompt_from_samples,
+    create_serializer,
+)
+from src.utilities import CANVAS_SIZE, LAYOUT_DOMAIN
+
+TASKS = ["gent", "gents", "genr", "completion", "refinement", "text"]
+
+
+def legacy_build_prompt(
+    serializer,
+    exemplars,
+    test_data,
+    dataset,
+    max_length=8000,
+    separator_in_samples="\n",
+    separator_between_samples="\n\n",
+):
+    """
+    build_prompt before the serialization cache.
+    """
+    prompt = [
+        PREAMBLE.format(serializer.task_type, LAYOUT_DOMAIN[dataset], *CANVAS_SIZE[dataset])
+    ]
+    for i in range(len(exemplars)):
+        _prompt = (
+            serializer.build_input(exemplars[i])
+            + separator_in_samples
+            + serializer.build_output(exemplars[i])
+        )
+        if len(separator_between_samples.join(prompt) + _prompt) <= max_length:
+            prompt.append(_prompt)
+        else:
+            break
+    prompt.append(serializer.build_input(test_data) + separator_in_samples)
+    return separator_between_samples.join(prompt)
+
+
+def make_data(dataset: str, task: str, num_items: int):
+    layouts = make_layouts(dataset, num_items, max_elements=20)
+    if task == "text":
+        processor = create_processor(dataset, "gent")
+        data = processor.process_batch(layouts)
+        for k, item in enumerate(data):
+            item["text"] = f"A page #{k} with a large hero image, a title and {len(item['labels'])} elements."
+        return data
+    return create_processor(dataset, task).process_batch(layouts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default="rico")
+    parser.add_argument("--num_train", type=int, default=2000)
+    parser.add_argument("--num_queries", type=int, default=200)
+    parser.add_argument("--num_prompt", type=int, default=50)
+    parser.add_argument("--max_lengths", type=int, nargs="+", default=[2000, 8000, 10**9])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for task in TASKS:
+        dataset = "webui" if task == "text" else args.dataset
+        data = make_data(dataset, task, args.num_train + args.num_queries)
+        train_data, test_data = data[: args.num_train], data[args.num_train :]
+        serializer = create_serializer(dataset, task, "seq", "html", True, True, False)
+
+        start = time.perf_counter()
+        serialized = SerializedExemplars.build(serializer, train_data)
+        build_time = time.perf_counter() - start
+
+        legacy_time = cached_time = 0.0
+        for test in test_data:
+            positions = rng.sample(range(args.num_train), args.num_prompt)
+            for max_length in args.max_lengths:
+                start = time.perf_counter()
+                expected = legacy_build_prompt(
+                    serializer, [train_data[i] for i in positions], test, dataset, max_length
+                )
+                legacy_time += time.perf_counter() - start
+                assert build_prompt(
+                    serializer, [train_data[i] for i in positions], test, dataset, max_length
+                ) == expected, task
+
+                start = time.perf_counter()
+                got = build_prompt_from_samples(
+                    serializer, serialized.samples(positions), test, dataset, max_length
+                )
+                cached_time += time.perf_counter() - start
+                assert got == expected, task
+        num_prompts = len(test_data) * len(args.max_lengths)
+        print(
+            f"{task:11s} build cache {build_time:5.2f}s  per prompt: "
+            f"legacy {legacy_time / num_prompts * 1e3:6.2f}ms  "
+            f"cached {cached_time / num_prompts * 1e3:6.3f}ms  (identical)"
+        )
+
+
+if __name__ == "__main__":
+    main()
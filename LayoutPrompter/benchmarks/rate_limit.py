@@ -0,0 +1,123 @@
+"""
+A batch job and interactive requests sharing one rate limit, against the
+local stub server enforcing `rpm` / `tpm` per `window` seconds. Without a
+scheduler the batch job trips 429s that hit everyone (clients run with
+max_retries=0 to show them); with the shared RequestScheduler the limits
+are respected and interactive requests go ahead of the batch queue.
+
+    python -m benchmarks.rate_limit --num_batch 200 --rpm 60 --window 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+import openai
+
+from benchmarks.stub_server import reset_limits, start_stub_server
+from src.ratelimit import BATCH, INTERACTIVE, RequestScheduler, request_priority
+from src.transport import LLMTransport
+
+
+def call(client, k):
+    return client.chat.completions.create(
+        model="stub", messages=[{"role": "user", "content": f"prompt #{k}"}], n=2, max_tokens=200
+    )
+
+
+async def batch_job(transport, num_requests, concurrency):
+    client = transport.async_openai("layout").with_options(max_retries=0)
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(k):
+        nonlocal failures
+        async with semaphore:
+            try:
+                await call(client, k)
+            except openai.RateLimitError:
+                failures += 1
+
+    try:
+        with request_priority(BATCH):
+            await asyncio.gather(*(one(k) for k in range(num_requests)))
+    finally:
+        await transport.aclose()
+    return failures
+
+
+def interactive(transport, num_requests, interval, results):
+    client = transport.openai("layout").with_options(max_retries=0)
+    for k in range(num_requests):
+        time.sleep(interval)
+        start = time.perf_counter()
+        try:
+            with request_priority(INTERACTIVE):
+                call(client, f"interactive {k}")
+            results.append(time.perf_counter() - start)
+        except openai.RateLimitError:
+            results.append(None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_batch", type=int, default=200)
+    parser.add_argument("--num_interactive", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rpm", type=int, default=60)
+    parser.add_argument("--tpm", type=int, default=40000)
+    parser.add_argument("--window", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        latency=args.latency,
+        chunk_delay=0.0,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        limit_window=args.window,
+    )
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    for name, scheduler in [
+        ("no scheduler", None),
+        ("scheduler", RequestScheduler(rpm=args.rpm, tpm=args.tpm, period=args.window)),
+    ]:
+        transport = LLMTransport(scheduler=scheduler)
+        reset_limits(server)
+        server.num_throttled = 0
+        latencies = []
+        thread = threading.Thread(
+            target=interactive,
+            args=(transport, args.num_interactive, args.window / 4, latencies),
+        )
+        start = time.perf_counter()
+        thread.start()
+        failures = asyncio.run(batch_job(transport, args.num_batch, args.concurrency))
+        thread.join()
+        elapsed = time.perf_counter() - start
+        served = [latency for latency in latencies if latency is not None]
+        print(
+            f"{name:12s} {elapsed:5.1f}s  429s {server.num_throttled:4d}  "
+            f"batch failed {failures:3d}/{args.num_batch}  "
+            f"interactive failed {len(latencies) - len(served)}/{len(latencies)}  "
+            f"interactive p50 {statistics.median(served) if served else float('nan'):.3f}s"
+        )
+        if scheduler is not None:
+            stats = scheduler.stats()
+            print(f"{'':12s} max queue depth {stats['max_queue_depth']}")
+            for priority, waits in stats["priorities"].items():
+                print(
+                    f"{'':12s} priority {priority:2d}: granted {waits['granted']:4d}  "
+                    f"mean wait {waits['mean_wait']:.3f}s  p95 {waits['p95_wait']:.3f}s"
+                )
+            assert server.num_throttled == 0 and failures == 0
+        transport.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
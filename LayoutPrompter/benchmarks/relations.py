@@ -0,0 +1,93 @@
+"""
+AddRelation on random layouts: the original per-pair loop vs the vectorized
+transform. Both start from the same seed, so their sampled relations must be
+identical layout by layout.
+
+    python -m benchmarks.relations --num_layouts 2000 --max_elements 25
+"""
+import argparse
+import random
+import time
+from itertools import combinations, product
+
+import torch
+
+from src.transforms import AddRelation
+from src.utilities import detect_loc_relation, detect_size_relation
+
+
+def legacy_relations(transform, data):
+    """
+    The pre-vectorization body of `AddRelation.__call__`.
+    """
+    N = len(data["labels_with_canvas"])
+    index = [0] + list(range(N - 1))
+    rel_all = list(product(range(2), combinations(range(N), 2)))
+    size = int(len(rel_all) * transform.ratio)
+    rel_sample = set(transform.generator.sample(rel_all, size))
+
+    relations = []
+    for i, j in combinations(range(N), 2):
+        bi, bj = data["bboxes_with_canvas"][i], data["bboxes_with_canvas"][j]
+        canvas = data["labels_with_canvas"][i] == 0
+        if ((0, (i, j)) in rel_sample) and (not canvas):
+            rel_size = detect_size_relation(bi, bj)
+            relations.append(
+                [data["labels_with_canvas"][i], index[i], data["labels_with_canvas"][j], index[j], transform.type2index[rel_size]]
+            )
+        if (1, (i, j)) in rel_sample:
+            rel_loc = detect_loc_relation(bi, bj, canvas)
+            relations.append(
+                [data["labels_with_canvas"][i], index[i], data["labels_with_canvas"][j], index[j], transform.type2index[rel_loc]]
+            )
+    return torch.as_tensor(relations).long()
+
+
+def make_layouts(num_layouts: int, max_elements: int, seed: int = 0):
+    rng = random.Random(seed)
+    layouts = []
+    for _ in range(num_layouts):
+        n = rng.randint(1, max_elements)
+        # coarse grid so equal sizes and touching edges actually occur
+        bboxes = torch.tensor(
+            [[rng.randint(0, 8) / 8, rng.randint(0, 8) / 8, rng.randint(1, 4) / 8, rng.randint(1, 4) / 8] for _ in range(n)]
+        )
+        labels = torch.tensor([rng.randint(1, 25) for _ in range(n)])
+        layouts.append(
+            {
+                "bboxes_with_canvas": torch.cat([torch.tensor([[0.0, 0.0, 1.0, 1.0]]), bboxes]),
+                "labels_with_canvas": torch.cat([torch.tensor([0]), labels]),
+            }
+        )
+    return layouts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_layouts", type=int, default=2000)
+    parser.add_argument("--max_elements", type=int, default=25)
+    parser.add_argument("--ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    layouts = make_layouts(args.num_layouts, args.max_elements)
+
+    legacy = AddRelation(ratio=args.ratio)
+    start = time.perf_counter()
+    expected = [legacy_relations(legacy, dict(data)) for data in layouts]
+    legacy_time = time.perf_counter() - start
+
+    vectorized = AddRelation(ratio=args.ratio)
+    start = time.perf_counter()
+    got = [vectorized(dict(data))["relations"] for data in layouts]
+    vectorized_time = time.perf_counter() - start
+
+    for k, (a, b) in enumerate(zip(expected, got)):
+        assert a.shape == b.shape and torch.equal(a, b), k
+    num_relations = sum(len(r) for r in got)
+    print(f"{args.num_layouts} layouts, {num_relations} relations, identical")
+    print(f"per-pair loop: {legacy_time:.2f}s")
+    print(f"vectorized:    {vectorized_time:.2f}s ({legacy_time / vectorized_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Response cache of TextToLayoutPipeline.call_model: records synthetic chat
+completions through a stand-in client, then checks that repeated prompts hit
+memory, a fresh pipeline hits the sqlite file, replay mode serves parse/rank
+offline with identical results, and expired entries are refetched.
+
+    python -m benchmarks.response_replay --num_prompts 200
+"""
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion
+
+from benchmarks.batched_transforms import make_layouts
+from main import TextToLayoutPipeline
+from src.preprocess import create_processor
+
+
+class RecordingClient:
+    """
+    Answers every request with `num_return` serialized train layouts.
+    """
+
+    def __init__(self, outputs, latency=0.0):
+        self.outputs = outputs
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, n=1, **kwargs):
+        time.sleep(self.latency)
+        offset = self.calls * n
+        self.calls += 1
+        choices = [
+            {
+                "index": i,
+                "finish_reason": "stop",
+                "message": {
+                    "role": "assistant",
+                    "content": self.outputs[(offset + i) % len(self.outputs)],
+                },
+            }
+            for i in range(n)
+        ]
+        return ChatCompletion.model_validate(
+            {
+                "id": f"chatcmpl-{self.calls}",
+                "object": "chat.completion",
+                "created": 0,
+                "model": model,
+                "choices": choices,
+            }
+        )
+
+
+def make_pipeline(mode, path, client, ttl=None):
+    pipeline = TextToLayoutPipeline(
+        dataset="webui",
+        response_cache=mode,
+        response_cache_path=path,
+        response_cache_ttl=ttl,
+    )
+    pipeline._client = client
+    return pipeline
+
+
+def parse_and_rank(pipeline, prompts):
+    results = []
+    for prompt in prompts:
+        ranked = pipeline.rank_layouts(pipeline.parse_response(pipeline.call_model(prompt)))
+        results.append([(l.tolist(), b.tolist()) for l, b in ranked])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_prompts", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    layouts = create_processor("webui", "gent").process_batch(make_layouts("webui", 500, 10))
+    recorder = make_pipeline("off", None, None)
+    outputs = [recorder.serializer.build_output(layout) for layout in layouts]
+    prompts = [f"prompt #{k}" for k in range(args.num_prompts)]
+
+    with tempfile.TemporaryDirectory() as dirname:
+        path = os.path.join(dirname, "responses.sqlite")
+        client = RecordingClient(outputs, args.latency)
+        pipeline = make_pipeline("on", path, client)
+        for label in ("cold", "memory"):
+            start = time.perf_counter()
+            recorded = parse_and_rank(pipeline, prompts)
+            elapsed = time.perf_counter() - start
+            print(f"{label:8s} {elapsed:.3f}s  client calls {client.calls}")
+        assert client.calls == args.num_prompts
+        print("stats", pipeline.response_cache.stats())
+
+        offline = make_pipeline("replay", path, None)
+        start = time.perf_counter()
+        replayed = parse_and_rank(offline, prompts)
+        print(f"{'replay':8s} {time.perf_counter() - start:.3f}s  (disk, no client)")
+        assert replayed == recorded
+        try:
+            offline.call_model("a prompt that was never recorded")
+            raise AssertionError("replay mode must not miss silently")
+        except LookupError:
+            pass
+
+        expiring = make_pipeline("on", path, client, ttl=0.0)
+        time.sleep(0.01)
+        expiring.call_model(prompts[0])
+        assert client.calls == args.num_prompts + 1
+        print("replay results identical; expired entry refetched")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Saliency map -> content boxes on synthetic PKU-sized maps: the per-poster
+`SaliencyMapToBBoxes` path vs `ContentBoxExtractor` (process pool, then
+sidecar cache hits, then a threshold sweep). With reduce=1 every box must
+match the per-poster path.
+
+    python -m benchmarks.saliency_boxes --num_images 2000 --num_workers 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from src.saliency import ContentBoxExtractor
+from src.transforms import SaliencyMapToBBoxes
+
+
+def make_saliency_maps(dirname: str, num_images: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    filenames = []
+    for i in range(num_images):
+        image = np.zeros((750, 513), dtype=np.float32)
+        for _ in range(rng.integers(1, 6)):
+            cx, cy = rng.integers(0, 513), rng.integers(0, 750)
+            sx, sy = rng.integers(20, 150, size=2)
+            cv2.ellipse(image, (int(cx), int(cy)), (int(sx), int(sy)), 0, 0, 360, float(rng.uniform(80, 255)), -1)
+        image = cv2.GaussianBlur(image, (31, 31), 0).astype(np.uint8)
+        if i % 10 == 0:
+            # a few 3-channel maps to cover the color decode path
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        filename = os.path.join(dirname, f"{i}_mask_pred.png")
+        cv2.imwrite(filename, image)
+        filenames.append(filename)
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_images", type=int, default=500)
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threshold", type=int, default=100)
+    parser.add_argument("--sweep", type=int, nargs="+", default=[60, 80, 100, 120, 140])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dirname:
+        filenames = make_saliency_maps(dirname, args.num_images)
+
+        legacy = SaliencyMapToBBoxes(args.threshold)
+        start = time.perf_counter()
+        expected = [legacy(cv2.imread(f)) for f in filenames]
+        elapsed = time.perf_counter() - start
+        print(f"per-poster:            {elapsed:6.2f}s")
+
+        cache_path = os.path.join(dirname, "content_boxes.sqlite")
+        extractor = ContentBoxExtractor(
+            args.threshold, num_workers=args.num_workers, cache_path=cache_path
+        )
+        start = time.perf_counter()
+        extractor.extract_all(filenames)
+        elapsed = time.perf_counter() - start
+        print(f"pool ({args.num_workers:2d} workers):     {elapsed:6.2f}s")
+        for filename, bboxes in zip(filenames, expected):
+            got = extractor(filename)
+            assert got.tolist() == bboxes.tolist(), filename
+
+        # a fresh extractor only shares the sidecar file
+        extractor = ContentBoxExtractor(args.threshold, cache_path=cache_path)
+        start = time.perf_counter()
+        extractor.extract_all(filenames)
+        elapsed = time.perf_counter() - start
+        print(f"sidecar cache hits:    {elapsed:6.2f}s")
+
+        extractor.num_workers = args.num_workers
+        start = time.perf_counter()
+        extractor.extract_all(filenames, args.sweep)
+        elapsed = time.perf_counter() - start
+        print(f"sweep {args.sweep}: {elapsed:6.2f}s")
+
+        reduced = ContentBoxExtractor(args.threshold, reduce=2, num_workers=args.num_workers)
+        start = time.perf_counter()
+        boxes = reduced.extract_all(filenames)
+        elapsed = time.perf_counter() - start
+        same = sum(len(b[args.threshold]) == len(e) for b, e in zip(boxes, expected))
+        print(f"reduce=2 pool:         {elapsed:6.2f}s ({same}/{len(filenames)} same box count)")
+
+
+if __name__ == "__main__":
+    main()
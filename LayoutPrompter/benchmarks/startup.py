@@ -0,0 +1,65 @@
+"""
+Cold-start timings of the text-to-layout app, each measured in a fresh
+interpreter: importing `main`, constructing `TextToLayoutPipeline` (the point
+where the app can start serving) and, with --warmup, the background
+`warmup()` that loads data, the exemplar index and CLIP.
+
+    python -m benchmarks.startup --repeat 5 --warmup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SNIPPET = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+pipeline = main.TextToLayoutPipeline()
+constructed = time.perf_counter()
+if {warmup}:
+    pipeline.warmup()
+warmed = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "construct": constructed - imported,
+    "ready": constructed - start,
+    "warmup": warmed - constructed,
+}}))
+"""
+
+
+def measure(warmup: bool):
+    env = dict(os.environ)
+    # the client is never called here; a placeholder key keeps OpenAI() happy
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(warmup=warmup)],
+        cwd=root,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", action="store_true")
+    args = parser.parse_args()
+
+    runs = [measure(args.warmup) for _ in range(args.repeat)]
+    keys = ["import", "construct", "ready"] + (["warmup"] if args.warmup else [])
+    for key in keys:
+        values = [run[key] for run in runs]
+        print(f"{key:10s} median {statistics.median(values):7.3f}s  max {max(values):7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Time to first layout and total latency per prompt against the local stub
+server: call_model + Parser (waits for all n completions) vs stream_layouts,
+with and without stopping after K layouts. Streaming without a limit must
+parse the same layouts as the blocking path.
+
+    python -m benchmarks.stream_parse --num_prompts 10 --max_layouts 3
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.stub_server import start_stub_server
+
+
+def canonical(layouts):
+    return sorted((labels.tolist(), bboxes.tolist()) for labels, bboxes in layouts)
+
+
+def timed(layouts, prompt):
+    start = time.perf_counter()
+    first, parsed = None, []
+    for layout in layouts(prompt):
+        if first is None:
+            first = time.perf_counter() - start
+        parsed.append(layout)
+    return first, time.perf_counter() - start, parsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_prompts", type=int, default=10)
+    parser.add_argument("--num_return", type=int, default=10)
+    parser.add_argument("--max_layouts", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--chunk_delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, chunk_delay=args.chunk_delay)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    from main import TextToLayoutPipeline
+
+    pipeline = TextToLayoutPipeline(dataset="webui", num_return=args.num_return)
+    modes = {
+        "blocking": lambda p: iter(pipeline.parse_response(pipeline.call_model(p))),
+        "stream": lambda p: pipeline.stream_layouts(p),
+        f"stream K={args.max_layouts}": lambda p: pipeline.stream_layouts(p, args.max_layouts),
+    }
+    results = {}
+    for name, layouts in modes.items():
+        runs = [timed(layouts, f"prompt #{k}") for k in range(args.num_prompts)]
+        results[name] = [parsed for _, _, parsed in runs]
+        print(
+            f"{name:12s} first layout {statistics.mean(r[0] for r in runs):.3f}s  "
+            f"total {statistics.mean(r[1] for r in runs):.3f}s  "
+            f"layouts {statistics.mean(len(r[2]) for r in runs):.1f}"
+        )
+
+    for blocking, streamed in zip(results["blocking"], results["stream"]):
+        assert canonical(blocking) == canonical(streamed)
+    for limited in results[f"stream K={args.max_layouts}"]:
+        assert len(limited) == min(args.max_layouts, args.num_return)
+    print("streamed layouts identical to the blocking path")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Local OpenAI-compatible stub for throughput tests: POST /v1/chat/completions
+answers with `n` random layouts in the pipeline's html format after a fixed
+`latency` (plus jitter), so client concurrency can be measured offline.
+Layouts are seeded by the prompt, so equal requests get equal answers.
+POST /v1/responses answers structured-output requests (content generation)
+with a placeholder string for every property of the requested schema.
+A `failure_rate` share of them uses an unknown label, so the Parser drops
+it. Usage reports about 4 characters per token.
+With `rpm` / `tpm` set, model calls are admitted by continuously refilled
+buckets of that many requests / tokens per `limit_window` seconds, and
+rejected with a 429 and Retry-After otherwise, as the provider does (tokens
+charged as prompt bytes / 4 plus max output per choice).
+With `"stream": true` the choices are sent as server-sent event chunks,
+`chunk_chars` characters per choice every `chunk_delay` seconds, round robin,
+so shorter layouts finish first.
+
+    python -m benchmarks.stub_server --port 8000 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=stub python ...
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.utilities import CANVAS_SIZE, ID2LABEL
+
+ELEMENT = '<div class="{}" style="left: {}px; top: {}px; width: {}px; height: {}px"></div>'
+
+
+def random_layout(rng, dataset="webui", max_elements=8, failure_rate=0.0):
+    width, height = CANVAS_SIZE[dataset]
+    labels = list(ID2LABEL[dataset].values())
+    if rng.random() < failure_rate:
+        labels = ["unknown-element"]
+    lines = ["<html>", "<body>", ELEMENT.format("canvas", 0, 0, width, height)]
+    for _ in range(rng.randint(1, max_elements)):
+        w, h = rng.randint(8, width // 2), rng.randint(8, height // 2)
+        lines.append(
+            ELEMENT.format(
+                rng.choice(labels), rng.randint(0, width - w), rng.randint(0, height - h), w, h
+            )
+        )
+    return "\n".join(lines + ["</body>", "</html>"])
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # one handler per TCP connection: count it and charge `handshake`
+        with self.server.lock:
+            self.server.num_connections += 1
+        time.sleep(self.server.handshake)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _admit(self, body, request):
+        """
+        None when the call fits the limits, else seconds until it would.
+        """
+        server = self.server
+        if server.rpm is None and server.tpm is None:
+            return None
+        max_output = request.get("max_tokens") or request.get("max_output_tokens") or 1024
+        tokens = len(body) // 4 + max_output * request.get("n", 1)
+        now = time.monotonic()
+        with server.lock:
+            elapsed, server.updated = now - server.updated, now
+            wait = 0.0
+            for name, limit, amount in (("requests", server.rpm, 1), ("tokens", server.tpm, tokens)):
+                if limit is None:
+                    continue
+                rate = limit / server.limit_window
+                server.levels[name] = min(limit, server.levels[name] + elapsed * rate)
+                wait = max(wait, (amount - server.levels[name]) / rate)
+            if wait > 0:
+                server.num_throttled += 1
+                return wait
+            server.levels["requests"] -= 1
+            server.levels["tokens"] -= tokens
+        return None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) or b"{}"
+        request = json.loads(body)
+        retry_after = self._admit(body, request)
+        if retry_after is not None:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "code": "rate_limit_exceeded"}},
+                {"retry-after-ms": str(int(retry_after * 1000) + 1)},
+            )
+            return
+        if self.path.endswith("/responses"):
+            self._respond(request)
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        server = self.server
+        with server.lock:
+            server.num_requests += 1
+            request_id = server.num_requests
+        time.sleep(server.latency + random.random() * server.jitter)
+        prompt = json.dumps(request.get("messages", []), sort_keys=True)
+        rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+        contents = [
+            random_layout(rng, server.dataset, failure_rate=server.failure_rate)
+            for _ in range(request.get("n", 1))
+        ]
+        if request.get("stream"):
+            self._stream(request_id, request.get("model", "stub"), contents)
+            return
+        # as long as streaming the longest choice takes
+        rounds = max(len(content) for content in contents) // self.server.chunk_chars + 1
+        time.sleep(rounds * self.server.chunk_delay)
+        choices = [
+            {
+                "index": i,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+            for i, content in enumerate(contents)
+        ]
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-stub-{request_id}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": choices,
+                "usage": {
+                    "prompt_tokens": len(prompt) // 4,
+                    "completion_tokens": sum(len(content) // 4 for content in contents),
+                    "total_tokens": len(prompt) // 4
+                    + sum(len(content) // 4 for content in contents),
+                },
+            },
+        )
+
+    def _respond(self, request):
+        server = self.server
+        with server.lock:
+            server.num_requests += 1
+            request_id = server.num_requests
+        time.sleep(server.latency + random.random() * server.jitter)
+        schema = request.get("text", {}).get("format", {}).get("schema", {})
+        seed = zlib.crc32(json.dumps(request.get("input"), sort_keys=True).encode("utf-8"))
+        text = json.dumps(
+            {name: f"{name} #{seed % 1000}" for name in schema.get("properties", {})},
+            ensure_ascii=False,
+        )
+        self._send_json(
+            200,
+            {
+                "id": f"resp-stub-{request_id}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "model": request.get("model", "stub"),
+                "status": "completed",
+                "parallel_tool_calls": True,
+                "tool_choice": "auto",
+                "tools": [],
+                "output": [
+                    {
+                        "type": "message",
+                        "id": f"msg-stub-{request_id}",
+                        "status": "completed",
+                        "role": "assistant",
+                        "content": [{"type": "output_text", "text": text, "annotations": []}],
+                    }
+                ],
+            },
+        )
+
+    def _stream(self, request_id, model, contents):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        size = self.server.chunk_chars
+        offsets = [0] * len(contents)
+        try:
+            while any(offset <= len(content) for offset, content in zip(offsets, contents)):
+                choices = []
+                for i, content in enumerate(contents):
+                    if offsets[i] > len(content):
+                        continue
+                    piece = content[offsets[i] : offsets[i] + size]
+                    offsets[i] += size
+                    finished = offsets[i] > len(content)
+                    choices.append(
+                        {
+                            "index": i,
+                            "delta": {"content": piece} if piece else {},
+                            "finish_reason": "stop" if finished else None,
+                        }
+                    )
+                chunk = {
+                    "id": f"chatcmpl-stub-{request_id}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": choices,
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.server.chunk_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading early
+            pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # enough backlog for a burst of new connections under concurrent load
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def reset_limits(server):
+    """
+    Refills the rate limit buckets.
+    """
+    server.levels = {"requests": server.rpm or 0, "tokens": server.tpm or 0}
+    server.updated = time.monotonic()
+
+
+def start_stub_server(
+    port=0,
+    latency=0.2,
+    jitter=0.0,
+    dataset="webui",
+    chunk_chars=16,
+    chunk_delay=0.01,
+    failure_rate=0.0,
+    handshake=0.0,
+    rpm=None,
+    tpm=None,
+    limit_window=60.0,
+):
+    """
+    Serves in a daemon thread. Returns the server and its OpenAI base URL.
+    """
+    server = StubServer(("127.0.0.1", port), StubHandler)
+    server.latency = latency
+    server.jitter = jitter
+    server.dataset = dataset
+    server.chunk_chars = chunk_chars
+    server.chunk_delay = chunk_delay
+    server.failure_rate = failure_rate
+    server.num_requests = 0
+    server.num_connections = 0
+    server.handshake = handshake
+    server.rpm = rpm
+    server.tpm = tpm
+    server.limit_window = limit_window
+    server.num_throttled = 0
+    reset_limits(server)
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--dataset", type=str, default="webui")
+    parser.add_argument("--failure_rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--tpm", type=int, default=None)
+    args = parser.parse_args()
+    server, base_url = start_stub_server(
+        args.port,
+        args.latency,
+        args.jitter,
+        args.dataset,
+        failure_rate=args.failure_rate,
+        rpm=args.rpm,
+        tpm=args.tpm,
+    )
+    print(f"serving {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
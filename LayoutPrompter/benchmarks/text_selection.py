@@ -0,0 +1,82 @@
+"""
+Per-query latency of TextToLayoutExemplarSelection on synthetic CLIP embeddings.
+
+    python -m benchmarks.text_selection --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+import torch
+
+from src.selection import TextToLayoutExemplarSelection
+
+
+def make_train_data(num_items: int, dim: int = 512, seed: int = 0):
+    generator = torch.Generator().manual_seed(seed)
+    embeddings = torch.randn(num_items, dim, generator=generator)
+    embeddings /= embeddings.norm(dim=-1, keepdim=True)
+    embeddings = embeddings.to(torch.float16)
+    bboxes = torch.tensor([[10, 10, 50, 20], [10, 40, 80, 30]])
+    return [
+        {"embedding": embeddings[i : i + 1], "discrete_gold_bboxes": bboxes}
+        for i in range(num_items)
+    ]
+
+
+def legacy_select(train_data, test_data, num_prompt):
+    scores = []
+    test_embedding = test_data["embedding"]
+    for i in range(len(train_data)):
+        score = (train_data[i]["embedding"] @ test_embedding.T).item()
+        scores.append([i, score])
+    scores = sorted(scores, key=lambda x: x[1], reverse=True)
+    return [scores[i][0] for i in range(num_prompt)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--num_queries", type=int, default=20)
+    parser.add_argument("--num_prompt", type=int, default=10)
+    parser.add_argument("--legacy_max_size", type=int, default=100000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        train_data = make_train_data(size)
+        queries = make_train_data(args.num_queries, seed=1)
+
+        start = time.perf_counter()
+        selector = TextToLayoutExemplarSelection(
+            train_data=train_data,
+            candidate_size=-1,
+            num_prompt=args.num_prompt,
+            shuffle=False,
+        )
+        build_time = time.perf_counter() - start
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            selector(query)
+            latencies.append(time.perf_counter() - start)
+        line = (
+            f"size={size:>8d}  build={build_time * 1e3:9.1f}ms  "
+            f"query p50={np.median(latencies) * 1e3:8.2f}ms  "
+            f"max={np.max(latencies) * 1e3:8.2f}ms"
+        )
+
+        if size <= args.legacy_max_size:
+            start = time.perf_counter()
+            legacy = legacy_select(train_data, queries[0], args.num_prompt)
+            line += f"  legacy={(time.perf_counter() - start) * 1e3:9.1f}ms"
+            ranked = selector._top_indices(selector.score(queries[0])[0]).tolist()
+            line += f"  overlap={len(set(legacy) & set(ranked))}/{args.num_prompt}"
+        print(line)
+        del selector, train_data
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    main()
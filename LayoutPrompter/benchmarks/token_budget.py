@@ -0,0 +1,85 @@
+"""
+Prompt size under the 8000-character cutoff of build_prompt vs token-budget
+packing (build_prompt_with_budget), measured with the approximate counter
+(and tiktoken when it is installed). Reports exemplars kept, tokens used and
+how often each mode exceeds the budget.
+
+    python -m benchmarks.token_budget --task gent --token_budget 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.prompt_build import make_data
+from src.serialization import (
+    SerializedExemplars,
+    build_prompt_from_samples,
+    build_prompt_with_budget,
+    create_serializer,
+)
+from src.tokens import create_token_counter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default="rico")
+    parser.add_argument("--task", type=str, default="gent")
+    parser.add_argument("--num_train", type=int, default=2000)
+    parser.add_argument("--num_queries", type=int, default=200)
+    parser.add_argument("--num_prompt", type=int, default=10)
+    parser.add_argument("--num_candidates", type=int, default=20)
+    parser.add_argument("--token_budget", type=int, default=2000)
+    args = parser.parse_args()
+
+    dataset = "webui" if args.task == "text" else args.dataset
+    data = make_data(dataset, args.task, args.num_train + args.num_queries)
+    train_data, test_data = data[: args.num_train], data[args.num_train :]
+    serializer = create_serializer(dataset, args.task, "seq", "html", True, True, False)
+    serialized = SerializedExemplars.build(serializer, train_data)
+    count_tokens = create_token_counter("approx")
+
+    start = time.perf_counter()
+    token_counts = serialized.token_counts(count_tokens)
+    elapsed = time.perf_counter() - start
+    print(f"approx counts for {len(serialized)} exemplars: {elapsed:.2f}s")
+    try:
+        exact = create_token_counter("tiktoken")
+        samples = serialized.samples(range(min(200, len(serialized))))
+        ratios = [count_tokens(s) / exact(s) for s in samples]
+        print(f"approx / tiktoken: median {statistics.median(ratios):.2f}, min {min(ratios):.2f}")
+    except ImportError:
+        print("tiktoken not installed; skipping the exact comparison")
+
+    rng = random.Random(0)
+    char_mode, budget_mode = [], []
+    for test in test_data:
+        positions = rng.sample(range(args.num_train), args.num_candidates)
+        samples = serialized.samples(positions)
+        prompt = build_prompt_from_samples(serializer, samples[: args.num_prompt], test, dataset)
+        kept = sum(sample in prompt for sample in samples[: args.num_prompt])
+        char_mode.append((kept, count_tokens(prompt)))
+        prompt, kept, tokens = build_prompt_with_budget(
+            serializer,
+            samples,
+            test,
+            dataset,
+            token_budget=args.token_budget,
+            count_tokens=count_tokens,
+            sample_tokens=[token_counts[i] for i in positions],
+            max_samples=args.num_prompt,
+        )
+        budget_mode.append((len(kept), tokens))
+
+    for name, results in [("8000 chars", char_mode), ("token budget", budget_mode)]:
+        kept = [k for k, _ in results]
+        tokens = [t for _, t in results]
+        over = sum(t > args.token_budget for t in tokens)
+        print(
+            f"{name:12s} exemplars {statistics.mean(kept):5.2f}  tokens mean {statistics.mean(tokens):7.1f} "
+            f"max {max(tokens):5d}  over {args.token_budget}: {over}/{len(tokens)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Connections opened and request latency under concurrent load against the
+local stub server: a new OpenAI client per call (as the LangGraph nodes did
+with ChatOpenAI) vs clients of the shared LLMTransport, mixing the "layout"
+and "contents" components on one pool. The stub can add a handshake delay
+per new connection to stand in for TCP + TLS setup.
+
+    python -m benchmarks.transport --num_requests 400 --concurrency 16
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_server import start_stub_server
+
+
+def run(make_client, num_requests, concurrency):
+    components = ["layout", "contents"]
+
+    def call(k):
+        client = make_client(components[k % len(components)])
+        start = time.perf_counter()
+        client.chat.completions.create(
+            model="stub", messages=[{"role": "user", "content": f"prompt #{k}"}], n=1
+        )
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = sorted(pool.map(call, range(num_requests)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--handshake", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        latency=args.latency, chunk_delay=0.0, handshake=args.handshake
+    )
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    from openai import OpenAI
+
+    from src.transport import LLMTransport
+
+    transport = LLMTransport(max_connections=args.concurrency)
+    modes = {
+        "client per call": lambda component: OpenAI(),
+        "shared transport": transport.openai,
+    }
+    for name, make_client in modes.items():
+        server.num_connections = 0
+        elapsed, latencies = run(make_client, args.num_requests, args.concurrency)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(
+            f"{name:16s} {args.num_requests / elapsed:7.1f} req/s  "
+            f"p50 {statistics.median(latencies) * 1000:6.1f}ms  p95 {p95 * 1000:6.1f}ms  "
+            f"connections {server.num_connections}"
+        )
+    assert server.num_connections <= args.concurrency
+    transport.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,39 @@
+import asyncio
+import json
 import os
+import shutil
+import threading
+
+import torch
 from dotenv import load_dotenv
 from tqdm import tqdm
-from openai import OpenAI
+from openai.types.chat import ChatCompletion
 
 
+from src.ann import IVFIndex
+from src.cache import DiskCache, LRUCache, ResponseCache, TwoLevelCache, hash_key
+from src.columnar import META_FILENAME, ColumnarDataset, columnar_dirname, write_columnar
+from src.prefix import ExemplarUsage
 from src.preprocess import create_processor
+from src.transforms import CachedTextEncoder, CLIPTextEncoder
 from src.utilities import ID2LABEL, RAW_DATA_PATH, read_pt, write_pt, read_json
-from src.selection import create_selector
-from src.serialization import create_serializer, build_prompt
-from src.parsing import Parser
+from src.selection import ExemplarIndex, stack_embeddings
+from src.serialization import (
+    SerializedExemplars,
+    build_prompt,
+    build_prompt_from_samples,
+    build_prompt_with_budget,
+    create_serializer,
+    fit_samples,
+)
+from src.tokens import create_token_counter
+from src.transport import get_transport
+from src.parsing import Parser, StreamParser
 from src.ranker import Ranker
+from src.ratelimit import BATCH, current_priority, request_priority
+from src.sampling import AdaptiveSampler
 from src.visualization import Visualizer, create_image_grid
-from src.contents import generate_contents
+from src.contents import generate_contents_batch
 
 
 class TextToLayoutPipeline:
@@ -34,6 +56,35 @@ class TextToLayoutPipeline:
         presence_penalty=0,
         num_return=10,
         stop_token="\n\n",
+        ann_index=False,
+        ann_num_lists=None,
+        ann_num_probe=8,
+        exemplar_index_path=None,
+        storage="pt",
+        batch_size=64,
+        shard_size=2048,
+        num_threads=None,
+        embedding_cache_size=1024,
+        embedding_cache_path=None,
+        embedding_disk_cache_size=100000,
+        token_budget=None,
+        token_counter="approx",
+        budget_candidates=None,
+        prompt_layout="shuffled",
+        exemplar_usage_path=None,
+        num_pinned=None,
+        response_cache="off",
+        response_cache_path=None,
+        response_cache_size=256,
+        response_disk_cache_size=10000,
+        response_cache_ttl=None,
+        max_concurrency=16,
+        stream=False,
+        max_layouts=None,
+        adaptive_sampling=False,
+        min_layouts=None,
+        content_workers=8,
+        transport=None,
     ):
         load_dotenv()
         self.dataset = dataset
@@ -53,8 +104,63 @@ class TextToLayoutPipeline:
         self.presence_penalty = presence_penalty
         self.num_return = num_return
         self.stop_token = stop_token
+        self.ann_index = ann_index
+        self.ann_num_lists = ann_num_lists
+        self.ann_num_probe = ann_num_probe
+        self.index = None
+        self.exemplar_index_path = exemplar_index_path
+        self.storage = storage
+        self.batch_size = batch_size
+        self.shard_size = shard_size
+        self.num_threads = num_threads
+        self.embedding_cache_size = embedding_cache_size
+        self.embedding_cache_path = embedding_cache_path
+        self.embedding_disk_cache_size = embedding_disk_cache_size
+        # token_budget=None keeps the 8000-character cutoff of build_prompt
+        self.token_budget = token_budget
+        self.token_counter = create_token_counter(token_counter)
+        self.budget_candidates = budget_candidates
+        self.last_prompt_tokens = None
+        # "prefix" orders prompts for provider-side prefix caching
+        self.prompt_layout = prompt_layout
+        self.exemplar_usage_path = exemplar_usage_path
+        self.num_pinned = num_pinned
+        self._exemplar_usage = None
+        # "on" reuses responses to identical requests, "replay" serves only
+        # from the cache (offline runs of the parse/rank/visualize stages)
+        if response_cache not in ("off", "on", "replay"):
+            raise ValueError(f"response_cache must be off, on or replay, got {response_cache}")
+        self.response_cache_mode = response_cache
+        self.response_cache_path = response_cache_path
+        self.response_cache_size = response_cache_size
+        self.response_disk_cache_size = response_disk_cache_size
+        self.response_cache_ttl = response_cache_ttl
+        self._response_cache = None
+        # model calls in flight at once in run_batch
+        self.max_concurrency = max_concurrency
+        # stream completions and parse each layout as it finishes, stopping
+        # the request once max_layouts have parsed
+        self.stream = stream
+        self.max_layouts = max_layouts
+        # ask for fewer than num_return choices, sized by the parse yield
+        # seen so far, and follow up only when too few layouts parse
+        self.sampler = None
+        if adaptive_sampling:
+            self.sampler = AdaptiveSampler(
+                min_layouts=min_layouts or max(1, num_return // 2),
+                max_n=num_return,
+                count_tokens=self.token_counter,
+            )
+        # concurrent content requests per run
+        self.content_workers = content_workers
+        self._train_data = None
+        self._exemplar_index = None
+        self._exemplar_source = None
+        self._exemplar_index_lock = threading.Lock()
+        self._serialized_exemplars = None
+        self._serialized_exemplars_lock = threading.Lock()
 
-        self.processor = create_processor(dataset, task)
+        self.processor = create_processor(dataset, task, **self._processor_kwargs())
         self.serializer = create_serializer(
             dataset, task, input_format, output_format,
             add_index_token, add_sep_token, add_unk_token
@@ -62,69 +168,519 @@ class TextToLayoutPipeline:
         self.parser = Parser(dataset=dataset, output_format=output_format)
         self.ranker = Ranker()
         self.visualizer = Visualizer(dataset)
-        self.client = OpenAI()
+        # shared, pooled HTTP transport (src.transport) unless one is given
+        self.transport = transport
+        self._client = None
 
-    def get_processed_data(self, split):
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = (self.transport or get_transport()).openai("layout")
+        return self._client
+
+    @property
+    def async_client(self):
+        # the transport keeps one client per event loop, so every
+        # asyncio.run gets a client on its own loop
+        return (self.transport or get_transport()).async_openai("layout")
+
+    def warmup(self):
+        """
+        Does the one-time work of the first `run` ahead of time: loads the
+        processed train split, its exemplar index and serialized exemplars,
+        the CLIP weights, the plot palette and the OpenAI client. Meant to be
+        called from a background thread right after the app starts.
+        """
+        self.get_exemplar_index()
+        serialized = self.get_serialized_exemplars()
+        if self.token_budget is not None:
+            serialized.token_counts(self.token_counter)
+        if hasattr(self.processor, "text_encoder"):
+            self.processor.text_encoder.warmup()
+        self.visualizer.colors
+        self.client
+        return self
+
+    def _processed_filename(self, split):
         # base_dir = os.path.dirname(os.getcwd())
         base_dir = os.path.dirname(os.path.abspath(__file__))  # main.py 위치 기준
-        filename = os.path.join(
+        return os.path.join(
             base_dir, "dataset", self.dataset, "processed", self.task, f"{split}.pt"
         )
-        if os.path.exists(filename):
-            return read_pt(filename, map_location="cpu")
+
+    def get_processed_data(self, split):
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        filename = self._processed_filename(split)
+        columnar = columnar_dirname(filename)
+        if self.storage == "columnar" and self._columnar_is_fresh(columnar, filename):
+            data = ColumnarDataset(columnar)
+        elif os.path.exists(filename):
+            data = read_pt(filename, map_location="cpu")
+        else:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            # raw_path = os.path.join(RAW_DATA_PATH(self.dataset), f"{split}.json")
+            raw_path = os.path.join(base_dir, "dataset", self.dataset, f"{split}.json")
+            raw_data = read_json(raw_path)
+            data = self.process_raw_data(raw_data, filename, desc=split)
+        if self.storage == "columnar" and not isinstance(data, ColumnarDataset):
+            write_columnar(columnar, data)
+            data = ColumnarDataset(columnar)
+        if split == "train" and self.task == "text" and self.ann_index:
+            self.index = self.get_ann_index(filename, data)
+        return data
+
+    @staticmethod
+    def _columnar_is_fresh(columnar, filename):
+        # a .pt file written after the columnar copy (e.g. edited data) wins
+        return ColumnarDataset.exists(columnar) and (
+            not os.path.exists(filename)
+            or os.path.getmtime(os.path.join(columnar, META_FILENAME))
+            >= os.path.getmtime(filename)
+        )
+
+    def _processor_kwargs(self):
+        if self.task != "text":
+            return {}
+        disk = None
+        if self.embedding_cache_path:
+            disk = DiskCache(
+                self.embedding_cache_path, maxsize=self.embedding_disk_cache_size
+            )
+        cache = TwoLevelCache(LRUCache(self.embedding_cache_size), disk)
+        return {"text_encoder": CachedTextEncoder(CLIPTextEncoder(), cache)}
+
+    def process_raw_data(self, raw_data, filename, desc=""):
+        """
+        Processes `raw_data` in shards of `shard_size` items and writes the result
+        to `filename`. Each finished shard is checkpointed under
+        `<split>.shards/`, so a crashed run resumes from the last complete shard.
+        Processors with `process_batch` work `batch_size` items at a time (CLIP
+        encoding for text-to-layout, padded layouts for the layout tasks).
+        """
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        shard_dir = os.path.splitext(filename)[0] + ".shards"
+        os.makedirs(shard_dir, exist_ok=True)
         data = []
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        # raw_path = os.path.join(RAW_DATA_PATH(self.dataset), f"{split}.json")
-        raw_path = os.path.join(base_dir, "dataset", self.dataset, f"{split}.json")
-        raw_data = read_json(raw_path)
-        for rd in tqdm(raw_data, desc=f"{split} data processing..."):
-            data.append(self.processor(rd))
+        with tqdm(total=len(raw_data), desc=f"{desc} data processing...") as pbar:
+            for start in range(0, len(raw_data), self.shard_size):
+                end = min(start + self.shard_size, len(raw_data))
+                shard_filename = os.path.join(shard_dir, f"{start:09d}-{end:09d}.pt")
+                if os.path.exists(shard_filename):
+                    shard = read_pt(shard_filename, map_location="cpu")
+                elif hasattr(self.processor, "process_batch"):
+                    shard = self.processor.process_batch(
+                        raw_data[start:end], batch_size=self.batch_size
+                    )
+                else:
+                    shard = [self.processor(rd) for rd in raw_data[start:end]]
+                if not os.path.exists(shard_filename):
+                    # write-then-rename so a crash never leaves a partial shard
+                    write_pt(shard_filename + ".tmp", shard)
+                    os.replace(shard_filename + ".tmp", shard_filename)
+                data.extend(shard)
+                pbar.update(end - start)
         write_pt(filename, data)
+        shutil.rmtree(shard_dir)
         return data
 
+    def get_ann_index(self, data_filename, data):
+        dirname = os.path.splitext(data_filename)[0] + ".ivf"
+        meta = IVFIndex.read_meta(dirname)
+        if (
+            meta is not None
+            and meta["num_items"] == len(data)
+            and (
+                not os.path.exists(data_filename)
+                or os.path.getmtime(os.path.join(dirname, "meta.json"))
+                >= os.path.getmtime(data_filename)
+            )
+        ):
+            return IVFIndex.load(dirname)
+        index = IVFIndex.build(stack_embeddings(data), num_lists=self.ann_num_lists)
+        index.save(dirname)
+        return IVFIndex.load(dirname)
+
+    def get_exemplar_index(self, train_data=None):
+        """
+        Builds the ExemplarIndex once (or loads it from `exemplar_index_path`)
+        and reuses it for every later query.
+        """
+        with self._exemplar_index_lock:
+            if train_data is None:
+                if self._train_data is None:
+                    self._train_data = self.get_processed_data("train")
+                train_data = self._train_data
+            if self._exemplar_index is not None and self._exemplar_source is train_data:
+                return self._exemplar_index
+            path = self.exemplar_index_path
+            if train_data is not self._train_data:
+                path = None
+            config = dict(
+                dataset=self.dataset,
+                task=self.task,
+                candidate_size=self.candidate_size,
+                num_prompt=self._num_candidates(),
+                fingerprint=self._train_fingerprint(train_data),
+                **self._selector_kwargs(),
+            )
+            index = None
+            if path and os.path.exists(path):
+                index = self._load_exemplar_index(path, train_data, config)
+            if index is None:
+                index = ExemplarIndex(train_data=train_data, **config)
+                if path:
+                    index.save(path)
+            self._exemplar_index = index
+            self._exemplar_source = train_data
+            return index
+
+    def _load_exemplar_index(self, path, train_data, config):
+        """
+        The index saved at `path`, or None when it is stale: saved with other
+        settings or for an older train split, or unreadable.
+        """
+        try:
+            index = ExemplarIndex.load(path)
+            if getattr(index, "config_key", None) != ExemplarIndex.make_config_key(
+                **config
+            ):
+                return None
+            return index.attach(train_data, self.index)
+        except Exception:
+            # e.g. a truncated or old-format pickle, or positions past the split
+            return None
+
+    def _train_fingerprint(self, train_data):
+        filename = self._processed_filename("train")
+        mtime = os.path.getmtime(filename) if os.path.exists(filename) else None
+        return f"{len(train_data)}/{mtime}"
+
+    def get_serialized_exemplars(self):
+        """
+        Input/output strings of every train item for this serializer config,
+        built once and saved next to the processed train split.
+        """
+        self.get_exemplar_index()
+        with self._serialized_exemplars_lock:
+            if self._serialized_exemplars is not None:
+                return self._serialized_exemplars
+            train_data = self._train_data
+            data_filename = self._processed_filename("train")
+            filename = SerializedExemplars.filename(data_filename, self.serializer)
+            serialized = None
+            if os.path.exists(filename) and (
+                not os.path.exists(data_filename)
+                or os.path.getmtime(filename) >= os.path.getmtime(data_filename)
+            ):
+                serialized = SerializedExemplars.load(filename)
+                if (
+                    serialized.config_key != self.serializer.config_key()
+                    or len(serialized) != len(train_data)
+                ):
+                    serialized = None
+            if serialized is None:
+                serialized = SerializedExemplars.build(self.serializer, train_data)
+                serialized.save(filename)
+            self._serialized_exemplars = serialized
+            return serialized
+
     def select_exemplars(self, train_data, test_item):
-        selector = create_selector(
-            task=self.task,
-            train_data=train_data,
-            candidate_size=self.candidate_size,
-            num_prompt=self.num_prompt
-        )
-        return selector(test_item)
+        return self.get_exemplar_index(train_data)(test_item)
+
+    def _num_candidates(self):
+        """
+        Exemplars the index ranks per query. The token budget mode ranks extra
+        ones to fall back on when the best ones do not fit.
+        """
+        if self.token_budget is None:
+            return self.num_prompt
+        return self.budget_candidates or 2 * self.num_prompt
+
+    def _selector_kwargs(self):
+        if self.task == "text" and self.index is not None:
+            return {"index": self.index, "num_probe": self.ann_num_probe}
+        return {}
 
     def build_prompt(self, exemplars, test_item):
         return build_prompt(
             self.serializer, exemplars, test_item, self.dataset
         )
 
-    def call_model(self, prompt):
-        messages = [{"role": "user", "content": prompt}]
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            top_p=self.top_p,
-            frequency_penalty=self.frequency_penalty,
-            presence_penalty=self.presence_penalty,
-            n=self.num_return,
+    def build_prompt_from_positions(self, positions, test_item):
+        samples = self.get_serialized_exemplars().samples(positions)
+        return build_prompt_from_samples(
+            self.serializer, samples, test_item, self.dataset
         )
+
+    def build_budgeted_prompt(
+        self, positions, test_item, shuffle=True, arrange=None, max_samples=None
+    ):
+        """
+        Packs the exemplars at `positions` (best first) into `token_budget`.
+
+        Returns:
+            prompt str
+            prompt_tokens int: tokens of the prompt under `token_counter`
+        """
+        serialized = self.get_serialized_exemplars()
+        token_counts = serialized.token_counts(self.token_counter)
+        prompt, _, prompt_tokens = build_prompt_with_budget(
+            self.serializer,
+            serialized.samples(positions),
+            test_item,
+            self.dataset,
+            token_budget=self.token_budget,
+            count_tokens=self.token_counter,
+            sample_tokens=[token_counts[i] for i in positions],
+            max_samples=max_samples or self.num_prompt,
+            shuffle=shuffle,
+            arrange=arrange,
+        )
+        return prompt, prompt_tokens
+
+    def get_exemplar_usage(self):
+        """
+        Exemplar usage counts for the "prefix" layout, loaded from
+        `exemplar_usage_path` (see `fit_exemplar_usage`). Without a fitted file
+        the canonical order falls back to train position.
+        """
+        if self._exemplar_usage is None:
+            path = self.exemplar_usage_path
+            if path and os.path.exists(path):
+                usage = ExemplarUsage.load(path)
+            else:
+                usage = ExemplarUsage()
+            if self.num_pinned is not None:
+                usage.num_pinned = self.num_pinned
+            self._exemplar_usage = usage
+        return self._exemplar_usage
+
+    def fit_exemplar_usage(self, user_texts):
+        """
+        Replays a query log through exemplar selection and stores the usage
+        counts (in `exemplar_usage_path` when set).
+        """
+        queries = [self.processor(user_text) for user_text in user_texts]
+        usage = ExemplarUsage.fit(
+            self.get_exemplar_index(), queries, num_pinned=self.num_pinned or 0
+        )
+        if self.exemplar_usage_path:
+            usage.save(self.exemplar_usage_path)
+        self._exemplar_usage = usage
+        return usage
+
+    def make_prompt(self, exemplar_index, test_item):
+        """
+        Selects exemplars for `test_item` and builds its prompt, under the
+        character cutoff or `token_budget`. With `prompt_layout="prefix"` the
+        pinned exemplars come first and the rest follow in canonical order;
+        otherwise exemplars are shuffled as in LayoutPrompter.
+
+        Returns:
+            prompt str
+            prompt_tokens int: None without `token_budget`
+        """
+        shuffle = exemplar_index.shuffle
+        if self.prompt_layout != "prefix":
+            if self.token_budget is None:
+                positions = exemplar_index.select(test_item, shuffle=shuffle)
+                return self.build_prompt_from_positions(positions, test_item), None
+            positions = exemplar_index.select(test_item, shuffle=False)
+            return self.build_budgeted_prompt(positions, test_item, shuffle=shuffle)
+
+        # which exemplars fit is decided best first, then they are reordered
+        usage = self.get_exemplar_usage()
+        positions = usage.prioritize(
+            exemplar_index.select(test_item, shuffle=False), self.num_prompt
+        )
+        order = {p: k for k, p in enumerate(usage.arrange(positions))}
+        if self.token_budget is None:
+            kept = fit_samples(
+                self.serializer,
+                self.get_serialized_exemplars().samples(positions),
+                self.dataset,
+                max_samples=self.num_prompt,
+            )
+            kept = sorted((positions[k] for k in kept), key=order.get)
+            return self.build_prompt_from_positions(kept, test_item), None
+        return self.build_budgeted_prompt(
+            positions,
+            test_item,
+            shuffle=False,
+            arrange=lambda kept: sorted(kept, key=lambda k: order[positions[k]]),
+            max_samples=self.num_prompt,
+        )
+
+    @property
+    def response_cache(self):
+        if self._response_cache is None:
+            self._response_cache = ResponseCache(
+                self.response_cache_path,
+                memory_size=self.response_cache_size,
+                maxsize=self.response_disk_cache_size,
+                ttl=self.response_cache_ttl,
+            )
+        return self._response_cache
+
+    def _sampling_params(self, n=None):
+        return {
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "frequency_penalty": self.frequency_penalty,
+            "presence_penalty": self.presence_penalty,
+            "n": n or self.num_return,
+        }
+
+    def response_key(self, messages, n=None, attempt=0):
+        # follow-up requests of the adaptive sampler need their own entries
+        parts = [] if attempt == 0 else [f"attempt {attempt}"]
+        return hash_key(
+            self.model,
+            json.dumps(self._sampling_params(n), sort_keys=True),
+            hash_key(json.dumps(messages, ensure_ascii=False)),
+            *parts,
+        )
+
+    def _cached_response(self, messages, n=None, attempt=0):
+        """
+        Returns:
+            key str: response cache key, None when caching is off
+            response ChatCompletion: None on a miss
+        """
+        if self.response_cache_mode == "off":
+            return None, None
+        key = self.response_key(messages, n, attempt)
+        replay = self.response_cache_mode == "replay"
+        # replay ignores the TTL so recorded runs stay reproducible
+        cached = self.response_cache.get(key, check_ttl=not replay)
+        if cached is not None:
+            return key, ChatCompletion.model_validate_json(cached)
+        if replay:
+            raise LookupError(
+                f"no cached response for this prompt ({key[:16]}) in replay mode"
+            )
+        return key, None
+
+    def call_model(self, prompt, n=None, attempt=0):
+        messages = [{"role": "user", "content": prompt}]
+        key, response = self._cached_response(messages, n, attempt)
+        if response is None:
+            response = self.client.chat.completions.create(
+                model=self.model, messages=messages, **self._sampling_params(n)
+            )
+            if key is not None:
+                self.response_cache.put(key, response.model_dump_json())
+        return response
+
+    async def acall_model(self, prompt, n=None, attempt=0):
+        messages = [{"role": "user", "content": prompt}]
+        key, response = self._cached_response(messages, n, attempt)
+        if response is None:
+            response = await self.async_client.chat.completions.create(
+                model=self.model, messages=messages, **self._sampling_params(n)
+            )
+            if key is not None:
+                self.response_cache.put(key, response.model_dump_json())
         return response
 
     def parse_response(self, response):
         return self.parser(response)
 
+    def stream_layouts(self, prompt, max_layouts=None):
+        """
+        Yields parsed layouts as their completions finish (`</html>` or the
+        end of the choice), and closes the request once `max_layouts` have
+        parsed. A cached response is parsed instead; streamed responses are
+        not written to the response cache.
+        """
+        messages = [{"role": "user", "content": prompt}]
+        _, response = self._cached_response(messages)
+        if response is not None:
+            yield from self.parse_response(response)[:max_layouts]
+            return
+        stream = self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True, **self._sampling_params()
+        )
+        stream_parser = StreamParser(self.parser)
+        count = 0
+        try:
+            for chunk in stream:
+                for layout in stream_parser.feed(chunk):
+                    yield layout
+                    count += 1
+                    if max_layouts is not None and count >= max_layouts:
+                        return
+            rest = stream_parser.finish()
+            if max_layouts is not None:
+                rest = rest[: max_layouts - count]
+            for layout in rest:
+                yield layout
+        finally:
+            stream.close()
+
+    async def astream_layouts(self, prompt, max_layouts=None):
+        messages = [{"role": "user", "content": prompt}]
+        _, response = self._cached_response(messages)
+        if response is not None:
+            for layout in self.parse_response(response)[:max_layouts]:
+                yield layout
+            return
+        stream = await self.async_client.chat.completions.create(
+            model=self.model, messages=messages, stream=True, **self._sampling_params()
+        )
+        stream_parser = StreamParser(self.parser)
+        count = 0
+        try:
+            async for chunk in stream:
+                for layout in stream_parser.feed(chunk):
+                    yield layout
+                    count += 1
+                    if max_layouts is not None and count >= max_layouts:
+                        return
+            rest = stream_parser.finish()
+            if max_layouts is not None:
+                rest = rest[: max_layouts - count]
+            for layout in rest:
+                yield layout
+        finally:
+            await stream.close()
+
+    def get_layouts(self, prompt):
+        """
+        Parsed layouts for `prompt`: streamed when `stream` is set, else
+        through the adaptive sampler when enabled, else one `call_model`.
+        """
+        if self.stream:
+            return list(self.stream_layouts(prompt, self.max_layouts))
+        if self.sampler is not None:
+            return self.sampler.sample(
+                self.dataset,
+                prompt,
+                lambda n, attempt: self.call_model(prompt, n, attempt),
+                self.parse_response,
+            )
+        return self.parse_response(self.call_model(prompt))
+
     def rank_layouts(self, parsed):
         return self.ranker(parsed)
     
     def generate_content(self, ranked, user_text):
+        # one content request per distinct label multiset, sent concurrently
+        layouts = [
+            [ID2LABEL[self.dataset].get(l.item(), str(l.item())) for l in labels]
+            for labels, _ in ranked
+        ]
+        contents = generate_contents_batch(
+            user_text, layouts, max_workers=self.content_workers
+        )
         ranked_with_contents = []
-        for item in ranked:
-            labels, bboxes = item
-            label_names = [ID2LABEL[self.dataset].get(l.item(), str(l.item())) for l in labels]
+        for (labels, bboxes), content in zip(ranked, contents):
             ranked_with_contents.append({
                 'labels': labels,
                 'bboxes': bboxes,
-                'content': generate_contents(user_text, label_names)
+                'content': content
             })
         return ranked_with_contents
 
@@ -137,16 +693,16 @@ class TextToLayoutPipeline:
         grid_img.save(output_path)
 
     def run(self, test_idx=0, user_text:str = None):
-        train = self.get_processed_data("train")
+        exemplar_index = self.get_exemplar_index()
         # _ = self.get_processed_data("val")
         # test = self.get_processed_data("test")
         
         test = [self.processor(user_text)]
 
-        exemplars = self.select_exemplars(train, test[test_idx])
-        prompt = self.build_prompt(exemplars, test[test_idx])
-        response = self.call_model(prompt)
-        parsed = self.parse_response(response)
+        prompt, self.last_prompt_tokens = self.make_prompt(
+            exemplar_index, test[test_idx]
+        )
+        parsed = self.get_layouts(prompt)
         ranked = self.rank_layouts(parsed)
         ranked_with_contents = self.generate_content(ranked, user_text)
 
@@ -155,6 +711,126 @@ class TextToLayoutPipeline:
 
         return ranked_with_contents[0]
 
+    def prepare_batch(self, user_texts):
+        """
+        Embedding, selection and prompt building for every text up front, with
+        the text embeddings computed `batch_size` at a time.
+        """
+        exemplar_index = self.get_exemplar_index()
+        queries = self.processor.process_queries(user_texts, self.batch_size)
+        return [self.make_prompt(exemplar_index, query)[0] for query in queries]
+
+    def _finish(self, user_text, contents, response=None, parsed=None):
+        if parsed is None:
+            parsed = self.parse_response(response)
+        if not parsed:
+            return None
+        ranked = self.rank_layouts(parsed)
+        if not contents:
+            return ranked[0] if ranked else None
+        ranked_with_contents = self.generate_content(ranked[:1], user_text)
+        return ranked_with_contents[0] if ranked_with_contents else None
+
+    async def astream_prompts(
+        self, prompts, user_texts, concurrency=None, contents=True, return_exceptions=False
+    ):
+        """
+        Sends `prompts` with at most `concurrency` (default `max_concurrency`)
+        model calls in flight and yields `(index, result)` in input order, each
+        as soon as it and every earlier one are done. A result is the best
+        ranked layout (as `run` returns, without visualizing), or None when no
+        candidate parses. A failed prompt (e.g. its model call raised) stops
+        the batch, or with `return_exceptions` is yielded as its exception,
+        as in `asyncio.gather`.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.max_concurrency)
+
+        async def process(prompt, user_text):
+            response, parsed = None, None
+            async with semaphore:
+                if self.stream:
+                    parsed = [
+                        layout
+                        async for layout in self.astream_layouts(prompt, self.max_layouts)
+                    ]
+                elif self.sampler is not None:
+                    parsed = await self.sampler.asample(
+                        self.dataset,
+                        prompt,
+                        lambda n, attempt: self.acall_model(prompt, n, attempt),
+                        self.parse_response,
+                    )
+                else:
+                    response = await self.acall_model(prompt)
+            # parsing, ranking and content generation block, so keep them
+            # off the event loop
+            return await asyncio.to_thread(
+                self._finish, user_text, contents, response, parsed
+            )
+
+        # tasks copy the context, so their calls queue behind interactive
+        # ones when the transport has a rate limiter, unless the caller set
+        # a priority of its own
+        with request_priority(current_priority(default=BATCH)):
+            tasks = [
+                asyncio.ensure_future(process(prompt, user_text))
+                for prompt, user_text in zip(prompts, user_texts)
+            ]
+        try:
+            for i, task in enumerate(tasks):
+                try:
+                    result = await task
+                except Exception as error:
+                    if not return_exceptions:
+                        raise
+                    result = error
+                yield i, result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream_batch(
+        self, user_texts, concurrency=None, contents=True, return_exceptions=False
+    ):
+        prompts = await asyncio.to_thread(self.prepare_batch, user_texts)
+        async for item in self.astream_prompts(
+            prompts, user_texts, concurrency, contents, return_exceptions
+        ):
+            yield item
+
+    async def arun_batch(
+        self, user_texts, concurrency=None, contents=True, return_exceptions=False
+    ):
+        return [
+            result
+            async for _, result in self.astream_batch(
+                user_texts, concurrency, contents, return_exceptions
+            )
+        ]
+
+    async def arun(self, user_text, contents=True):
+        return (await self.arun_batch([user_text], contents=contents))[0]
+
+    async def aclose(self):
+        await (self.transport or get_transport()).aclose()
+
+    def run_batch(
+        self, user_texts, concurrency=None, contents=True, return_exceptions=False
+    ):
+        """
+        Blocking `arun_batch`: results in input order.
+        """
+
+        async def run():
+            try:
+                return await self.arun_batch(
+                    user_texts, concurrency, contents, return_exceptions
+                )
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run())
+
 
 if __name__ == "__main__":
     pipeline = TextToLayoutPipeline(dataset="webui")
@@ -0,0 +1,141 @@
+import json
+import os
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file index over L2-normalized embeddings (inner product search).
+
+    Vectors are clustered with spherical k-means and stored grouped by list, so
+    probing a list is a contiguous slice of `vectors`. On disk every array is a
+    plain `.npy` file, which lets `load` memory-map the index.
+    """
+
+    files = ("centroids", "offsets", "ids", "vectors")
+
+    def __init__(self, centroids, offsets, ids, vectors):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def num_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        num_lists: int = None,
+        num_iters: int = 10,
+        sample_size: int = 65536,
+        seed: int = 0,
+        chunk_size: int = 65536,
+    ):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        num_items = len(embeddings)
+        if num_lists is None:
+            num_lists = max(1, int(4 * np.sqrt(num_items)))
+        num_lists = min(num_lists, num_items)
+
+        rng = np.random.default_rng(seed)
+        sample = embeddings
+        if num_items > sample_size:
+            sample = embeddings[rng.choice(num_items, sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), num_lists, replace=False)].copy()
+        for _ in range(num_iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assign, minlength=num_lists)
+            nonempty = np.flatnonzero(counts)
+            starts = np.concatenate([[0], np.cumsum(counts)])[nonempty]
+            sums = np.zeros_like(centroids)
+            sums[nonempty] = np.add.reduceat(
+                sample[np.argsort(assign, kind="stable")], starts, axis=0
+            )
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(len(sample), empty.sum())]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        assign = np.concatenate(
+            [
+                np.argmax(embeddings[i : i + chunk_size] @ centroids.T, axis=1)
+                for i in range(0, num_items, chunk_size)
+            ]
+        )
+        ids = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=num_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(
+            centroids=centroids.astype(np.float32),
+            offsets=offsets.astype(np.int64),
+            ids=ids.astype(np.int64),
+            vectors=np.ascontiguousarray(embeddings[ids]),
+        )
+
+    def probe(self, query: np.ndarray, num_probe: int = 8):
+        """
+        Exact inner products for every item in the `num_probe` closest lists.
+
+        Returns:
+            ids np.ndarray: positions of the probed items in the original data
+            scores np.ndarray: their inner products with `query`
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        num_probe = min(num_probe, self.num_lists)
+        centroid_scores = self.centroids @ query
+        lists = np.argpartition(-centroid_scores, num_probe - 1)[:num_probe]
+        ids, scores = [], []
+        for i in lists:
+            start, end = self.offsets[i], self.offsets[i + 1]
+            if start == end:
+                continue
+            ids.append(self.ids[start:end])
+            scores.append(self.vectors[start:end] @ query)
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(ids), np.concatenate(scores)
+
+    def search(self, query: np.ndarray, k: int, num_probe: int = 8):
+        ids, scores = self.probe(query, num_probe)
+        if len(ids) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return ids[order], scores[order]
+
+    def save(self, dirname: str):
+        os.makedirs(dirname, exist_ok=True)
+        for name in self.files:
+            np.save(os.path.join(dirname, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(dirname, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "num_items": len(self),
+                    "num_lists": self.num_lists,
+                    "dim": int(self.vectors.shape[1]),
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, dirname: str, mmap_mode: str = "r"):
+        arrays = {
+            name: np.load(os.path.join(dirname, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in cls.files
+        }
+        return cls(**arrays)
+
+    @staticmethod
+    def read_meta(dirname: str):
+        filename = os.path.join(dirname, "meta.json")
+        if not os.path.exists(filename):
+            return None
+        with open(filename, "r") as f:
+            return json.load(f)
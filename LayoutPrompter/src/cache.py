@@ -0,0 +1,310 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def hash_key(*parts: str):
+    """
+    sha256 over the parts, separated so ("ab", "c") and ("a", "bc") differ.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache holding at most `maxsize` entries.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class DiskCache:
+    """
+    sqlite-backed store of numpy arrays keyed by string, bounded to
+    `maxsize` entries. The least recently read entries are evicted first.
+    """
+
+    def __init__(self, filename: str, maxsize: int = 100000):
+        self.filename = filename
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, dtype TEXT, shape TEXT, value BLOB, accessed REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+        )
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dtype, shape, value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        dtype, shape, value = row
+        shape = tuple(int(s) for s in shape.split(",") if s)
+        return np.frombuffer(value, dtype=dtype).reshape(shape).copy()
+
+    def put(self, key, value: np.ndarray):
+        if self.maxsize <= 0:
+            return
+        value = np.ascontiguousarray(value)
+        shape = ",".join(str(s) for s in value.shape)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, value.dtype.str, shape, value.tobytes(), time.time()),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.maxsize:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                    (count - self.maxsize,),
+                )
+                self.evictions += count - self.maxsize
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TwoLevelCache:
+    """
+    LRU in front of an optional `DiskCache`. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, memory: LRUCache, disk: DiskCache = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return default if value is None else value
+        value = self.disk.get(key)
+        if value is None:
+            return default
+        self.memory.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+class ResponseCache:
+    """
+    Model responses (JSON strings) by key, in an LRU of `memory_size` entries
+    in front of an optional sqlite file bounded to `maxsize` entries (least
+    recently read evicted first). Entries older than `ttl` seconds are
+    treated as missing and dropped from the file.
+    """
+
+    def __init__(
+        self,
+        filename: str = None,
+        memory_size: int = 256,
+        maxsize: int = 10000,
+        ttl: float = None,
+    ):
+        self.filename = filename
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.memory = LRUCache(memory_size)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if filename:
+            dirname = os.path.dirname(filename)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._conn = sqlite3.connect(filename, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+            self._conn.commit()
+
+    def _fresh(self, created, ttl):
+        return ttl is None or time.time() - created <= ttl
+
+    def get(self, key, default=None, check_ttl: bool = True):
+        """
+        `check_ttl=False` serves expired entries too (replay).
+        """
+        ttl = self.ttl if check_ttl else None
+        entry = self.memory.get(key)
+        if entry is not None and self._fresh(entry[0], ttl):
+            self.hits += 1
+            return entry[1]
+        if self._conn is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT created, value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and self._fresh(row[0], ttl):
+                    self._conn.execute(
+                        "UPDATE responses SET accessed = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                    self._conn.commit()
+                    self.hits += 1
+                    self.memory.put(key, tuple(row))
+                    return row[1]
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+            entry = entry or row
+        if entry is not None:
+            self.expired += 1
+        self.misses += 1
+        return default
+
+    def put(self, key, value: str):
+        now = time.time()
+        self.memory.put(key, (now, value))
+        if self._conn is None or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.ttl is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE created < ?", (now - self.ttl,)
+                )
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.maxsize:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                    (count - self.maxsize,),
+                )
+                self.evictions += count - self.maxsize
+            self._conn.commit()
+
+    def clear(self):
+        self.memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "memory": self.memory.stats(),
+        }
+        if self._conn is not None:
+            with self._lock:
+                stats["size"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM responses"
+                ).fetchone()[0]
+        return stats
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+from collections.abc import Sequence
+
+import numpy as np
+import torch
+
+from .utilities import read_pt
+
+META_FILENAME = "meta.json"
+
+INTEGER_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _compact_dtype(array: np.ndarray):
+    """
+    Smallest integer dtype that holds every value of `array`; other dtypes are kept.
+    """
+    if array.dtype.kind not in "iu" or array.size == 0:
+        return array.dtype
+    low, high = array.min(), array.max()
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return array.dtype
+
+
+def _save(dirname, name, array):
+    np.save(os.path.join(dirname, f"{name}.npy"), np.ascontiguousarray(array))
+
+
+def write_columnar(dirname: str, data: list):
+    """
+    Writes a processed split column by column:
+    - tensors with one shape for every item are stacked into one array
+    - tensors whose first dimension varies (labels, bboxes) are concatenated
+      and addressed through an offsets array
+    - strings go into a utf-8 string table with offsets
+    - python scalars become one array
+    Integer columns are stored in the smallest dtype that fits.
+    """
+    if len(data) == 0:
+        raise ValueError("Cannot write an empty split")
+    if any(item is None for item in data):
+        raise ValueError("Processed items must not be None")
+    os.makedirs(dirname, exist_ok=True)
+    # rewriting a stale copy: it is incomplete until meta.json is back
+    if os.path.exists(os.path.join(dirname, META_FILENAME)):
+        os.remove(os.path.join(dirname, META_FILENAME))
+    columns = {}
+    for key in data[0].keys():
+        values = [item[key] for item in data]
+        if isinstance(values[0], str):
+            encoded = [value.encode("utf-8") for value in values]
+            offsets = np.cumsum([0] + [len(value) for value in encoded])
+            _save(dirname, f"{key}.strings", np.frombuffer(b"".join(encoded), np.uint8))
+            _save(dirname, f"{key}.offsets", offsets.astype(np.int64))
+            columns[key] = {"kind": "string"}
+        elif isinstance(values[0], torch.Tensor):
+            arrays = [value.numpy() for value in values]
+            shapes = {array.shape for array in arrays}
+            if len(shapes) == 1:
+                kind, array = "fixed", np.stack(arrays)
+                offsets = None
+            else:
+                kind, array = "ragged", np.concatenate(arrays)
+                offsets = np.cumsum([0] + [len(a) for a in arrays]).astype(np.int64)
+            _save(dirname, key, array.astype(_compact_dtype(array)))
+            if offsets is not None:
+                _save(dirname, f"{key}.offsets", offsets)
+            columns[key] = {"kind": kind, "dtype": str(values[0].dtype)}
+        else:
+            array = np.asarray(values)
+            _save(dirname, key, array.astype(_compact_dtype(array)))
+            columns[key] = {"kind": "scalar"}
+    # written last: a directory with meta.json is complete
+    with open(os.path.join(dirname, META_FILENAME), "w") as f:
+        json.dump({"num_items": len(data), "columns": columns}, f)
+
+
+class ColumnarDataset(Sequence):
+    """
+    Read side of `write_columnar`. Every column is memory-mapped, so opening a
+    split is close to instant and processes reading the same files share the
+    pages. Items are rebuilt on access as dicts of tensors, with integer
+    columns widened back to their original dtype.
+    """
+
+    def __init__(self, dirname: str, mmap_mode: str = "c"):
+        self.dirname = dirname
+        self.mmap_mode = mmap_mode
+        with open(os.path.join(dirname, META_FILENAME), "r") as f:
+            meta = json.load(f)
+        self.num_items = meta["num_items"]
+        self.columns = meta["columns"]
+        self.arrays = {}
+        for key, column in self.columns.items():
+            names = {
+                "string": [f"{key}.strings", f"{key}.offsets"],
+                "ragged": [key, f"{key}.offsets"],
+            }.get(column["kind"], [key])
+            for name in names:
+                self.arrays[name] = np.load(
+                    os.path.join(dirname, f"{name}.npy"), mmap_mode=mmap_mode
+                )
+
+    @staticmethod
+    def exists(dirname: str):
+        return os.path.exists(os.path.join(dirname, META_FILENAME))
+
+    def __len__(self):
+        return self.num_items
+
+    def _tensor(self, array, key):
+        tensor = torch.from_numpy(np.asarray(array))
+        dtype = getattr(torch, self.columns[key]["dtype"].replace("torch.", ""))
+        return tensor if tensor.dtype == dtype else tensor.to(dtype)
+
+    def get(self, idx: int, key: str):
+        kind = self.columns[key]["kind"]
+        if kind == "string":
+            offsets = self.arrays[f"{key}.offsets"]
+            raw = self.arrays[f"{key}.strings"][offsets[idx] : offsets[idx + 1]]
+            return bytes(raw).decode("utf-8")
+        if kind == "ragged":
+            offsets = self.arrays[f"{key}.offsets"]
+            return self._tensor(self.arrays[key][offsets[idx] : offsets[idx + 1]], key)
+        if kind == "fixed":
+            return self._tensor(self.arrays[key][idx], key)
+        return self.arrays[key][idx].item()
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return {key: self.get(idx, key) for key in self.columns}
+
+    def column(self, key: str):
+        """
+        The whole stacked array of a fixed-shape column (e.g. embeddings).
+        """
+        if self.columns[key]["kind"] != "fixed":
+            raise ValueError(f"Column {key} is not a fixed-shape column")
+        return self.arrays[key]
+
+    def ragged(self, key: str):
+        """
+        (concatenated values, offsets) of a variable-length column.
+        """
+        kind = self.columns[key]["kind"]
+        if kind == "fixed":
+            # every item happened to have the same length when the split was written
+            array = self.arrays[key]
+            offsets = np.arange(len(array) + 1, dtype=np.int64) * array.shape[1]
+            return array.reshape(-1, *array.shape[2:]), offsets
+        if kind != "ragged":
+            raise ValueError(f"Column {key} is not a ragged column")
+        return self.arrays[key], self.arrays[f"{key}.offsets"]
+
+    def __reduce__(self):
+        # pickles as a reference to the files rather than a copy of the data
+        return self.__class__, (self.dirname, self.mmap_mode)
+
+
+def columnar_dirname(pt_filename: str):
+    return os.path.splitext(pt_filename)[0] + ".columnar"
+
+
+def convert_pt_to_columnar(pt_filename: str, dirname: str = None):
+    dirname = dirname or columnar_dirname(pt_filename)
+    write_columnar(dirname, read_pt(pt_filename, map_location="cpu"))
+    return dirname
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert processed .pt splits to the columnar format"
+    )
+    parser.add_argument("filenames", nargs="+")
+    args = parser.parse_args()
+    for filename in args.filenames:
+        print(f"{filename} -> {convert_pt_to_columnar(filename)}")
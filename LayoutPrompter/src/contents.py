@@ -1,14 +1,32 @@
-from openai import OpenAI
-import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
 from dotenv import load_dotenv
 from typing import Dict, Any
 from pydantic import create_model, Field
 
+from .cache import LRUCache
+from .transport import get_transport
+
 load_dotenv()
 
-client = OpenAI()
+_client = None
+# (user prompt, sorted label names) -> generated contents
+_contents_cache = LRUCache(1024)
 
-def generate_contents(user_prompt: str, layout: list) -> dict:
+
+def get_client():
+    """
+    The OpenAI client is created on first use so importing this module stays
+    cheap. It shares the pooled transport of the other LLM clients.
+    """
+    global _client
+    if _client is None:
+        _client = get_transport().openai("contents")
+    return _client
+
+
+def _request_contents(user_prompt: str, layout: list) -> dict:
     """
     사용자의 프롬프트와 레이아웃 정보를 받아 홍보물의 내용을 생성합니다.
     Structured Outputs 기능을 사용하여 정확한 형식의 응답을 보장합니다.
@@ -17,7 +35,7 @@ def generate_contents(user_prompt: str, layout: list) -> dict:
         user_prompt (str): 사용자의 프롬프트
         layout (list): 예시) ["title", "description", "logo"]
     Returns:
-        dict: 생성된 홍보물 내용(딕셔너리)
+        dict: 생성된 홍보물 내용(딕셔너리), 요청이 실패하면 None
     """
     
     # 동적으로 Pydantic 모델 생성
@@ -33,7 +51,7 @@ Create appropriate content for each item in korean."""
     
     try:
         # Structured Outputs: Pydantic 모델 전달하여 파싱 보장
-        response = client.responses.parse(
+        response = get_client().responses.parse(
             model="gpt-4o-mini",
             input=[
                 {"role": "system", "content": system_text},
@@ -44,7 +62,54 @@ Create appropriate content for each item in korean."""
         return dict(response.output_parsed)
     except Exception as e:
         print(f"Error in generating poster content: {e}")
+        return None
+
+
+def generate_contents(user_prompt: str, layout: list) -> dict:
+    """
+    `_request_contents`, with placeholder contents when the request fails.
+    """
+    contents = _request_contents(user_prompt, layout)
+    if contents is None:
         return {item: f"Default {item}" for item in layout}
+    return contents
+
+
+def generate_contents_batch(user_prompt: str, layouts: list, max_workers: int = 8) -> list:
+    """
+    `generate_contents` for several layouts with one request per distinct
+    label multiset, sent concurrently. Contents are cached by (user_prompt,
+    sorted labels); failed requests fall back to placeholders and are not
+    cached.
+
+    Args:
+        layouts (list): label name lists, e.g. [["title", "logo"], ...]
+    Returns:
+        list: contents dict for each layout
+    """
+    keys = [tuple(sorted(layout)) for layout in layouts]
+    results = {}
+    for key in dict.fromkeys(keys):
+        cached = _contents_cache.get((user_prompt, key))
+        if cached is not None:
+            results[key] = cached
+    missing = [key for key in dict.fromkeys(keys) if key not in results]
+    if missing:
+        # each worker runs in a copy of the caller's context (request priority)
+        contexts = [contextvars.copy_context() for _ in missing]
+        with ThreadPoolExecutor(min(max_workers, len(missing))) as pool:
+            requested = pool.map(
+                lambda key, context: context.run(_request_contents, user_prompt, list(key)),
+                missing,
+                contexts,
+            )
+            for key, contents in zip(missing, requested):
+                if contents is None:
+                    contents = {item: f"Default {item}" for item in key}
+                else:
+                    _contents_cache.put((user_prompt, key), contents)
+                results[key] = contents
+    return [dict(results[key]) for key in keys]
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+from .utilities import build_label_count_matrix, labels_bboxes_similarity
+
+_WORKER_STATE = {}
+
+
+def _init_worker(train_labels, train_bboxes, labels_weight, bboxes_weight):
+    _WORKER_STATE["train_labels"] = train_labels
+    _WORKER_STATE["train_bboxes"] = train_bboxes
+    _WORKER_STATE["labels_weight"] = labels_weight
+    _WORKER_STATE["bboxes_weight"] = bboxes_weight
+
+
+def _score_chunk(indices, test_labels, test_bboxes):
+    return _exact_scores(
+        _WORKER_STATE["train_labels"],
+        _WORKER_STATE["train_bboxes"],
+        indices,
+        test_labels,
+        test_bboxes,
+        _WORKER_STATE["labels_weight"],
+        _WORKER_STATE["bboxes_weight"],
+    )
+
+
+def _exact_scores(
+    train_labels, train_bboxes, indices, test_labels, test_bboxes, labels_weight, bboxes_weight
+):
+    return [
+        labels_bboxes_similarity(
+            train_labels[i],
+            train_bboxes[i],
+            test_labels,
+            test_bboxes,
+            labels_weight,
+            bboxes_weight,
+        )
+        for i in indices
+    ]
+
+
+class BoxMatchingEngine:
+    """
+    Exact top-k search over `labels_bboxes_similarity` for a fixed train set.
+
+    Every candidate first gets a cheap upper bound on its score: the label term
+    is computed exactly from label histograms, and the box term is bounded by
+    assuming each same-label pair the assignment could match is as close as the
+    query box is to the bounding range of the candidate's boxes of that label.
+    Candidates are then scored exactly in descending bound order, and the
+    search stops once no remaining bound can reach the current k-th best score.
+    """
+
+    # slack for the float32 `torch.cdist` error the exact scores carry
+    tolerance = 1e-3
+
+    def __init__(
+        self,
+        train_labels: list,
+        train_bboxes: list,
+        labels_weight: float,
+        bboxes_weight: float,
+        num_workers: int = 0,
+        chunk_size: int = 64,
+    ):
+        self.train_labels = train_labels
+        self.train_bboxes = train_bboxes
+        self.labels_weight = labels_weight
+        self.bboxes_weight = bboxes_weight
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        self.label_counts = build_label_count_matrix(train_labels)
+        self.num_labels = self.label_counts.shape[1]
+        self.lengths = self.label_counts.sum(axis=1)
+        self.postings = self._build_postings()
+
+    def _build_postings(self):
+        """
+        label -> (train indices having the label, per-item min box, per-item max box)
+        """
+        postings = {}
+        if self.lengths.sum() == 0:
+            return postings
+        flat_labels = torch.cat([torch.as_tensor(l) for l in self.train_labels]).numpy()
+        flat_bboxes = torch.cat(
+            [torch.as_tensor(b).reshape(len(b), -1) for b in self.train_bboxes]
+        ).double().numpy()
+        rows = np.repeat(np.arange(len(self.train_labels)), self.lengths)
+        for label in np.unique(flat_labels):
+            mask = flat_labels == label
+            items, starts = np.unique(rows[mask], return_index=True)
+            bboxes = flat_bboxes[mask]
+            postings[int(label)] = (
+                items,
+                np.minimum.reduceat(bboxes, starts, axis=0),
+                np.maximum.reduceat(bboxes, starts, axis=0),
+            )
+        return postings
+
+    def upper_bounds(self, test_labels, test_bboxes):
+        test_labels = torch.as_tensor(test_labels).numpy()
+        test_bboxes = torch.as_tensor(test_bboxes).reshape(len(test_labels), -1)
+        test_bboxes = test_bboxes.double().numpy()
+        num_test = len(test_labels)
+
+        intersection = np.zeros(len(self.train_labels))
+        bboxes_bound = np.zeros(len(self.train_labels))
+        for label in np.unique(test_labels):
+            if int(label) not in self.postings:
+                continue
+            items, low, high = self.postings[int(label)]
+            query = test_bboxes[test_labels == label]
+            min_distance = np.full(len(items), np.inf)
+            for bbox in query:
+                gap = np.maximum(low - bbox, 0) + np.maximum(bbox - high, 0)
+                min_distance = np.minimum(min_distance, np.sqrt((gap**2).sum(-1)))
+            matches = np.minimum(self.label_counts[items, label], len(query))
+            intersection[items] += matches
+            bboxes_bound[items] += matches * np.power(0.5, 2 * min_distance)
+
+        labels_sim = 2 * intersection / np.maximum(self.lengths + num_test, 1)
+        bboxes_bound /= np.maximum(np.minimum(self.lengths, num_test), 1)
+        return (
+            self.labels_weight * labels_sim
+            + self.bboxes_weight * np.minimum(bboxes_bound, 1.0)
+            + self.tolerance
+        )
+
+    @property
+    def pool(self):
+        if self.num_workers <= 1:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    "fork" if "fork" in methods else None
+                )
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(
+                        self.train_labels,
+                        self.train_bboxes,
+                        self.labels_weight,
+                        self.bboxes_weight,
+                    ),
+                )
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def exact_scores(self, indices, test_labels, test_bboxes):
+        if self.pool is None or len(indices) <= self.chunk_size:
+            return _exact_scores(
+                self.train_labels,
+                self.train_bboxes,
+                indices,
+                test_labels,
+                test_bboxes,
+                self.labels_weight,
+                self.bboxes_weight,
+            )
+        chunks = [
+            indices[i : i + self.chunk_size]
+            for i in range(0, len(indices), self.chunk_size)
+        ]
+        futures = [
+            self.pool.submit(_score_chunk, chunk, test_labels, test_bboxes)
+            for chunk in chunks
+        ]
+        return [score for future in futures for score in future.result()]
+
+    def __call__(self, test_labels, test_bboxes, k: int, exclude: np.ndarray = None):
+        """
+        Returns:
+            scores np.ndarray: exact scores for every candidate that could be in
+                the top-k, -inf for the pruned and excluded ones
+        """
+        bounds = self.upper_bounds(test_labels, test_bboxes)
+        if exclude is not None:
+            bounds[exclude] = -np.inf
+        order = np.argsort(-bounds, kind="stable")
+        order = order[: np.isfinite(bounds).sum()]
+
+        scores = np.full(len(bounds), -np.inf)
+        batch_size = self.chunk_size * max(self.num_workers, 1)
+        kth_score = -np.inf
+        start = 0
+        while start < len(order):
+            end = min(start + batch_size, len(order))
+            if start < k:
+                end = max(end, min(k, len(order)))
+            batch = order[start:end]
+            batch = batch[bounds[batch] >= kth_score]
+            if len(batch) == 0:
+                break
+            scores[batch] = self.exact_scores(batch.tolist(), test_labels, test_bboxes)
+            start = end
+            if start >= k:
+                evaluated = scores[order[:start]]
+                kth_score = np.partition(evaluated, len(evaluated) - k)[len(evaluated) - k]
+                if start < len(order) and bounds[order[start]] < kth_score:
+                    break
+        return scores
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        del state["_pool_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
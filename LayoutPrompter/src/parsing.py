@@ -6,14 +6,42 @@ from openai.types.chat import ChatCompletion
 
 from .utilities import CANVAS_SIZE, ID2LABEL
 
+# one match per <div>: class, left, top, width, height (in serializer order)
+HTML_ELEMENT = re.compile(
+    r'<div class="([^"]*)"[^>]*?left:.?(\d+)px[^>]*?top:.?(\d+)px'
+    r"[^>]*?width:.?(\d+)px[^>]*?height:.?(\d+)px"
+)
+# fallback for predictions with elements HTML_ELEMENT misses
+HTML_TAG = re.compile(r'<div class="([^"]*)"([^>]*)>')
+HTML_BOX = re.compile(r"(left|top|width|height):.?(\d+)px")
+BOX_KEYS = ("left", "top", "width", "height")
+
+
+class ParseError(ValueError):
+    """
+    A prediction that does not describe a layout.
+    """
+
 
 class Parser:
-    def __init__(self, dataset: str, output_format: str):
+    """
+    Layouts from model outputs in one pass per prediction, with patterns
+    compiled once. With `partial` (default), malformed elements (unknown
+    label, missing box values) are skipped and the rest of the layout is
+    kept; otherwise any malformed element drops the whole prediction. A
+    prediction with no valid element is dropped either way.
+    """
+
+    def __init__(self, dataset: str, output_format: str, partial: bool = True):
         self.dataset = dataset
         self.output_format = output_format
+        self.partial = partial
         self.id2label = ID2LABEL[self.dataset]
         self.label2id = {v: k for k, v in self.id2label.items()}
         self.canvas_width, self.canvas_height = CANVAS_SIZE[self.dataset]
+        self.seq_pattern = re.compile(
+            r"(" + "|".join(map(re.escape, self.label2id)) + r") (\d+) (\d+) (\d+) (\d+)"
+        )
 
     def _extract_labels_and_bboxes(self, prediction: str):
         if self.output_format == "seq":
@@ -21,45 +49,57 @@ class Parser:
         elif self.output_format == "html":
             return self._extract_labels_and_bboxes_from_html(prediction)
 
-    def _extract_labels_and_bboxes_from_html(self, predition: str):
-        labels = re.findall('<div class="(.*?)"', predition)[1:]  # remove the canvas
-        x = re.findall(r"left:.?(\d+)px", predition)[1:]
-        y = re.findall(r"top:.?(\d+)px", predition)[1:]
-        w = re.findall(r"width:.?(\d+)px", predition)[1:]
-        h = re.findall(r"height:.?(\d+)px", predition)[1:]
-        if not (len(labels) == len(x) == len(y) == len(w) == len(h)):
-            raise RuntimeError
-        labels = torch.tensor([self.label2id[label] for label in labels])
+    def _to_tensors(self, elements):
+        if not elements:
+            raise ParseError("no valid element")
+        labels = torch.tensor([label for label, *_ in elements])
         bboxes = torch.tensor(
             [
                 [
-                    int(x[i]) / self.canvas_width,
-                    int(y[i]) / self.canvas_height,
-                    int(w[i]) / self.canvas_width,
-                    int(h[i]) / self.canvas_height,
+                    int(x) / self.canvas_width,
+                    int(y) / self.canvas_height,
+                    int(w) / self.canvas_width,
+                    int(h) / self.canvas_height,
                 ]
-                for i in range(len(x))
+                for _, x, y, w, h in elements
             ]
         )
         return labels, bboxes
 
+    def _extract_labels_and_bboxes_from_html(self, prediction: str):
+        matches = HTML_ELEMENT.findall(prediction)
+        if len(matches) != prediction.count('<div class="'):
+            # an element is missing a box value or has them in another order
+            matches = self._match_html_tags(prediction)
+        elements = []
+        for label, *box in matches:
+            if label == "canvas":
+                continue
+            if label not in self.label2id:
+                if self.partial:
+                    continue
+                raise ParseError(f"unknown label: {label}")
+            elements.append((self.label2id[label], *box))
+        return self._to_tensors(elements)
+
+    def _match_html_tags(self, prediction: str):
+        matches = []
+        for label, style in HTML_TAG.findall(prediction):
+            box = dict(HTML_BOX.findall(style))
+            if len(box) < 4:
+                if self.partial or label == "canvas":
+                    continue
+                raise ParseError(f"missing box values: {label} {style}")
+            matches.append((label, *(box[key] for key in BOX_KEYS)))
+        return matches
+
     def _extract_labels_and_bboxes_from_seq(self, prediction: str):
-        label_set = list(self.label2id.keys())
-        seq_pattern = r"(" + "|".join(label_set) + r") (\d+) (\d+) (\d+) (\d+)"
-        res = re.findall(seq_pattern, prediction)
-        labels = torch.tensor([self.label2id[item[0]] for item in res])
-        bboxes = torch.tensor(
-            [
-                [
-                    int(item[1]) / self.canvas_width,
-                    int(item[2]) / self.canvas_height,
-                    int(item[3]) / self.canvas_width,
-                    int(item[4]) / self.canvas_height,
-                ]
-                for item in res
-            ]
-        )
-        return labels, bboxes
+        # text that does not match a known label and four numbers is skipped
+        elements = [
+            (self.label2id[label], *box)
+            for label, *box in self.seq_pattern.findall(prediction)
+        ]
+        return self._to_tensors(elements)
 
     def __call__(self, predictions):
         if isinstance(predictions, ChatCompletion):
@@ -70,8 +110,77 @@ class Parser:
 
         parsed_predictions = []
         for prediction in predictions:
-            try:
-                parsed_predictions.append(self._extract_labels_and_bboxes(prediction))
-            except:
-                continue
+            parsed = self.parse_one(prediction)
+            if parsed is not None:
+                parsed_predictions.append(parsed)
         return parsed_predictions
+
+    def parse_one(self, prediction: str):
+        """
+        (labels, bboxes) of one prediction, or None when it has no valid
+        element (or, without `partial`, any malformed one).
+        """
+        if not prediction:
+            return None
+        try:
+            return self._extract_labels_and_bboxes(prediction)
+        except ParseError:
+            return None
+
+
+class StreamParser:
+    """
+    Parses streamed chat completion chunks (`stream=True`, any `n`). Each
+    choice goes to `parser` as soon as its text contains an end marker
+    (`</html>` for html output) or the choice finishes. Text after the marker
+    is dropped. Layouts come out in completion order, not choice order.
+    """
+
+    def __init__(self, parser: Parser, end_markers: list = None):
+        self.parser = parser
+        if end_markers is None:
+            end_markers = ["</html>"] if parser.output_format == "html" else []
+        self.end_markers = end_markers
+        self.buffers = {}
+        self.done = set()
+
+    def _end(self, text: str, start: int):
+        ends = [
+            text.find(marker, start) + len(marker)
+            for marker in self.end_markers
+            if marker in text[start:]
+        ]
+        return min(ends) if ends else None
+
+    def _complete(self, index: int):
+        self.done.add(index)
+        parsed = self.parser.parse_one(self.buffers.pop(index, ""))
+        return [] if parsed is None else [parsed]
+
+    def feed(self, chunk):
+        """
+        Returns:
+            parsed list: layouts completed by this chunk
+        """
+        parsed = []
+        for choice in chunk.choices:
+            if choice.index in self.done:
+                continue
+            previous = self.buffers.get(choice.index, "")
+            text = previous + (choice.delta.content or "")
+            # only the new text (and a marker straddling the boundary) is searched
+            longest = max((len(marker) for marker in self.end_markers), default=0)
+            end = self._end(text, max(0, len(previous) - longest + 1))
+            self.buffers[choice.index] = text if end is None else text[:end]
+            if end is not None or choice.finish_reason is not None:
+                parsed += self._complete(choice.index)
+        return parsed
+
+    def finish(self):
+        """
+        Parses the choices the stream ended without finishing.
+        """
+        parsed = []
+        for index in list(self.buffers):
+            parsed += self._complete(index)
+        return parsed
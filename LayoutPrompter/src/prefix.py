@@ -0,0 +1,110 @@
+import bisect
+import json
+import os
+from collections import Counter
+
+
+class ExemplarUsage:
+    """
+    How often each train exemplar gets selected, fitted on a replayed query
+    log. It lays prompts out so that requests share long prefixes, which
+    provider-side prompt caching can reuse:
+    - the `num_pinned` most used exemplars open every prompt in a fixed order
+    - the query's own exemplars follow in one canonical order (most used
+      first, then by train position) instead of being shuffled
+    Counts are frozen after fitting. Updating them live would keep changing
+    the canonical order and break the prefixes it is meant to share.
+    """
+
+    def __init__(self, counts: dict = None, num_pinned: int = 0):
+        self.counts = Counter({int(k): v for k, v in (counts or {}).items()})
+        self.num_pinned = num_pinned
+
+    @classmethod
+    def fit(cls, exemplar_index, queries, num_pinned: int = 0):
+        usage = cls(num_pinned=num_pinned)
+        for test_data in queries:
+            usage.counts.update(exemplar_index.select(test_data, shuffle=False))
+        return usage
+
+    def _key(self, position):
+        return (-self.counts[position], position)
+
+    @property
+    def pinned(self):
+        if self.num_pinned <= 0:
+            return []
+        return sorted(self.counts, key=self._key)[: self.num_pinned]
+
+    def arrange(self, positions):
+        """
+        Pinned exemplars first, then `positions` in canonical order.
+        """
+        pinned = self.pinned
+        rest = sorted(set(positions) - set(pinned), key=self._key)
+        return pinned + rest
+
+    def prioritize(self, ranked, num_prompt: int):
+        """
+        Ranked positions (best first) in the order prompt slots are filled:
+        the query's own top `num_prompt - len(pinned)`, then the pinned
+        exemplars, then the rest of `ranked` as fallbacks. Pinned exemplars
+        count toward `num_prompt`, and at most `num_prompt - 1` are used, so
+        the query always keeps its best exemplar.
+        """
+        pinned = self.pinned[: max(num_prompt - 1, 0)]
+        own = [p for p in ranked if p not in pinned]
+        top = own[: num_prompt - len(pinned)]
+        return top + pinned + own[len(top) :]
+
+    def save(self, filename: str):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        with open(filename, "w") as f:
+            json.dump({"num_pinned": self.num_pinned, "counts": self.counts}, f)
+
+    @classmethod
+    def load(cls, filename: str):
+        with open(filename, "r") as f:
+            saved = json.load(f)
+        return cls(saved["counts"], saved["num_pinned"])
+
+
+def simulate_prefix_cache(
+    prompts, count_tokens, min_tokens: int = 1024, block_tokens: int = 128
+):
+    """
+    Replays `prompts` in order through an idealized provider prefix cache
+    that keeps every earlier prompt. A request reuses its longest common
+    prefix with any earlier prompt. Only prefixes of at least `min_tokens`
+    are cached, in whole `block_tokens` blocks (the OpenAI rules).
+
+    Returns:
+        stats dict: prompt and shared/cached token totals, with
+            shared_prefix_ratio = shared / prompt tokens and
+            cached_ratio = cached / prompt tokens
+    """
+    seen = []
+    prompt_tokens = shared_tokens = cached_tokens = 0
+    for prompt in prompts:
+        k = bisect.bisect_left(seen, prompt)
+        # the longest common prefix is with a neighbour in sorted order
+        neighbours = [seen[j] for j in (k - 1, k) if 0 <= j < len(seen)]
+        common = max(
+            [len(os.path.commonprefix([prompt, other])) for other in neighbours],
+            default=0,
+        )
+        tokens = count_tokens(prompt)
+        shared = count_tokens(prompt[:common]) if common else 0
+        prompt_tokens += tokens
+        shared_tokens += shared
+        if shared >= min_tokens:
+            cached_tokens += shared // block_tokens * block_tokens
+        seen.insert(k, prompt)
+    return {
+        "num_prompts": len(seen),
+        "prompt_tokens": prompt_tokens,
+        "shared_tokens": shared_tokens,
+        "cached_tokens": cached_tokens,
+        "shared_prefix_ratio": shared_tokens / max(prompt_tokens, 1),
+        "cached_ratio": cached_tokens / max(prompt_tokens, 1),
+    }
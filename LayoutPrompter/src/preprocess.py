@@ -1,10 +1,8 @@
 import copy
 import random
+from typing import TYPE_CHECKING
 
-import cv2
 import torch
-import torchvision.transforms as T
-from pandas import DataFrame
 
 from .transforms import (
     AddCanvasElement,
@@ -14,11 +12,23 @@ from .transforms import (
     DiscretizeBoundingBox,
     LabelDictSort,
     LexicographicSort,
-    SaliencyMapToBBoxes,
     ShuffleElements,
+    pad_layouts,
+    unpad_layouts,
 )
+from .saliency import ContentBoxExtractor
 from .utilities import CANVAS_SIZE, ID2LABEL, clean_text
 
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+
+def _compose(transform_functions):
+    # torchvision is imported here so text-to-layout never pays for it
+    import torchvision.transforms as T
+
+    return T.Compose(transform_functions)
+
 
 class Processor:
     def __init__(
@@ -68,6 +78,34 @@ class Processor:
         _data = self.transform(copy.deepcopy(data))
         return {k: _data[k] for k in self.return_keys}
 
+    def process_batch(self, data_list: list, batch_size: int = 1024):
+        """
+        Same output as `[self(data) for data in data_list]`. Layouts are padded
+        into batches of `batch_size` and the leading transforms that have a
+        `batch` method (sorts, discretization, canvas element) run on the whole
+        batch without deep copies. Any later transform (e.g. AddRelation) runs
+        per layout. Fields other than the per-element ones are shared with
+        `data_list` rather than copied.
+        """
+        num_batched = len(self.transform_functions)
+        for k, function in enumerate(self.transform_functions):
+            if not hasattr(function, "batch"):
+                num_batched = k
+                break
+        if num_batched == 0:
+            return [self(data) for data in data_list]
+
+        outputs = []
+        for start in range(0, len(data_list), batch_size):
+            batch = pad_layouts(data_list[start : start + batch_size])
+            for function in self.transform_functions[:num_batched]:
+                batch = function.batch(batch)
+            for data in unpad_layouts(batch):
+                for function in self.transform_functions[num_batched:]:
+                    data = function(data)
+                outputs.append({k: data[k] for k in self.return_keys})
+        return outputs
+
 
 class GenTypeProcessor(Processor):
     return_keys = [
@@ -95,7 +133,7 @@ class GenTypeProcessor(Processor):
             shuffle_before_sort_by_label=shuffle_before_sort_by_label,
             sort_by_pos_before_sort_by_label=sort_by_pos_before_sort_by_label,
         )
-        self.transform = T.Compose(self.transform_functions)
+        self.transform = _compose(self.transform_functions)
 
 
 class GenTypeSizeProcessor(Processor):
@@ -124,7 +162,7 @@ class GenTypeSizeProcessor(Processor):
             shuffle_before_sort_by_label=shuffle_before_sort_by_label,
             sort_by_pos_before_sort_by_label=sort_by_pos_before_sort_by_label,
         )
-        self.transform = T.Compose(self.transform_functions)
+        self.transform = _compose(self.transform_functions)
 
 
 class GenRelationProcessor(Processor):
@@ -176,7 +214,7 @@ class GenRelationProcessor(Processor):
                     num_x_grid=self.canvas_width, num_y_grid=self.canvas_height
                 )
             )
-        self.transform = T.Compose(self.transform_functions)
+        self.transform = _compose(self.transform_functions)
 
 
 class CompletionProcessor(Processor):
@@ -205,7 +243,7 @@ class CompletionProcessor(Processor):
             shuffle_before_sort_by_label=shuffle_before_sort_by_label,
             sort_by_pos_before_sort_by_label=sort_by_pos_before_sort_by_label,
         )
-        self.transform = T.Compose(self.transform_functions)
+        self.transform = _compose(self.transform_functions)
 
 
 class RefinementProcessor(Processor):
@@ -244,7 +282,7 @@ class RefinementProcessor(Processor):
                 bernoulli_beta=train_bernoulli_beta,
             )
         ] + self.transform_functions
-        self.transform = T.Compose(self.transform_functions)
+        self.transform = _compose(self.transform_functions)
 
 
 class ContentAwareProcessor(Processor):
@@ -264,7 +302,7 @@ class ContentAwareProcessor(Processor):
         index2label: dict,
         canvas_width: int,
         canvas_height: int,
-        metadata: DataFrame,
+        metadata: "DataFrame",
         sort_by_pos: bool = False,
         shuffle_before_sort_by_label: bool = False,
         sort_by_pos_before_sort_by_label: bool = True,
@@ -272,6 +310,10 @@ class ContentAwareProcessor(Processor):
         max_element_numbers: int = 10,
         original_width: float = 513.0,
         original_height: float = 750.0,
+        group_metadata: bool = True,
+        saliency_reduce: int = 1,
+        num_workers: int = 0,
+        content_box_cache: str = None,
     ):
         super().__init__(
             index2label=index2label,
@@ -281,13 +323,19 @@ class ContentAwareProcessor(Processor):
             shuffle_before_sort_by_label=shuffle_before_sort_by_label,
             sort_by_pos_before_sort_by_label=sort_by_pos_before_sort_by_label,
         )
-        self.transform = T.Compose(self.transform_functions)
+        self.transform = _compose(self.transform_functions)
         self.metadata = metadata
         self.max_element_numbers = max_element_numbers
         self.original_width = original_width
         self.original_height = original_height
-        self.saliency_map_to_bboxes = SaliencyMapToBBoxes(filter_threshold)
+        self.content_box_extractor = ContentBoxExtractor(
+            filter_threshold,
+            reduce=saliency_reduce,
+            num_workers=num_workers,
+            cache_path=content_box_cache,
+        )
         self.possible_labels: list = []
+        self.poster_elements = self._group_metadata() if group_metadata else None
 
     def _normalize_bboxes(self, bboxes):
         bboxes = bboxes.float()
@@ -295,24 +343,76 @@ class ContentAwareProcessor(Processor):
         bboxes[:, 1::2] /= self.original_height
         return bboxes
 
+    def _group_metadata(self):
+        """
+        Groups the metadata by poster once. Returns poster_path -> (labels,
+        normalized ltwh bboxes), where both are views into two arrays shared by
+        every poster, in metadata row order.
+        """
+        import numpy as np
+        from pandas import factorize
+
+        metadata = self.metadata[self.metadata["cls_elem"] > 0]
+        # "[l, t, r, b]" strings parsed in one pass instead of one eval per row
+        box_text = ",".join(metadata["box_elem"].astype(str))
+        box_text = box_text.translate(str.maketrans("", "", "[]() "))
+        values = np.array(box_text.split(",") if box_text else [], dtype=np.float64)
+        if len(values) != 4 * len(metadata):
+            raise ValueError("Every box_elem must hold exactly four numbers")
+        # float32 before the subtraction, as the per-poster path does
+        ltrb = values.reshape(-1, 4).astype(np.float32)
+        bboxes = np.concatenate([ltrb[:, :2], ltrb[:, 2:] - ltrb[:, :2]], axis=1)
+        bboxes[:, 0::2] /= np.float32(self.original_width)
+        bboxes[:, 1::2] /= np.float32(self.original_height)
+        labels = metadata["cls_elem"].to_numpy().astype(np.int64)
+
+        codes, paths = factorize(metadata["poster_path"].to_numpy())
+        order = np.argsort(codes, kind="stable")
+        labels, bboxes = labels[order], bboxes[order]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(paths)))])
+        return {
+            path: (labels[start:end], bboxes[start:end])
+            for path, start, end in zip(paths, offsets[:-1], offsets[1:])
+        }
+
+    def _train_elements(self, idx):
+        """
+        (labels, normalized ltwh bboxes) of a train poster, possibly empty.
+        """
+        if self.poster_elements is not None:
+            elements = self.poster_elements.get(f"train/{idx}.png")
+            if elements is None:
+                return torch.zeros(0, dtype=torch.long), torch.zeros((0, 4))
+            # zero-copy: Processor.__call__ deep-copies before transforming
+            return torch.from_numpy(elements[0]), torch.from_numpy(elements[1])
+        _metadata = self.metadata[
+            self.metadata["poster_path"] == f"train/{idx}.png"
+        ][self.metadata["cls_elem"] > 0]
+        labels = torch.tensor(list(map(int, _metadata["cls_elem"])))
+        bboxes = torch.tensor(list(map(eval, _metadata["box_elem"])))
+        if len(labels) == 0:
+            return labels, bboxes
+        bboxes[:, 2] -= bboxes[:, 0]
+        bboxes[:, 3] -= bboxes[:, 1]
+        return labels, self._normalize_bboxes(bboxes)
+
+    def prefetch(self, filenames: list):
+        """
+        Extracts the content boxes of `filenames` across `num_workers`
+        processes, so the following per-poster calls are cache hits.
+        """
+        self.content_box_extractor.extract_all(filenames)
+
     def __call__(self, filename, idx, split):
-        saliency_map = cv2.imread(filename)
-        content_bboxes = self.saliency_map_to_bboxes(saliency_map)
+        content_bboxes = self.content_box_extractor(filename)
         if len(content_bboxes) == 0:
             return None
         content_bboxes = self._normalize_bboxes(content_bboxes)
 
         if split == "train":
-            _metadata = self.metadata[
-                self.metadata["poster_path"] == f"train/{idx}.png"
-            ][self.metadata["cls_elem"] > 0]
-            labels = torch.tensor(list(map(int, _metadata["cls_elem"])))
-            bboxes = torch.tensor(list(map(eval, _metadata["box_elem"])))
+            labels, bboxes = self._train_elements(idx)
             if len(labels) == 0:
                 return None
-            bboxes[:, 2] -= bboxes[:, 0]
-            bboxes[:, 3] -= bboxes[:, 1]
-            bboxes = self._normalize_bboxes(bboxes)
             if len(labels) <= self.max_element_numbers:
                 self.possible_labels.append(labels)
 
@@ -350,12 +450,13 @@ class TextToLayoutProcessor(Processor):
         index2label: dict,
         canvas_width: int,
         canvas_height: int,
+        text_encoder=None,
     ):
         self.index2label = index2label
         self.label2index = {v: k for k, v in self.index2label.items()}
         self.canvas_width = canvas_width
         self.canvas_height = canvas_height
-        self.text_encoder = CLIPTextEncoder()
+        self.text_encoder = text_encoder or CLIPTextEncoder()
 
     def _scale(self, original_width, elements_):
         elements = copy.deepcopy(elements_)
@@ -379,8 +480,36 @@ class TextToLayoutProcessor(Processor):
             }
         
         # Original behavior for non-string data
-        text = clean_text(data["text"])
         embedding = self.text_encoder(clean_text(data["text"], remove_summary=True)).to(torch.float16)
+        return self._build(data, embedding)
+
+    def process_batch(self, data_list: list, batch_size: int = 64):
+        """
+        Same output as `[self(data) for data in data_list]`, with the CLIP
+        forward passes run `batch_size` texts at a time.
+        """
+        texts = [clean_text(data["text"], remove_summary=True) for data in data_list]
+        embeddings = self.text_encoder.encode_batch(texts, batch_size).to(torch.float16)
+        return [
+            self._build(data, embeddings[i : i + 1].clone())
+            for i, data in enumerate(data_list)
+        ]
+
+    def process_queries(self, user_texts: list, batch_size: int = 64):
+        """
+        Same output as `[self(user_text) for user_text in user_texts]`, with
+        the embeddings encoded `batch_size` texts at a time.
+        """
+        texts = [clean_text(user_text, remove_summary=True) for user_text in user_texts]
+        encode = getattr(self.text_encoder, "encode_many", self.text_encoder.encode_batch)
+        embeddings = encode(texts, batch_size).to(torch.float16)
+        return [
+            {"text": clean_text(user_text), "embedding": embeddings[i : i + 1].clone()}
+            for i, user_text in enumerate(user_texts)
+        ]
+
+    def _build(self, data, embedding):
+        text = clean_text(data["text"])
         original_width = data["canvas_width"]
         elements = data["elements"]
         elements = self._scale(original_width, elements)
@@ -0,0 +1,245 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# lower runs first
+INTERACTIVE = 0
+DEFAULT = 5
+BATCH = 10
+
+_priority = contextvars.ContextVar("request_priority", default=None)
+
+
+def current_priority(default: int = DEFAULT):
+    """
+    Priority set by the innermost `request_priority`, else `default`.
+    """
+    priority = _priority.get()
+    return default if priority is None else priority
+
+
+@contextmanager
+def request_priority(priority: int):
+    """
+    Model calls made inside the block (and in tasks and `asyncio.to_thread`
+    calls started from it) are queued at `priority`.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    `capacity` units refilled at `rate` per second. The level can go below
+    zero when a charge is settled higher than its estimate.
+    """
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float):
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RequestScheduler:
+    """
+    Process-wide admission control for model calls: token buckets for
+    requests (`rpm`) and tokens (`tpm`) per `period` seconds (60 for the
+    provider's per-minute limits), and one priority queue in front of them.
+    Only the head of the queue (lowest priority value, then arrival) may
+    take from the buckets, so an interactive request is never stuck behind
+    a batch job. A 429 from the provider pauses the whole queue for its
+    Retry-After. Only `headroom` of each limit is used, since requests reach
+    the provider with some jitter after they are let out.
+
+    Token counts are estimates charged up front (prompt plus max output, as
+    providers count them). Usage above the estimate is charged when the
+    response reports it; usage below it is not refunded, since providers
+    keep the up-front charge too.
+    """
+
+    def __init__(
+        self,
+        rpm: float = None,
+        tpm: float = None,
+        period: float = 60.0,
+        headroom: float = 0.9,
+        poll_interval: float = 0.01,
+        clock=time.monotonic,
+    ):
+        self.clock = clock
+        now = clock()
+        self.requests = None
+        self.tokens = None
+        if rpm:
+            rpm *= headroom
+            self.requests = TokenBucket(rpm, rpm / period, now)
+        if tpm:
+            tpm *= headroom
+            self.tokens = TokenBucket(tpm, tpm / period, now)
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self.max_queue_depth = 0
+        self.throttled = 0
+        self._granted = defaultdict(int)
+        self._waits = defaultdict(lambda: deque(maxlen=1000))
+
+    def _buckets(self, tokens):
+        if self.requests is not None:
+            yield self.requests, 1
+        if self.tokens is not None:
+            yield self.tokens, tokens
+
+    def _enqueue(self, priority):
+        entry = (priority, next(self._seq))
+        heapq.heappush(self._queue, entry)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        return entry
+
+    def _dequeue(self, entry):
+        """
+        Drops an abandoned entry, which would otherwise block the queue as
+        its head. Called with the lock held.
+        """
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def _try(self, entry, tokens):
+        """
+        0 when `entry` is granted, else the seconds to wait (None: not the
+        head of the queue). Called with the lock held.
+        """
+        if self._queue[0] != entry:
+            return None
+        now = self.clock()
+        wait = self._paused_until - now
+        for bucket, amount in self._buckets(tokens):
+            wait = max(wait, bucket.wait_time(amount, now))
+        if wait > 0:
+            return wait
+        heapq.heappop(self._queue)
+        for bucket, amount in self._buckets(tokens):
+            bucket.take(amount)
+        self._cond.notify_all()
+        return 0
+
+    def _record(self, priority, start):
+        waited = self.clock() - start
+        self._granted[priority] += 1
+        self._waits[priority].append(waited)
+        return waited
+
+    def acquire(self, tokens: float = 0, priority: int = None):
+        """
+        Blocks until the call may go out. Returns the seconds waited.
+        """
+        priority = current_priority() if priority is None else priority
+        start = self.clock()
+        with self._cond:
+            entry = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._try(entry, tokens)
+                    if wait == 0:
+                        return self._record(priority, start)
+                    self._cond.wait(wait)
+            except BaseException:
+                self._dequeue(entry)
+                raise
+
+    async def aacquire(self, tokens: float = 0, priority: int = None):
+        """
+        `acquire` for coroutines: polls every `poll_interval` instead of
+        blocking the event loop.
+        """
+        priority = current_priority() if priority is None else priority
+        start = self.clock()
+        with self._cond:
+            entry = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try(entry, tokens)
+                    if wait == 0:
+                        return self._record(priority, start)
+                await asyncio.sleep(min(wait or self.poll_interval, 1.0))
+        except BaseException:
+            with self._cond:
+                self._dequeue(entry)
+            raise
+
+    def settle(self, estimated: float, actual: float):
+        """
+        Charges the usage of a finished call beyond its estimate.
+        """
+        if self.tokens is None or actual <= estimated:
+            return
+        with self._cond:
+            self.tokens.refill(self.clock())
+            self.tokens.level -= actual - estimated
+
+    def refund(self, tokens: float):
+        """
+        Returns the charge of a call the provider rejected.
+        """
+        with self._cond:
+            now = self.clock()
+            for bucket, amount in self._buckets(tokens):
+                bucket.refill(now)
+                bucket.give(amount)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """
+        Holds every queued call for `seconds` (provider 429 Retry-After).
+        """
+        with self._cond:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            waits = {}
+            for priority, values in sorted(self._waits.items()):
+                ordered = sorted(values)
+                waits[priority] = {
+                    "granted": self._granted[priority],
+                    "mean_wait": sum(ordered) / len(ordered),
+                    "p95_wait": ordered[int(0.95 * (len(ordered) - 1))],
+                    "max_wait": ordered[-1],
+                }
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+                "throttled": self.throttled,
+                "priorities": waits,
+            }
@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+from .cache import DiskCache, LRUCache, TwoLevelCache, hash_key
+
+REDUCE_FLAGS = {2: "IMREAD_REDUCED_GRAYSCALE_2", 4: "IMREAD_REDUCED_GRAYSCALE_4", 8: "IMREAD_REDUCED_GRAYSCALE_8"}
+
+
+def _decode_gray(filename: str, reduce: int):
+    import cv2
+
+    if reduce > 1:
+        return cv2.imread(filename, getattr(cv2, REDUCE_FLAGS[reduce]))
+    image = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+    if image is not None and image.dtype == np.uint8:
+        if image.ndim == 2:
+            # already single channel: skip the expansion to BGR and back
+            return image
+        if image.shape[2] in (3, 4):
+            # as cv2.imread would give it: alpha dropped, then BGR to gray
+            # (decoding straight to gray rounds differently from cvtColor)
+            return cv2.cvtColor(image[:, :, :3], cv2.COLOR_BGR2GRAY)
+    # e.g. 16-bit maps: let imread do its own conversion to 8-bit BGR
+    return cv2.cvtColor(cv2.imread(filename), cv2.COLOR_BGR2GRAY)
+
+
+def _extract(filename, thresholds, reduce, is_filter_small_bboxes, min_side, min_area):
+    """
+    Content boxes (ltwh, full-resolution pixels) of one saliency map for every
+    threshold, from a single decode. Matches `SaliencyMapToBBoxes` when
+    `reduce` is 1.
+    """
+    import cv2
+
+    saliency_map_gray = _decode_gray(filename, reduce)
+    results = []
+    for threshold in thresholds:
+        _, thresholded_map = cv2.threshold(
+            saliency_map_gray, threshold, 255, cv2.THRESH_BINARY
+        )
+        contours, _ = cv2.findContours(
+            thresholded_map, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        bboxes = []
+        for contour in contours:
+            x, y, w, h = (v * reduce for v in cv2.boundingRect(contour))
+            if is_filter_small_bboxes and (
+                (w <= min_side and h <= min_side) or w * h < min_area
+            ):
+                continue
+            bboxes.append([x, y, w, h])
+        bboxes = sorted(bboxes, key=lambda x: (x[1], x[0]))
+        results.append(np.array(bboxes, dtype=np.int32).reshape(-1, 4))
+    return results
+
+
+def _extract_star(args):
+    return _extract(*args)
+
+
+class ContentBoxExtractor:
+    """
+    Saliency map -> content boxes, as `SaliencyMapToBBoxes` but:
+    - single-channel maps are decoded straight to grayscale, and `reduce` in
+      (2, 4, 8) decodes at 1/reduce resolution (boxes are scaled back, so they
+      are approximate)
+    - `extract_all` spreads decoding over `num_workers` processes and runs
+      every requested threshold on one decode
+    - results are cached in memory and, with `cache_path`, in an sqlite
+      sidecar keyed by path, mtime, size and extraction parameters, so
+      reprocessing and threshold sweeps skip the decode
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        is_filter_small_bboxes: bool = True,
+        min_side: int = 80,
+        min_area: int = 6000,
+        reduce: int = 1,
+        num_workers: int = 0,
+        cache_path: str = None,
+        cache_size: int = 65536,
+    ):
+        if reduce != 1 and reduce not in REDUCE_FLAGS:
+            raise ValueError(f"reduce must be one of 1, {', '.join(map(str, REDUCE_FLAGS))}")
+        self.threshold = threshold
+        self.is_filter_small_bboxes = is_filter_small_bboxes
+        self.min_side = min_side
+        self.min_area = min_area
+        self.reduce = reduce
+        self.num_workers = num_workers
+        disk = DiskCache(cache_path, maxsize=1 << 24) if cache_path else None
+        self.cache = TwoLevelCache(LRUCache(cache_size), disk)
+
+    def _key(self, filename, threshold):
+        stat = os.stat(filename)
+        params = (
+            f"{threshold}/{self.reduce}/{self.is_filter_small_bboxes}/"
+            f"{self.min_side}/{self.min_area}"
+        )
+        return hash_key(
+            os.path.abspath(filename), str(stat.st_mtime_ns), str(stat.st_size), params
+        )
+
+    def _args(self, filename, thresholds):
+        return (
+            filename,
+            thresholds,
+            self.reduce,
+            self.is_filter_small_bboxes,
+            self.min_side,
+            self.min_area,
+        )
+
+    def extract_all(self, filenames: list, thresholds: list = None):
+        """
+        Returns:
+            boxes list: for each filename, {threshold: np.ndarray (N, 4)}
+        """
+        thresholds = list(thresholds or [self.threshold])
+        results = [{} for _ in filenames]
+        keys = [[self._key(f, t) for t in thresholds] for f in filenames]
+        missing = []
+        for i, file_keys in enumerate(keys):
+            for threshold, key in zip(thresholds, file_keys):
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[i][threshold] = cached
+            if len(results[i]) < len(thresholds):
+                missing.append(i)
+
+        tasks = [
+            self._args(filenames[i], [t for t in thresholds if t not in results[i]])
+            for i in missing
+        ]
+        if self.num_workers > 1 and len(tasks) > 1:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            with ProcessPoolExecutor(self.num_workers, mp_context=context) as pool:
+                chunksize = max(1, len(tasks) // (4 * self.num_workers))
+                extracted = list(pool.map(_extract_star, tasks, chunksize=chunksize))
+        else:
+            extracted = [_extract_star(task) for task in tasks]
+
+        for i, task, boxes in zip(missing, tasks, extracted):
+            for threshold, bboxes in zip(task[1], boxes):
+                self.cache.put(keys[i][thresholds.index(threshold)], bboxes)
+                results[i][threshold] = bboxes
+        return results
+
+    def __call__(self, filename: str, threshold: int = None):
+        threshold = self.threshold if threshold is None else threshold
+        bboxes = self.extract_all([filename], [threshold])[0][threshold]
+        # same tensor SaliencyMapToBBoxes returns, including torch.tensor([]) for none
+        return torch.tensor(bboxes.tolist())
@@ -0,0 +1,172 @@
+import math
+import threading
+
+
+class ParseYield:
+    """
+    Parse success rate of one key (e.g. dataset), as a Beta posterior with
+    `prior_weight` pseudo-choices at `prior_rate`.
+    """
+
+    def __init__(self, prior_rate: float = 0.8, prior_weight: float = 10):
+        self.successes = prior_rate * prior_weight
+        self.failures = (1 - prior_rate) * prior_weight
+        self.choices = 0
+        self.parsed = 0
+
+    def update(self, choices: int, parsed: int):
+        self.choices += choices
+        self.parsed += parsed
+        self.successes += parsed
+        self.failures += choices - parsed
+
+    @property
+    def rate(self):
+        return self.successes / (self.successes + self.failures)
+
+    def lower_bound(self, z: float = 1.0):
+        """
+        Normal approximation of the posterior, `z` standard deviations low.
+        """
+        total = self.successes + self.failures
+        std = math.sqrt(self.rate * (1 - self.rate) / (total + 1))
+        return max(self.rate - z * std, 0.05)
+
+
+class AdaptiveSampler:
+    """
+    Sizes `n` of each model call by the observed parse yield instead of always
+    asking for `max_n` choices: the first request asks for enough choices to
+    get `min_layouts` valid layouts at a pessimistic (`z`) yield, and a
+    follow-up is sent only when fewer parsed, until `max_rounds` requests or
+    `max_n` choices in total.
+
+    Token use is compared with a fixed `n=max_n` request: its prompt tokens
+    once plus `max_n` times the mean completion tokens per choice.
+    """
+
+    def __init__(
+        self,
+        min_layouts: int = 5,
+        max_n: int = 10,
+        max_rounds: int = 2,
+        z: float = 1.0,
+        prior_rate: float = 0.8,
+        prior_weight: float = 10,
+        count_tokens=None,
+    ):
+        self.min_layouts = min_layouts
+        self.max_n = max_n
+        self.max_rounds = max_rounds
+        self.z = z
+        self.prior_rate = prior_rate
+        self.prior_weight = prior_weight
+        self.count_tokens = count_tokens
+        self.yields = {}
+        self.requests = 0
+        self.followups = 0
+        self.tokens = 0
+        self.baseline_tokens = 0
+        self._lock = threading.Lock()
+
+    def _yield(self, key):
+        if key not in self.yields:
+            self.yields[key] = ParseYield(self.prior_rate, self.prior_weight)
+        return self.yields[key]
+
+    def plan(self, key, needed: int, used: int = 0):
+        """
+        `n` for the next request of `key`, `needed` more layouts to go with
+        `used` choices already requested.
+        """
+        with self._lock:
+            rate = self._yield(key).lower_bound(self.z)
+        return max(1, min(math.ceil(needed / rate), self.max_n - used))
+
+    def _usage(self, response, prompt):
+        """
+        Returns:
+            prompt_tokens int
+            completion_tokens list: per choice
+        """
+        contents = [choice.message.content or "" for choice in response.choices]
+        usage = getattr(response, "usage", None)
+        if usage is not None and usage.completion_tokens:
+            per_choice = usage.completion_tokens / max(len(contents), 1)
+            return usage.prompt_tokens, [per_choice] * len(contents)
+        count = self.count_tokens or (lambda text: len(text) // 4)
+        return count(prompt), [count(content) for content in contents]
+
+    def record(self, key, response, parsed: int, prompt: str):
+        prompt_tokens, completion_tokens = self._usage(response, prompt)
+        with self._lock:
+            self._yield(key).update(len(response.choices), parsed)
+            self.requests += 1
+            self.tokens += prompt_tokens + sum(completion_tokens)
+        return prompt_tokens, completion_tokens
+
+    def _close(self, rounds, prompt_tokens, completion_tokens):
+        mean = sum(completion_tokens) / max(len(completion_tokens), 1)
+        with self._lock:
+            self.followups += rounds - 1
+            self.baseline_tokens += prompt_tokens + mean * self.max_n
+
+    def sample(self, key, prompt: str, request, parse):
+        """
+        Args:
+            request: (n, attempt) -> ChatCompletion
+            parse: ChatCompletion -> parsed layouts
+        Returns:
+            parsed list: layouts of every round, in request order
+        """
+        layouts, used, completion_tokens, prompt_tokens = [], 0, [], 0
+        for attempt in range(self.max_rounds):
+            n = self.plan(key, self.min_layouts - len(layouts), used)
+            response = request(n, attempt)
+            parsed = parse(response)
+            tokens = self.record(key, response, len(parsed), prompt)
+            prompt_tokens = prompt_tokens or tokens[0]
+            completion_tokens += tokens[1]
+            layouts += parsed
+            used += len(response.choices)
+            if len(layouts) >= self.min_layouts or used >= self.max_n:
+                break
+        self._close(attempt + 1, prompt_tokens, completion_tokens)
+        return layouts
+
+    async def asample(self, key, prompt: str, request, parse):
+        """
+        `sample` with an async `request`.
+        """
+        layouts, used, completion_tokens, prompt_tokens = [], 0, [], 0
+        for attempt in range(self.max_rounds):
+            n = self.plan(key, self.min_layouts - len(layouts), used)
+            response = await request(n, attempt)
+            parsed = parse(response)
+            tokens = self.record(key, response, len(parsed), prompt)
+            prompt_tokens = prompt_tokens or tokens[0]
+            completion_tokens += tokens[1]
+            layouts += parsed
+            used += len(response.choices)
+            if len(layouts) >= self.min_layouts or used >= self.max_n:
+                break
+        self._close(attempt + 1, prompt_tokens, completion_tokens)
+        return layouts
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "followups": self.followups,
+                "tokens": round(self.tokens),
+                "baseline_tokens": round(self.baseline_tokens),
+                "saved_tokens": round(self.baseline_tokens - self.tokens),
+                "parse_rates": {
+                    key: {
+                        "choices": y.choices,
+                        "parsed": y.parsed,
+                        "rate": round(y.rate, 3),
+                    }
+                    for key, y in self.yields.items()
+                },
+            }
@@ -1,9 +1,16 @@
+import copy
+import os
+import pickle
 import random
 
-import cv2
 import numpy as np
+import torch
 
-from .utilities import CANVAS_SIZE, labels_bboxes_similarity, labels_similarity
+from .ann import IVFIndex
+from .cache import hash_key
+from .columnar import ColumnarDataset
+from .matching import BoxMatchingEngine
+from .utilities import CANVAS_SIZE, ID2LABEL, build_label_count_matrix
 
 
 class ExemplarSelection:
@@ -18,16 +25,100 @@ class ExemplarSelection:
         self.candidate_size = candidate_size
         self.num_prompt = num_prompt
         self.shuffle = shuffle
+        # positions of `self.train_data` in the list that was passed in
+        self.train_positions = np.arange(len(train_data))
         if self.candidate_size > 0:
-            random.shuffle(self.train_data)
-            self.train_data = self.train_data[: self.candidate_size]
+            # shuffle positions rather than the caller's list, which may be shared
+            positions = list(range(len(train_data)))
+            random.shuffle(positions)
+            self.train_positions = np.array(positions[: self.candidate_size])
+            self.train_data = [train_data[i] for i in self.train_positions]
+        self.filter_mask = self._compute_filter_mask()
+
+    def score(self, test_data: dict):
+        """
+        Returns:
+            scores np.ndarray: similarity of `test_data` to the train items
+            candidates np.ndarray: train indices `scores` covers, or None when
+                there is one score per train item
+        """
+        raise NotImplementedError
+
+    def rank(self, test_data: dict):
+        """
+        Indices into `self.train_data` of the selected exemplars, best first.
+        """
+        return self._top_indices(*self.score(test_data))
+
+    def _selected(self, test_data: dict, shuffle: bool = None):
+        indices = list(self.rank(test_data))
+        if self.shuffle if shuffle is None else shuffle:
+            random.shuffle(indices)
+        return indices
+
+    def select(self, test_data: dict, shuffle: bool = None):
+        """
+        Positions, in the train list passed in, of the exemplars `__call__`
+        would return, in the same order. `shuffle=False` keeps them best first.
+        """
+        return [
+            int(self.train_positions[i]) for i in self._selected(test_data, shuffle)
+        ]
 
     def __call__(self, test_data: dict):
-        pass
+        return [self.train_data[i] for i in self._selected(test_data)]
 
     def _is_filter(self, data):
         return (data["discrete_gold_bboxes"][:, 2:] == 0).sum().bool().item()
 
+    def _compute_filter_mask(self):
+        # vectorized `_is_filter` over every train item at once
+        if len(self.train_data) == 0:
+            return np.zeros(0, dtype=bool)
+        if isinstance(self.train_data, ColumnarDataset):
+            bboxes, offsets = self.train_data.ragged("discrete_gold_bboxes")
+            lengths = np.diff(offsets)
+            has_zero = (bboxes[:, 2:] == 0).any(axis=-1)
+        else:
+            bboxes = [data["discrete_gold_bboxes"] for data in self.train_data]
+            lengths = [len(bbox) for bbox in bboxes]
+            has_zero = (torch.cat(bboxes)[:, 2:] == 0).any(dim=-1).numpy()
+        item_ids = np.repeat(np.arange(len(lengths)), lengths)
+        return np.bincount(item_ids, weights=has_zero, minlength=len(lengths)) > 0
+
+    def _top_indices(self, scores: np.ndarray, candidates: np.ndarray = None):
+        """
+        Partial top-k over a score vector, skipping filtered train items.
+        Ties are broken by train index, which matches the stable full sort in
+        `_retrieve_exemplars`.
+
+        Args:
+            scores np.ndarray: one score per train item, or one per entry of
+                `candidates` when it is given
+            candidates np.ndarray: optional train indices that `scores` covers
+        """
+        if candidates is None:
+            candidates = np.flatnonzero(~self.filter_mask)
+            candidate_scores = scores[candidates]
+        else:
+            keep = ~self.filter_mask[candidates]
+            candidates, candidate_scores = candidates[keep], scores[keep]
+        k = min(self.num_prompt, len(candidates))
+        if k == 0:
+            return candidates[:0]
+        if k < len(candidates):
+            kth = np.partition(candidate_scores, len(candidates) - k)[
+                len(candidates) - k
+            ]
+            above = np.flatnonzero(candidate_scores > kth)
+            ties = np.flatnonzero(candidate_scores == kth)
+            ties = ties[np.argsort(candidates[ties], kind="stable")][: k - len(above)]
+            selected = np.concatenate([above, ties])
+        else:
+            selected = np.arange(len(candidates))
+        order = np.lexsort((candidates[selected], -candidate_scores[selected]))
+        return candidates[selected[order]]
+
     def _retrieve_exemplars(self, scores: list):
         scores = sorted(scores, key=lambda x: x[1], reverse=True)
         exemplars = []
@@ -41,101 +132,142 @@ class ExemplarSelection:
         return exemplars
 
 
-class GenTypeExemplarSelection(ExemplarSelection):
-    def __call__(self, test_data: dict):
-        scores = []
-        test_labels = test_data["labels"]
-        for i in range(len(self.train_data)):
-            train_labels = self.train_data[i]["labels"]
-            score = labels_similarity(train_labels, test_labels)
-            scores.append([i, score])
-        return self._retrieve_exemplars(scores)
+class LabelCountExemplarSelection(ExemplarSelection):
+    """
+    Base class for selectors ranked by `labels_similarity`. Train labels are
+    kept as a dense items x label-ids count matrix, so the multiset
+    intersection with a query is a NumPy min/sum. An inverted index from label
+    to items restricts scoring to items sharing at least one label with the
+    query; every other item has a similarity of exactly 0.
+    """
+
+    def __init__(self, *args, num_labels: int = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label_counts = build_label_count_matrix(
+            [data["labels"] for data in self.train_data], num_labels
+        )
+        self.num_labels = self.label_counts.shape[1]
+        self.lengths = self.label_counts.sum(axis=1)
+        self.postings = [
+            np.flatnonzero(self.label_counts[:, label])
+            for label in range(self.num_labels)
+        ]
+
+    def score(self, test_data: dict):
+        test_labels = torch.as_tensor(test_data["labels"]).reshape(-1).numpy()
+        test_counts = np.bincount(test_labels, minlength=self.num_labels)
+        query_labels = np.flatnonzero(test_counts[: self.num_labels])
+        scores = np.zeros(len(self.train_data))
+        if len(query_labels) == 0:
+            return scores, None
+        candidates = np.unique(
+            np.concatenate([self.postings[label] for label in query_labels])
+        )
+        intersection = np.minimum(
+            self.label_counts[np.ix_(candidates, query_labels)],
+            test_counts[query_labels],
+        ).sum(axis=1)
+        scores[candidates] = (
+            2 * intersection / (self.lengths[candidates] + len(test_labels))
+        )
+        return scores, None
 
 
-class GenTypeSizeExemplarSelection(ExemplarSelection):
+class GenTypeExemplarSelection(LabelCountExemplarSelection):
+    pass
+
+
+class BoxMatchingExemplarSelection(ExemplarSelection):
+    """
+    Base class for selectors ranked by `labels_bboxes_similarity`. Scoring goes
+    through a `BoxMatchingEngine`, which prunes candidates that cannot reach
+    the top-k before running the exact assignment.
+    """
+
     labels_weight = 0.5
     bboxes_weight = 0.5
 
-    def __call__(self, test_data: dict):
-        scores = []
-        test_labels = test_data["labels"]
-        test_bboxes = test_data["bboxes"][:, 2:]
-        for i in range(len(self.train_data)):
-            train_labels = self.train_data[i]["labels"]
-            train_bboxes = self.train_data[i]["bboxes"][:, 2:]
-            score = labels_bboxes_similarity(
-                train_labels,
-                train_bboxes,
-                test_labels,
-                test_bboxes,
-                self.labels_weight,
-                self.bboxes_weight,
-            )
-            scores.append([i, score])
-        return self._retrieve_exemplars(scores)
+    def __init__(self, *args, num_workers: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        features = [self._features(data) for data in self.train_data]
+        self.engine = BoxMatchingEngine(
+            train_labels=[labels for labels, _ in features],
+            train_bboxes=[bboxes for _, bboxes in features],
+            labels_weight=self.labels_weight,
+            bboxes_weight=self.bboxes_weight,
+            num_workers=num_workers,
+        )
 
+    def _features(self, data):
+        raise NotImplementedError
+
+    def score(self, test_data: dict):
+        test_labels, test_bboxes = self._features(test_data)
+        scores = self.engine(
+            test_labels, test_bboxes, k=self.num_prompt, exclude=self.filter_mask
+        )
+        return scores, None
+
+
+class GenTypeSizeExemplarSelection(BoxMatchingExemplarSelection):
+    labels_weight = 0.5
+    bboxes_weight = 0.5
+
+    def _features(self, data):
+        return data["labels"], data["bboxes"][:, 2:]
 
-class GenRelationExemplarSelection(ExemplarSelection):
-    def __call__(self, test_data: dict):
-        scores = []
-        test_labels = test_data["labels"]
-        for i in range(len(self.train_data)):
-            train_labels = self.train_data[i]["labels"]
-            score = labels_similarity(train_labels, test_labels)
-            scores.append([i, score])
-        return self._retrieve_exemplars(scores)
 
+class GenRelationExemplarSelection(LabelCountExemplarSelection):
+    pass
 
-class CompletionExemplarSelection(ExemplarSelection):
+
+class CompletionExemplarSelection(BoxMatchingExemplarSelection):
     labels_weight = 0.0
     bboxes_weight = 1.0
 
-    def __call__(self, test_data: dict):
-        scores = []
-        test_labels = test_data["labels"][:1]
-        test_bboxes = test_data["bboxes"][:1, :]
-        for i in range(len(self.train_data)):
-            train_labels = self.train_data[i]["labels"][:1]
-            train_bboxes = self.train_data[i]["bboxes"][:1, :]
-            score = labels_bboxes_similarity(
-                train_labels,
-                train_bboxes,
-                test_labels,
-                test_bboxes,
-                self.labels_weight,
-                self.bboxes_weight,
-            )
-            scores.append([i, score])
-        return self._retrieve_exemplars(scores)
+    def _features(self, data):
+        return data["labels"][:1], data["bboxes"][:1, :]
 
 
-class RefinementExemplarSelection(ExemplarSelection):
+class RefinementExemplarSelection(BoxMatchingExemplarSelection):
     labels_weight = 0.5
     bboxes_weight = 0.5
 
-    def __call__(self, test_data: dict):
-        scores = []
-        test_labels = test_data["labels"]
-        test_bboxes = test_data["bboxes"]
-        for i in range(len(self.train_data)):
-            train_labels = self.train_data[i]["labels"]
-            train_bboxes = self.train_data[i]["bboxes"]
-            score = labels_bboxes_similarity(
-                train_labels,
-                train_bboxes,
-                test_labels,
-                test_bboxes,
-                self.labels_weight,
-                self.bboxes_weight,
-            )
-            scores.append([i, score])
-        return self._retrieve_exemplars(scores)
+    def _features(self, data):
+        return data["labels"], data["bboxes"]
 
 
 class ContentAwareExemplarSelection(ExemplarSelection):
+    """
+    Ranks train posters by the IoU of their content (saliency) regions with the
+    query's. Train regions are prepared once: as bit-packed masks for
+    `iou_mode="mask"` (optionally downsampled by `downsample`, which makes the
+    scores approximate), or as pixel rectangles for `iou_mode="box"`, which
+    computes the same areas exactly without rasterizing.
+    """
+
     canvas_width, canvas_height = CANVAS_SIZE["posterlayout"]
 
+    def __init__(self, *args, iou_mode: str = "mask", downsample: int = 1, **kwargs):
+        super().__init__(*args, **kwargs)
+        if iou_mode not in ("mask", "box"):
+            raise ValueError(f"Unsupported iou_mode: {iou_mode}")
+        self.iou_mode = iou_mode
+        self.downsample = downsample
+        content_bboxes = [data["discrete_content_bboxes"] for data in self.train_data]
+        if self.iou_mode == "mask":
+            self.train_masks = np.stack(
+                [self._to_packed_mask(bboxes) for bboxes in content_bboxes]
+            )
+        else:
+            self.train_rects = [self._to_rects(bboxes) for bboxes in content_bboxes]
+            self.train_areas = np.array(
+                [_union_area(rects) for rects in self.train_rects], dtype=np.int64
+            )
+
     def _to_binary_image(self, content_bboxes):
+        import cv2
+
         binary_image = np.zeros((self.canvas_height, self.canvas_width), dtype=np.uint8)
         content_bboxes = content_bboxes.tolist()
         for content_bbox in content_bboxes:
@@ -143,29 +275,161 @@ class ContentAwareExemplarSelection(ExemplarSelection):
             cv2.rectangle(binary_image, (l, t), (l + w, t + h), 255, thickness=-1)
         return binary_image
 
-    def __call__(self, test_data: dict):
-        scores = []
+    def _to_rects(self, content_bboxes):
+        """
+        ltwh boxes -> half-open pixel rectangles [x0, y0, x1, y1) covering the
+        same pixels as the filled, inclusive `cv2.rectangle` in `_to_binary_image`
+        """
+        bboxes = np.asarray(content_bboxes, dtype=np.int64).reshape(-1, 4)
+        l, t, w, h = bboxes.T
+        rects = np.stack([l, t, l + w + 1, t + h + 1], axis=-1)
+        rects[:, 0::2] = np.clip(rects[:, 0::2], 0, self.canvas_width)
+        rects[:, 1::2] = np.clip(rects[:, 1::2], 0, self.canvas_height)
+        return rects
+
+    def _to_packed_mask(self, content_bboxes):
+        mask = np.zeros((self.canvas_height, self.canvas_width), dtype=bool)
+        for x0, y0, x1, y1 in self._to_rects(content_bboxes):
+            mask[y0:y1, x0:x1] = True
+        if self.downsample > 1:
+            f = self.downsample
+            height, width = -(-mask.shape[0] // f) * f, -(-mask.shape[1] // f) * f
+            mask = np.pad(mask, ((0, height - mask.shape[0]), (0, width - mask.shape[1])))
+            mask = mask.reshape(height // f, f, width // f, f).any(axis=(1, 3))
+        return np.packbits(mask.reshape(-1))
+
+    def _mask_scores(self, test_content_bboxes):
+        test_mask = self._to_packed_mask(test_content_bboxes)
+        intersection = _popcount(self.train_masks & test_mask)
+        union = _popcount(self.train_masks | test_mask)
+        # cv2 masks are 0/255, so the original sums are 255 x pixel counts
+        scale = 255 * self.downsample**2
+        return (scale * intersection + 1) / (scale * union + 1)
+
+    def _box_scores(self, test_content_bboxes):
+        test_rects = self._to_rects(test_content_bboxes)
+        test_area = _union_area(test_rects)
+        scores = np.empty(len(self.train_rects))
+        for i, train_rects in enumerate(self.train_rects):
+            intersection = _union_area(_pairwise_intersections(train_rects, test_rects))
+            union = self.train_areas[i] + test_area - intersection
+            scores[i] = (255 * intersection + 1) / (255 * union + 1)
+        return scores
+
+    def score(self, test_data: dict):
         test_content_bboxes = test_data["discrete_content_bboxes"]
-        test_binary = self._to_binary_image(test_content_bboxes)
-        for i in range(len(self.train_data)):
-            train_content_bboxes = self.train_data[i]["discrete_content_bboxes"]
-            train_binary = self._to_binary_image(train_content_bboxes)
-            intersection = cv2.bitwise_and(train_binary, test_binary)
-            union = cv2.bitwise_or(train_binary, test_binary)
-            iou = (np.sum(intersection) + 1) / (np.sum(union) + 1)
-            scores.append([i, iou])
-        return self._retrieve_exemplars(scores)
+        if self.iou_mode == "mask":
+            return self._mask_scores(test_content_bboxes), None
+        return self._box_scores(test_content_bboxes), None
+
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+def _popcount(packed: np.ndarray):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(packed).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT[packed].sum(axis=-1)
+
+
+def _pairwise_intersections(rects_1, rects_2):
+    x0 = np.maximum(rects_1[:, None, 0], rects_2[None, :, 0])
+    y0 = np.maximum(rects_1[:, None, 1], rects_2[None, :, 1])
+    x1 = np.minimum(rects_1[:, None, 2], rects_2[None, :, 2])
+    y1 = np.minimum(rects_1[:, None, 3], rects_2[None, :, 3])
+    rects = np.stack([x0, y0, x1, y1], axis=-1).reshape(-1, 4)
+    return rects[(rects[:, 0] < rects[:, 2]) & (rects[:, 1] < rects[:, 3])]
+
+
+def _union_area(rects):
+    """
+    Area of the union of half-open rectangles, via coordinate compression.
+    """
+    rects = rects[(rects[:, 0] < rects[:, 2]) & (rects[:, 1] < rects[:, 3])]
+    if len(rects) == 0:
+        return 0
+    xs = np.unique(rects[:, 0::2])
+    ys = np.unique(rects[:, 1::2])
+    covered = np.zeros((len(ys) - 1, len(xs) - 1), dtype=bool)
+    x0, x1 = np.searchsorted(xs, rects[:, 0]), np.searchsorted(xs, rects[:, 2])
+    y0, y1 = np.searchsorted(ys, rects[:, 1]), np.searchsorted(ys, rects[:, 3])
+    for i in range(len(rects)):
+        covered[y0[i] : y1[i], x0[i] : x1[i]] = True
+    cells = np.diff(ys)[:, None] * np.diff(xs)[None, :]
+    return int(cells[covered].sum())
+
+
+def stack_embeddings(train_data, dtype=np.float32):
+    """
+    All train embeddings as one contiguous matrix (items x dim).
+    """
+    if isinstance(train_data, ColumnarDataset):
+        embeddings = train_data.column("embedding")
+        return np.ascontiguousarray(
+            embeddings.reshape(len(embeddings), -1), dtype=dtype
+        )
+    return np.ascontiguousarray(
+        torch.cat([data["embedding"].reshape(1, -1) for data in train_data])
+        .numpy()
+        .astype(dtype, copy=False)
+    )
 
 
 class TextToLayoutExemplarSelection(ExemplarSelection):
-    def __call__(self, test_data: dict):
-        scores = []
-        test_embedding = test_data["embedding"]
-        for i in range(len(self.train_data)):
-            train_embedding = self.train_data[i]["embedding"]
-            score = (train_embedding @ test_embedding.T).item()
-            scores.append([i, score])
-        return self._retrieve_exemplars(scores)
+    """
+    Ranks train items by the dot product of their CLIP embeddings with the
+    query's, in one matrix product. With `score_dtype="float16"` (default)
+    it is a float16 torch product, whose scores equal those of the original
+    per-item loop bit for bit, so near-ties break the same way and the same
+    exemplars come out. `"float32"` is faster on some CPUs, but on float16
+    near-ties it may pick different exemplars.
+    """
+
+    def __init__(
+        self,
+        *args,
+        index=None,
+        num_probe: int = 8,
+        score_dtype: str = "float16",
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        if score_dtype not in ("float16", "float32"):
+            raise ValueError(f"Unsupported score_dtype: {score_dtype}")
+        # the ANN index addresses the full train list, not a shuffled subset
+        self.index = index if self.candidate_size <= 0 else None
+        self.num_probe = num_probe
+        self.score_dtype = score_dtype
+        self._train_embeddings = None
+        if self.index is None:
+            self.train_embeddings
+
+    @property
+    def train_embeddings(self):
+        """
+        One contiguous matrix in `score_dtype` for exact search. It is built
+        up front only without an ANN index; with one it is left out of
+        memory and of a saved index.
+        """
+        if self._train_embeddings is None:
+            self._train_embeddings = stack_embeddings(
+                self.train_data, getattr(np, self.score_dtype)
+            )
+        return self._train_embeddings
+
+    def score(self, test_data: dict):
+        if self.index is not None:
+            test_embedding = test_data["embedding"].reshape(-1).float().numpy()
+            candidates, scores = self.index.probe(test_embedding, self.num_probe)
+            return scores, candidates
+        if self.score_dtype == "float16":
+            # matrix x (dim x 1) matrix: a float16 matrix-vector product
+            # rounds differently from the per-item products
+            test_embedding = test_data["embedding"].reshape(1, -1).half()
+            scores = torch.from_numpy(self.train_embeddings) @ test_embedding.T
+            return scores.reshape(-1).float().numpy(), None
+        test_embedding = test_data["embedding"].reshape(-1).float().numpy()
+        return self.train_embeddings @ test_embedding, None
 
 
 SELECTOR_MAP = {
@@ -189,3 +453,132 @@ def create_selector(task, train_data, candidate_size, num_prompt, *args, **kwarg
         **kwargs,
     )
     return selector
+
+
+class ExemplarIndex:
+    """
+    Exemplar selector for one (dataset, task), built once and queried many times.
+
+    The selector precomputes its filter mask and scoring features up front and
+    does not mutate them while scoring, so one index can serve concurrent
+    queries. `save`/`load` pickle the index so a server can load it at startup
+    instead of rebuilding it. The train split and the ANN index are not
+    pickled: `load` reattaches the ones the caller has already loaded.
+    `config_key` covers the selector settings and a fingerprint of the train
+    split (see `make_config_key`), so a stale file can be detected and rebuilt.
+    """
+
+    def __init__(
+        self,
+        dataset: str,
+        task: str,
+        train_data: list,
+        candidate_size: int = -1,
+        num_prompt: int = 10,
+        fingerprint: str = "",
+        **selector_kwargs,
+    ):
+        self.dataset = dataset
+        self.task = task
+        self.config_key = self.make_config_key(
+            dataset, task, candidate_size, num_prompt, fingerprint, **selector_kwargs
+        )
+        if issubclass(SELECTOR_MAP[task], LabelCountExemplarSelection) and (
+            dataset in ID2LABEL
+        ):
+            selector_kwargs.setdefault("num_labels", max(ID2LABEL[dataset]) + 1)
+        self.selector = create_selector(
+            task=task,
+            train_data=train_data,
+            candidate_size=candidate_size,
+            num_prompt=num_prompt,
+            **selector_kwargs,
+        )
+
+    @staticmethod
+    def make_config_key(
+        dataset: str,
+        task: str,
+        candidate_size: int,
+        num_prompt: int,
+        fingerprint: str = "",
+        **selector_kwargs,
+    ):
+        """
+        Hash of everything the ranked positions depend on. `fingerprint`
+        identifies the train split (e.g. its length and modification time).
+        """
+        if issubclass(SELECTOR_MAP[task], TextToLayoutExemplarSelection):
+            # indexes saved before float16 scoring ranked in float32
+            selector_kwargs.setdefault("score_dtype", "float16")
+        kwargs = []
+        for key, value in sorted(selector_kwargs.items()):
+            if isinstance(value, IVFIndex):
+                value = f"ivf/{len(value)}/{value.num_lists}"
+            kwargs.append(f"{key}={value!r}")
+        return hash_key(
+            dataset, task, str(candidate_size), str(num_prompt), fingerprint, *kwargs
+        )
+
+    @property
+    def train_data(self):
+        return self.selector.train_data
+
+    def rank(self, test_data: dict):
+        return self.selector.rank(test_data)
+
+    def select(self, test_data: dict, shuffle: bool = None):
+        return self.selector.select(test_data, shuffle)
+
+    @property
+    def shuffle(self):
+        return self.selector.shuffle
+
+    def __call__(self, test_data: dict):
+        return self.selector(test_data)
+
+    def __len__(self):
+        return len(self.selector.train_data)
+
+    def __getstate__(self):
+        selector = copy.copy(self.selector)
+        selector.train_data = None
+        if getattr(selector, "index", None) is not None:
+            # exact-search matrix is rebuilt from the split if ever needed
+            selector._train_embeddings = None
+        if hasattr(selector, "index"):
+            selector.index = None
+        return {**self.__dict__, "selector": selector}
+
+    def attach(self, train_data: list, index: IVFIndex = None):
+        """
+        Reattaches the train split (and ANN index) the pickle leaves out.
+        """
+        selector = self.selector
+        if selector.candidate_size > 0:
+            selector.train_data = [train_data[i] for i in selector.train_positions]
+        else:
+            selector.train_data = train_data
+        if hasattr(selector, "index"):
+            selector.index = index if selector.candidate_size <= 0 else None
+        return self
+
+    def save(self, filename: str):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        with open(filename + ".tmp", "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + ".tmp", filename)
+
+    @classmethod
+    def load(cls, filename: str, train_data: list = None, index: IVFIndex = None):
+        """
+        Without `train_data`, the index comes back detached, e.g. to check its
+        `config_key` before `attach`.
+        """
+        with open(filename, "rb") as f:
+            exemplar_index = pickle.load(f)
+        if not isinstance(exemplar_index, cls):
+            raise TypeError(f"{filename} does not contain an {cls.__name__}")
+        if train_data is None:
+            return exemplar_index
+        return exemplar_index.attach(train_data, index)
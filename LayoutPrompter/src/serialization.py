@@ -1,3 +1,8 @@
+import json
+import os
+import random
+
+from .cache import hash_key
 from .transforms import RelationTypes
 from .utilities import CANVAS_SIZE, ID2LABEL, LAYOUT_DOMAIN
 
@@ -49,6 +54,20 @@ class Serializer:
         self.add_unk_token = add_unk_token
         self.unk_token = unk_token
 
+    def config_key(self):
+        """
+        Hash of everything that changes the serialized strings.
+        """
+        return hash_key(
+            self.__class__.__name__,
+            self.input_format,
+            self.output_format,
+            json.dumps(sorted(self.index2label.items())),
+            f"{self.canvas_width}x{self.canvas_height}",
+            f"{self.add_index_token}/{self.add_sep_token}/{self.sep_token}",
+            f"{self.add_unk_token}/{self.unk_token}",
+        )
+
     def build_input(self, data):
         if self.input_format == "seq":
             return self._build_seq_input(data)
@@ -450,6 +469,76 @@ def create_serializer(
     return serializer
 
 
+class SerializedExemplars:
+    """
+    `build_input`/`build_output` strings of every train item for one serializer
+    config, computed once and saved next to the processed split, so prompt
+    assembly only looks them up.
+    """
+
+    def __init__(self, config_key: str, inputs: list, outputs: list):
+        self.config_key = config_key
+        self.inputs = inputs
+        self.outputs = outputs
+        self._token_counts = {}
+
+    def __len__(self):
+        return len(self.inputs)
+
+    @classmethod
+    def build(cls, serializer, train_data):
+        inputs, outputs = [], []
+        for data in train_data:
+            inputs.append(serializer.build_input(data))
+            outputs.append(serializer.build_output(data))
+        return cls(serializer.config_key(), inputs, outputs)
+
+    def samples(self, positions, separator_in_samples="\n"):
+        return [
+            self.inputs[i] + separator_in_samples + self.outputs[i] for i in positions
+        ]
+
+    def token_counts(self, count_tokens, separator_in_samples="\n"):
+        """
+        Tokens of every serialized sample under `count_tokens`, counted once
+        per counter.
+        """
+        key = (getattr(count_tokens, "name", repr(count_tokens)), separator_in_samples)
+        if key not in self._token_counts:
+            self._token_counts[key] = [
+                count_tokens(sample)
+                for sample in self.samples(range(len(self)), separator_in_samples)
+            ]
+        return self._token_counts[key]
+
+    @staticmethod
+    def filename(data_filename: str, serializer):
+        return (
+            os.path.splitext(data_filename)[0]
+            + f".serialized-{serializer.config_key()[:16]}.json"
+        )
+
+    def save(self, filename: str):
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(
+                {
+                    "config_key": self.config_key,
+                    "inputs": self.inputs,
+                    "outputs": self.outputs,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def load(cls, filename: str):
+        with open(filename, "r") as f:
+            saved = json.load(f)
+        return cls(saved["config_key"], saved["inputs"], saved["outputs"])
+
+
 def build_prompt(
     serializer,
     exemplars,
@@ -459,25 +548,142 @@ def build_prompt(
     separator_in_samples="\n",
     separator_between_samples="\n\n",
 ):
+    # a generator, so exemplars past the length cutoff are never serialized
+    samples = (
+        serializer.build_input(exemplar)
+        + separator_in_samples
+        + serializer.build_output(exemplar)
+        for exemplar in exemplars
+    )
+    return build_prompt_from_samples(
+        serializer,
+        samples,
+        test_data,
+        dataset,
+        max_length=max_length,
+        separator_in_samples=separator_in_samples,
+        separator_between_samples=separator_between_samples,
+    )
+
+
+def build_prompt_from_samples(
+    serializer,
+    samples,
+    test_data,
+    dataset,
+    max_length=8000,
+    separator_in_samples="\n",
+    separator_between_samples="\n\n",
+):
+    """
+    `build_prompt` for exemplars that are already serialized (e.g. from
+    `SerializedExemplars.samples`). Samples are kept while the prompt so far
+    plus the next sample fits in `max_length`, tracked with a running length
+    instead of re-joining the prompt for every sample.
+    """
     prompt = [
         PREAMBLE.format(
             serializer.task_type, LAYOUT_DOMAIN[dataset], *CANVAS_SIZE[dataset]
         )
     ]
-    for i in range(len(exemplars)):
-        _prompt = (
-            serializer.build_input(exemplars[i])
-            + separator_in_samples
-            + serializer.build_output(exemplars[i])
-        )
-        if len(separator_between_samples.join(prompt) + _prompt) <= max_length:
-            prompt.append(_prompt)
+    length = len(prompt[0])
+    for sample in samples:
+        if length + len(sample) <= max_length:
+            prompt.append(sample)
+            length += len(separator_between_samples) + len(sample)
         else:
             break
     prompt.append(serializer.build_input(test_data) + separator_in_samples)
     return separator_between_samples.join(prompt)
 
 
+def fit_samples(
+    serializer,
+    samples,
+    dataset,
+    max_length=8000,
+    max_samples=None,
+    separator_between_samples="\n\n",
+):
+    """
+    Indices of `samples` (best first) that `build_prompt_from_samples` keeps
+    under `max_length`, whatever order they are then put in. A sample that
+    does not fit is skipped rather than ending the prompt, so a long
+    exemplar never pushes out the ones ranked above it.
+    """
+    length = len(
+        PREAMBLE.format(serializer.task_type, LAYOUT_DOMAIN[dataset], *CANVAS_SIZE[dataset])
+    )
+    kept = []
+    for k, sample in enumerate(samples):
+        if max_samples is not None and len(kept) >= max_samples:
+            break
+        if length + len(sample) <= max_length:
+            kept.append(k)
+            length += len(separator_between_samples) + len(sample)
+    return kept
+
+
+def build_prompt_with_budget(
+    serializer,
+    samples,
+    test_data,
+    dataset,
+    token_budget,
+    count_tokens,
+    sample_tokens=None,
+    max_samples=None,
+    shuffle=False,
+    arrange=None,
+    separator_in_samples="\n",
+    separator_between_samples="\n\n",
+):
+    """
+    Token-budgeted `build_prompt_from_samples`. `samples` are in priority
+    order (best exemplar first). Each one is kept if it still fits in
+    `token_budget` next to the preamble, the test input and the samples
+    kept so far. A sample that does not fit is skipped, so shorter, lower
+    ranked samples can still fill the budget. At most `max_samples` are
+    kept, and `shuffle` shuffles the kept ones as the selectors do.
+    `arrange` (kept indices -> reordered indices) replaces the shuffle, e.g.
+    for a prefix-cache-friendly order.
+
+    Args:
+        count_tokens callable: str -> number of tokens (see src/tokens.py)
+        sample_tokens list: precomputed `count_tokens(sample)` per sample,
+            e.g. from `SerializedExemplars.token_counts`
+
+    Returns:
+        prompt str
+        kept list: indices into `samples`, in prompt order
+        prompt_tokens int: `count_tokens(prompt)`
+    """
+    preamble = PREAMBLE.format(
+        serializer.task_type, LAYOUT_DOMAIN[dataset], *CANVAS_SIZE[dataset]
+    )
+    test_input = serializer.build_input(test_data) + separator_in_samples
+    separator_tokens = count_tokens(separator_between_samples)
+    used = count_tokens(preamble) + separator_tokens + count_tokens(test_input)
+
+    kept = []
+    for k, sample in enumerate(samples):
+        if max_samples is not None and len(kept) >= max_samples:
+            break
+        tokens = sample_tokens[k] if sample_tokens is not None else count_tokens(sample)
+        if used + separator_tokens + tokens <= token_budget:
+            kept.append(k)
+            used += separator_tokens + tokens
+    if arrange is not None:
+        kept = arrange(kept)
+    elif shuffle:
+        random.shuffle(kept)
+
+    prompt = separator_between_samples.join(
+        [preamble] + [samples[k] for k in kept] + [test_input]
+    )
+    return prompt, kept, count_tokens(prompt)
+
+
 if __name__ == "__main__":
     import torch
 
@@ -0,0 +1,68 @@
+import re
+
+
+class ApproxTokenCounter:
+    """
+    Offline estimate of BPE token counts for OpenAI chat models: an ASCII word
+    is one token per `chars_per_token` letters (a leading space is absorbed
+    by the word), digits go in groups of three, other letters (e.g. Hangul)
+    and every punctuation mark count one token each, and a run of newlines
+    is one token. It errs on the high side for markup, which keeps budgets
+    safe.
+    """
+
+    name = "approx"
+    pattern = re.compile(r"[A-Za-z]+|\d{1,3}|\n+|[^\W\d_]|[^\s\w]|_")
+
+    def __init__(self, chars_per_token: int = 8):
+        self.chars_per_token = chars_per_token
+
+    def __call__(self, text: str):
+        count = 0
+        for match in self.pattern.finditer(text):
+            token = match.group()
+            if token[0].isascii() and token[0].isalpha():
+                count += 1 + (len(token) - 1) // self.chars_per_token
+            else:
+                count += 1
+        return count
+
+
+class TiktokenCounter:
+    """
+    Exact counts with `tiktoken` (optional dependency, imported on first use).
+    """
+
+    name = "tiktoken"
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+        self._encoding = None
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            try:
+                import tiktoken
+            except ImportError as e:
+                raise ImportError(
+                    "TiktokenCounter needs tiktoken: pip install tiktoken"
+                ) from e
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+        return self._encoding
+
+    def __call__(self, text: str):
+        return len(self.encoding.encode(text))
+
+
+TOKEN_COUNTER_MAP = {
+    "approx": ApproxTokenCounter,
+    "tiktoken": TiktokenCounter,
+}
+
+
+def create_token_counter(name: str = "approx", *args, **kwargs):
+    return TOKEN_COUNTER_MAP[name](*args, **kwargs)
@@ -1,14 +1,86 @@
 import copy
 import math
 import random
-from itertools import combinations, product
+import threading
 
-import clip
-import cv2
 import numpy as np
 import torch
 
-from .utilities import decapulate, detect_loc_relation, detect_size_relation
+from .cache import TwoLevelCache, hash_key
+from .utilities import decapulate
+
+# per-element fields the sorts permute together
+ELEMENT_KEYS = ("bboxes", "gold_bboxes", "labels")
+# per-element fields of `pad_layouts` batches, with their own lengths
+RAGGED_KEYS = ELEMENT_KEYS + ("content_bboxes",)
+
+
+def _pad(tensors, lengths):
+    padded = tensors[0].new_zeros((len(tensors), int(lengths.max())) + tensors[0].shape[1:])
+    for b, tensor in enumerate(tensors):
+        padded[b, : len(tensor)] = tensor
+    return padded
+
+
+def pad_layouts(data_list: list):
+    """
+    Stacks layouts into a batch for the transforms' `batch` methods. Per-element
+    fields are zero-padded to the longest layout, and `lengths` records the
+    valid prefix of each (content boxes get `content_lengths`). Other fields
+    are kept per item, uncopied, in `items`.
+    """
+    batch = {"ragged": {}, "items": [dict(data) for data in data_list]}
+    lengths = torch.tensor([len(data["labels"]) for data in data_list])
+    for key in RAGGED_KEYS:
+        if key not in data_list[0]:
+            continue
+        key_lengths = lengths
+        if key == "content_bboxes":
+            key_lengths = torch.tensor([len(data[key]) for data in data_list])
+        batch[key] = _pad([torch.as_tensor(data[key]) for data in data_list], key_lengths)
+        batch["ragged"][key] = key_lengths
+        for item in batch["items"]:
+            del item[key]
+    return batch
+
+
+def unpad_layouts(batch: dict):
+    """
+    Inverse of `pad_layouts`: one dict per layout, each field a compact copy.
+    """
+    items = [dict(item) for item in batch["items"]]
+    for key, lengths in batch["ragged"].items():
+        for b, item in enumerate(items):
+            item[key] = batch[key][b, : lengths[b]].clone()
+    return items
+
+
+def _permute(batch, perm):
+    rows = torch.arange(len(perm)).unsqueeze(1)
+    for key in ELEMENT_KEYS:
+        if key in batch:
+            batch[key] = batch[key][rows, perm]
+    return batch
+
+
+def _add_gold_bboxes(batch):
+    if "gold_bboxes" not in batch:
+        batch["gold_bboxes"] = batch["bboxes"].clone()
+        batch["ragged"]["gold_bboxes"] = batch["ragged"]["bboxes"]
+
+
+def _stable_argsort(keys, lengths):
+    """
+    Stable lexicographic argsort over the valid prefix of each row (`keys`
+    from most to least significant); padding stays at the end.
+    """
+    size = keys[0].shape[1]
+    valid = torch.arange(size).unsqueeze(0) < lengths.unsqueeze(1)
+    perm = torch.arange(size).repeat(len(lengths), 1)
+    for key in list(reversed(keys)) + [(~valid).long()]:
+        order = torch.sort(torch.gather(key, 1, perm), dim=1, stable=True).indices
+        perm = torch.gather(perm, 1, order)
+    return perm
 
 
 class ShuffleElements:
@@ -24,6 +96,17 @@ class ShuffleElements:
         data["labels"] = data["labels"][shuffle_idx]
         return data
 
+    def batch(self, batch):
+        _add_gold_bboxes(batch)
+        lengths = batch["ragged"]["labels"]
+        perm = torch.arange(batch["labels"].shape[1]).repeat(len(lengths), 1)
+        # one shuffle per layout, in order, so `random` advances as in __call__
+        for b, ele_num in enumerate(lengths.tolist()):
+            shuffle_idx = np.arange(ele_num)
+            random.shuffle(shuffle_idx)
+            perm[b, :ele_num] = torch.from_numpy(shuffle_idx)
+        return _permute(batch, perm)
+
 
 class LabelDictSort:
     """
@@ -32,6 +115,7 @@ class LabelDictSort:
 
     def __init__(self, index2label=None):
         self.index2label = index2label
+        self._rank_table = None
 
     def __call__(self, data):
         # NOTE: for refinement
@@ -49,6 +133,31 @@ class LabelDictSort:
         data["gold_bboxes"] = data["gold_bboxes"][idx_sorted]
         return data
 
+    @property
+    def rank_table(self):
+        """
+        label index -> position of its name in sorted order, -1 for unknown indices
+        """
+        if self._rank_table is None:
+            names = sorted(set(self.index2label.values()))
+            table = torch.full((max(self.index2label) + 1,), -1, dtype=torch.long)
+            for index, name in self.index2label.items():
+                table[index] = names.index(name)
+            self._rank_table = table
+        return self._rank_table
+
+    def batch(self, batch):
+        _add_gold_bboxes(batch)
+        labels, lengths = batch["labels"].long(), batch["ragged"]["labels"]
+        table = self.rank_table
+        valid = torch.arange(labels.shape[1]).unsqueeze(0) < lengths.unsqueeze(1)
+        known = (labels >= 0) & (labels < len(table))
+        ranks = torch.where(known, table[labels.clamp(0, len(table) - 1)], -1)
+        unknown = valid & (ranks < 0)
+        if unknown.any():
+            raise KeyError(int(labels[unknown][0]))
+        return _permute(batch, _stable_argsort([ranks], lengths))
+
 
 class LexicographicSort:
     """
@@ -66,6 +175,14 @@ class LexicographicSort:
         data["gold_bboxes"] = data["gold_bboxes"][idx]
         return data
 
+    def batch(self, batch):
+        _add_gold_bboxes(batch)
+        lengths = batch["ragged"]["labels"]
+        batch["ori_bboxes"], batch["ori_labels"] = batch["gold_bboxes"], batch["labels"]
+        batch["ragged"]["ori_bboxes"] = batch["ragged"]["ori_labels"] = lengths
+        l, t = batch["bboxes"][..., 0], batch["bboxes"][..., 1]
+        return _permute(batch, _stable_argsort([t, l], lengths))
+
 
 class AddGaussianNoise:
     """
@@ -186,6 +303,14 @@ class DiscretizeBoundingBox:
             data["discrete_content_bboxes"] = self.discretize(data["content_bboxes"])
         return data
 
+    def batch(self, batch):
+        _add_gold_bboxes(batch)
+        for key in ("bboxes", "gold_bboxes", "content_bboxes"):
+            if key in batch:
+                batch[f"discrete_{key}"] = self.discretize(batch[key])
+                batch["ragged"][f"discrete_{key}"] = batch["ragged"][key]
+        return batch
+
 
 class AddCanvasElement:
     def __init__(self, use_discrete=False, discrete_fn=None):
@@ -205,6 +330,20 @@ class AddCanvasElement:
         data["labels_with_canvas"] = torch.cat([self.y, data["labels"]], dim=0)
         return data
 
+    def batch(self, batch):
+        size = len(batch["labels"])
+        if self.use_discrete:
+            bboxes = self.discrete_fn.continuize(batch["discrete_gold_bboxes"])
+        else:
+            bboxes = batch["bboxes"]
+        batch["bboxes_with_canvas"] = torch.cat([self.x.expand(size, 1, 4), bboxes], dim=1)
+        batch["labels_with_canvas"] = torch.cat(
+            [self.y.expand(size, 1), batch["labels"]], dim=1
+        )
+        lengths = batch["ragged"]["labels"] + 1
+        batch["ragged"]["bboxes_with_canvas"] = batch["ragged"]["labels_with_canvas"] = lengths
+        return batch
+
 
 class AddRelation:
     def __init__(self, seed=1024, ratio=0.1):
@@ -220,44 +359,97 @@ class AddRelation:
         )
         N = len(data["labels_with_canvas"])
 
-        rel_all = list(product(range(2), combinations(range(N), 2)))
-        # size = min(int(len(rel_all)                     * self.ratio), 10)
-        size = int(len(rel_all) * self.ratio)
-        rel_sample = set(self.generator.sample(rel_all, size))
-
-        relations = []
-        for i, j in combinations(range(N), 2):
-            bi, bj = data["bboxes_with_canvas"][i], data["bboxes_with_canvas"][j]
-            canvas = data["labels_with_canvas"][i] == 0
-
-            if ((0, (i, j)) in rel_sample) and (not canvas):
-                rel_size = detect_size_relation(bi, bj)
-                relations.append(
-                    [
-                        data["labels_with_canvas"][i],
-                        data["labels_with_canvas_index"][i],
-                        data["labels_with_canvas"][j],
-                        data["labels_with_canvas_index"][j],
-                        self.type2index[rel_size],
-                    ]
-                )
-
-            if (1, (i, j)) in rel_sample:
-                rel_loc = detect_loc_relation(bi, bj, canvas)
-                relations.append(
-                    [
-                        data["labels_with_canvas"][i],
-                        data["labels_with_canvas_index"][i],
-                        data["labels_with_canvas"][j],
-                        data["labels_with_canvas_index"][j],
-                        self.type2index[rel_loc],
-                    ]
-                )
-
-        data["relations"] = torch.as_tensor(relations).long()
-
+        # rel_all = list(product(range(2), combinations(range(N), 2))) is never
+        # built: sample() draws the same positions from a range of its length
+        pair_i, pair_j = np.triu_indices(N, k=1)
+        num_pairs = len(pair_i)
+        size = int(2 * num_pairs * self.ratio)
+        sample = np.array(
+            self.generator.sample(range(2 * num_pairs), size), dtype=np.int64
+        )
+        kind, pair = np.divmod(sample, max(num_pairs, 1))
+        # emitted pair by pair in combination order, size before location
+        order = np.argsort(pair * 2 + kind)
+        kind, i, j = kind[order], pair_i[pair[order]], pair_j[pair[order]]
+
+        labels = torch.as_tensor(data["labels_with_canvas"]).long().numpy()
+        canvas = labels[i] == 0
+        keep = (kind == 1) | ~canvas
+        kind, i, j, canvas = kind[keep], i[keep], j[keep], canvas[keep]
+
+        # same float dtype as the tensors the detect_* helpers compared
+        bboxes = torch.as_tensor(data["bboxes_with_canvas"]).numpy()
+        rel = np.where(
+            kind == 0,
+            self._size_relations(bboxes[i], bboxes[j]),
+            self._loc_relations(bboxes[i], bboxes[j], canvas),
+        )
+        if (rel < 0).any():
+            k = np.flatnonzero(rel < 0)[0]
+            raise RuntimeError(bboxes[i[k]], bboxes[j[k]], bool(canvas[k]))
+
+        if len(rel) == 0:
+            data["relations"] = torch.as_tensor([]).long()
+            return data
+        index = np.maximum(np.arange(N) - 1, 0)
+        data["relations"] = torch.from_numpy(
+            np.stack([labels[i], index[i], labels[j], index[j], rel], axis=1)
+        )
         return data
 
+    def _size_relations(self, b1, b2):
+        """
+        `detect_size_relation` over rows of b1, b2; -1 where it would raise.
+        """
+        REL_SIZE_ALPHA = 0.1
+        a1, a2 = b1[:, 2] * b1[:, 3], b2[:, 2] * b2[:, 3]
+        a1_sm = (1 - REL_SIZE_ALPHA) * a1
+        a1_lg = (1 + REL_SIZE_ALPHA) * a1
+        return self._select(
+            [
+                (a2 <= a1_sm, "smaller"),
+                ((a1_sm < a2) & (a2 < a1_lg), "equal"),
+                (a1_lg <= a2, "larger"),
+            ]
+        )
+
+    def _loc_relations(self, b1, b2, canvas):
+        """
+        `detect_loc_relation` over rows of b1, b2; -1 where it would raise.
+        """
+        yc = b2[:, 1] + b2[:, 3] / 2
+        y_sm, y_lg = 1.0 / 3, 2.0 / 3
+        on_canvas = self._select(
+            [
+                (yc <= y_sm, "top"),
+                ((y_sm < yc) & (yc < y_lg), "center"),
+                (y_lg <= yc, "bottom"),
+            ]
+        )
+
+        l1, t1 = b1[:, 0], b1[:, 1]
+        r1, bt1 = l1 + b1[:, 2], t1 + b1[:, 3]
+        l2, t2 = b2[:, 0], b2[:, 1]
+        r2, bt2 = l2 + b2[:, 2], t2 + b2[:, 3]
+        overlap_y = (t1 < bt2) & (t2 < bt1)
+        between = self._select(
+            [
+                (bt2 <= t1, "top"),
+                (bt1 <= t2, "bottom"),
+                (overlap_y & (r2 <= l1), "left"),
+                (overlap_y & (r1 <= l2), "right"),
+                (overlap_y & (l1 < r2) & (l2 < r1), "center"),
+            ]
+        )
+        return np.where(canvas, on_canvas, between)
+
+    def _select(self, conditions):
+        # first matching condition wins, like the if-chains of the detect_* helpers
+        rel = np.full(len(conditions[0][0]), -1, dtype=np.int64)
+        for condition, name in reversed(conditions):
+            rel = np.where(condition, self.type2index[name], rel)
+        return rel
+
 
 class RelationTypes:
     types = ["smaller", "equal", "larger", "top", "center", "bottom", "left", "right"]
@@ -303,6 +495,8 @@ class SaliencyMapToBBoxes:
         )
 
     def __call__(self, saliency_map):
+        import cv2
+
         saliency_map_gray = cv2.cvtColor(saliency_map, cv2.COLOR_BGR2GRAY)
         _, thresholded_map = cv2.threshold(
             saliency_map_gray, self.threshold, 255, cv2.THRESH_BINARY
@@ -323,14 +517,101 @@ class SaliencyMapToBBoxes:
 
 
 class CLIPTextEncoder:
+    """
+    `clip` and the model weights are loaded on first use (or by `warmup`), so
+    constructing the encoder is cheap.
+    """
+
     def __init__(self, model_name: str = "ViT-B/32"):
         self.model_name = model_name
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model, self.proprocess = clip.load(self.model_name, self.device)
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                import clip
+
+                self._model, self.proprocess = clip.load(self.model_name, self.device)
+            return self._model
+
+    def warmup(self):
+        self("warm up")
 
     @torch.no_grad()
     def __call__(self, text: str):
+        import clip
+
         token = clip.tokenize(text, truncate=True).to(self.device)
         text_feature = self.model.encode_text(token)
         text_feature /= text_feature.norm(dim=-1, keepdim=True)
         return text_feature
+
+    @torch.no_grad()
+    def encode_batch(self, texts: list, batch_size: int = 64):
+        """
+        Encodes `texts` `batch_size` at a time. CLIP pads every text to the same
+        context length, so each row matches `self(text)` up to float tolerance.
+        """
+        import clip
+
+        text_features = []
+        for i in range(0, len(texts), batch_size):
+            tokens = clip.tokenize(texts[i : i + batch_size], truncate=True)
+            text_feature = self.model.encode_text(tokens.to(self.device))
+            text_feature /= text_feature.norm(dim=-1, keepdim=True)
+            text_features.append(text_feature)
+        return torch.cat(text_features)
+
+
+class CachedTextEncoder:
+    """
+    Wraps a text encoder with a (memory, optional disk) embedding cache keyed
+    by a hash of the model name and the text. Callers pass the already
+    cleaned text, so retries and resubmits of the same prompt skip the
+    forward pass. `encode_batch` (offline preprocessing) bypasses the cache
+    so the train split does not evict query embeddings.
+    """
+
+    def __init__(self, encoder, cache: TwoLevelCache):
+        self.encoder = encoder
+        self.cache = cache
+
+    @property
+    def model_name(self):
+        return self.encoder.model_name
+
+    def __call__(self, text: str):
+        key = hash_key(self.model_name, text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return torch.from_numpy(cached.copy()).to(self.encoder.device)
+        text_feature = self.encoder(text)
+        self.cache.put(key, text_feature.cpu().numpy())
+        return text_feature
+
+    def encode_batch(self, texts: list, batch_size: int = 64):
+        return self.encoder.encode_batch(texts, batch_size)
+
+    def encode_many(self, texts: list, batch_size: int = 64):
+        """
+        `encode_batch` for query texts: cached texts are looked up, the rest are
+        encoded in batches and cached.
+        """
+        keys = [hash_key(self.model_name, text) for text in texts]
+        rows = [self.cache.get(key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            encoded = self.encoder.encode_batch([texts[i] for i in missing], batch_size)
+            for i, text_feature in zip(missing, encoded.cpu().numpy()):
+                rows[i] = text_feature[None]
+                self.cache.put(keys[i], rows[i])
+        return torch.from_numpy(np.concatenate(rows)).to(self.encoder.device)
+
+    def warmup(self):
+        self.encoder.warmup()
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import threading
+import weakref
+
+import httpx
+
+from .ratelimit import RequestScheduler
+
+# read timeout (seconds) of each component's requests
+COMPONENT_TIMEOUTS = {
+    "layout": 120.0,  # LayoutPrompter chat completions, n=num_return
+    "contents": 30.0,  # structured poster contents
+    "designer": 60.0,
+    "layout_node": 60.0,
+    "drawer": 180.0,  # full HTML poster
+}
+
+# endpoints whose requests go through the scheduler
+MODEL_ENDPOINTS = ("/chat/completions", "/responses", "/completions")
+
+
+def estimate_request_tokens(request: httpx.Request):
+    """
+    Tokens a model request may use, as providers charge rate limits: about
+    4 bytes per prompt token plus the maximum output for every choice.
+    None for requests that are not model calls.
+    """
+    if request.method != "POST" or not request.url.path.endswith(MODEL_ENDPOINTS):
+        return None
+    body = request.content
+    try:
+        params = json.loads(body)
+    except ValueError:
+        params = {}
+    max_output = (
+        params.get("max_tokens")
+        or params.get("max_completion_tokens")
+        or params.get("max_output_tokens")
+        or 1024
+    )
+    return len(body) // 4 + max_output * params.get("n", 1)
+
+
+def _retry_after(response: httpx.Response):
+    if "retry-after-ms" in response.headers:
+        return float(response.headers["retry-after-ms"]) / 1000
+    try:
+        return float(response.headers.get("retry-after", 1.0))
+    except ValueError:
+        return 1.0
+
+
+def _is_json(response: httpx.Response):
+    # streamed (event-stream) responses are left unread and keep their estimate
+    return response.headers.get("content-type", "").startswith("application/json")
+
+
+def _settle(scheduler: RequestScheduler, response: httpx.Response, estimated: int):
+    """
+    Pauses the queue on a 429 (refunding the charge), else settles the
+    charge against the usage of a read JSON response.
+    """
+    if response.status_code == 429:
+        scheduler.pause(_retry_after(response))
+        scheduler.refund(estimated)
+        return
+    if not _is_json(response):
+        return
+    try:
+        usage = json.loads(response.content).get("usage") or {}
+    except ValueError:
+        return
+    if usage.get("total_tokens") is not None:
+        scheduler.settle(estimated, usage["total_tokens"])
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """
+    Passes model calls through `scheduler` before they go out, settles their
+    token charge from the reported usage and pauses the queue on a 429.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, scheduler: RequestScheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    def handle_request(self, request):
+        estimated = estimate_request_tokens(request)
+        if estimated is None:
+            return self.transport.handle_request(request)
+        self.scheduler.acquire(estimated)
+        response = self.transport.handle_request(request)
+        if _is_json(response):
+            response.read()
+        _settle(self.scheduler, response, estimated)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    """
+    `ScheduledTransport` for async clients.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: RequestScheduler):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    async def handle_async_request(self, request):
+        estimated = estimate_request_tokens(request)
+        if estimated is None:
+            return await self.transport.handle_async_request(request)
+        await self.scheduler.aacquire(estimated)
+        response = await self.transport.handle_async_request(request)
+        if _is_json(response):
+            await response.aread()
+        _settle(self.scheduler, response, estimated)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class LLMTransport:
+    """
+    One pooled HTTP transport for every LLM client in the process: the
+    LayoutPrompter pipeline, content generation and the LangGraph nodes.
+    Keep-alive connections (and their TLS sessions) are reused across
+    components, the pool is bounded by `max_connections`, and each component
+    gets its own read timeout from `timeouts`. The async pool is kept per
+    event loop, since httpx async clients cannot outlive their loop.
+
+    With a `scheduler` (see `src.ratelimit`), every model call of every
+    component is queued by priority under one set of RPM/TPM limits.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 10.0,
+        default_timeout: float = 60.0,
+        timeouts: dict = None,
+        scheduler: RequestScheduler = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.connect_timeout = connect_timeout
+        self.default_timeout = default_timeout
+        self.timeouts = {**COMPONENT_TIMEOUTS, **(timeouts or {})}
+        self.scheduler = scheduler
+        self._http_client = None
+        self._async_http_clients = weakref.WeakKeyDictionary()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def timeout(self, component: str):
+        read = self.timeouts.get(component, self.default_timeout)
+        return httpx.Timeout(read, connect=self.connect_timeout)
+
+    @property
+    def http_client(self):
+        with self._lock:
+            if self._http_client is None:
+                transport = httpx.HTTPTransport(limits=self.limits)
+                if self.scheduler is not None:
+                    transport = ScheduledTransport(transport, self.scheduler)
+                self._http_client = httpx.Client(
+                    transport=transport,
+                    timeout=httpx.Timeout(self.default_timeout, connect=self.connect_timeout),
+                    follow_redirects=True,
+                )
+            return self._http_client
+
+    def async_http_client(self):
+        """
+        The async pool of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_http_clients:
+                transport = httpx.AsyncHTTPTransport(limits=self.limits)
+                if self.scheduler is not None:
+                    transport = AsyncScheduledTransport(transport, self.scheduler)
+                self._async_http_clients[loop] = httpx.AsyncClient(
+                    transport=transport,
+                    timeout=httpx.Timeout(self.default_timeout, connect=self.connect_timeout),
+                    follow_redirects=True,
+                )
+            return self._async_http_clients[loop]
+
+    def openai(self, component: str):
+        """
+        `OpenAI` client of `component` on the shared pool.
+        """
+        from openai import OpenAI
+
+        http_client = self.http_client
+        with self._lock:
+            if component not in self._clients:
+                self._clients[component] = OpenAI(
+                    http_client=http_client, timeout=self.timeout(component)
+                )
+            return self._clients[component]
+
+    def async_openai(self, component: str):
+        """
+        `AsyncOpenAI` client of `component` on the running loop's pool.
+        """
+        from openai import AsyncOpenAI
+
+        http_client = self.async_http_client()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            if component not in clients:
+                clients[component] = AsyncOpenAI(
+                    http_client=http_client, timeout=self.timeout(component)
+                )
+            return clients[component]
+
+    def chat_model(self, component: str, **kwargs):
+        """
+        langchain `ChatOpenAI` of `component` on the shared pools.
+        """
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            http_client=self.http_client,
+            timeout=self.timeout(component),
+            **kwargs,
+        )
+
+    async def aclose(self):
+        """
+        Closes the running loop's async pool, e.g. before `asyncio.run` returns.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            http_client = self._async_http_clients.pop(loop, None)
+            self._async_clients.pop(loop, None)
+        if http_client is not None:
+            await http_client.aclose()
+
+    def close(self):
+        with self._lock:
+            http_client, self._http_client = self._http_client, None
+            self._clients.clear()
+        if http_client is not None:
+            http_client.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """
+    The process-wide transport, created on first use with default settings
+    and, when LLM_RPM and/or LLM_TPM are set, a scheduler at those limits.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            rpm, tpm = os.environ.get("LLM_RPM"), os.environ.get("LLM_TPM")
+            scheduler = None
+            if rpm or tpm:
+                scheduler = RequestScheduler(
+                    rpm=float(rpm) if rpm else None, tpm=float(tpm) if tpm else None
+                )
+            _transport = LLMTransport(scheduler=scheduler)
+        return _transport
+
+
+def configure_transport(**kwargs):
+    """
+    Replaces the process-wide transport; call before any client is created.
+    """
+    global _transport
+    with _transport_lock:
+        previous, _transport = _transport, LLMTransport(**kwargs)
+    if previous is not None:
+        previous.close()
+    return _transport
@@ -265,6 +265,25 @@ def labels_similarity(labels_1, labels_2):
     return _intersection(labels_1, labels_2) / _union(labels_1, labels_2)
 
 
+def build_label_count_matrix(labels_list, num_labels: int = None):
+    """
+    labels_list: list of 1-D label tensors, one per layout
+    counts: len(labels_list) x num_labels, counts[i, k] = occurrences of label k in layout i
+    """
+    lengths = np.array([len(labels) for labels in labels_list], dtype=np.int64)
+    if lengths.sum() == 0:
+        flat = np.zeros(0, dtype=np.int64)
+    else:
+        flat = torch.cat([torch.as_tensor(labels) for labels in labels_list]).numpy()
+    max_label = int(flat.max()) + 1 if len(flat) else 1
+    num_labels = max_label if num_labels is None else max(num_labels, max_label)
+    rows = np.repeat(np.arange(len(labels_list)), lengths)
+    counts = np.bincount(
+        rows * num_labels + flat, minlength=len(labels_list) * num_labels
+    )
+    return counts.reshape(len(labels_list), num_labels).astype(np.int32)
+
+
 def bboxes_similarity(labels_1, bboxes_1, labels_2, bboxes_2, times=2):
     """
     bboxes_1: M x 4
@@ -1,7 +1,6 @@
 import os
 
 import numpy as np
-import seaborn as sns
 import torch
 from PIL import Image, ImageDraw, ImageFont
 
@@ -59,6 +58,8 @@ class Visualizer:
     @property
     def colors(self):
         if self._colors is None:
+            import seaborn as sns
+
             n_colors = len(ID2LABEL[self.dataset]) + 1
             colors = sns.color_palette("husl", n_colors=n_colors)
             self._colors = [tuple(map(lambda x: int(x * 255), c)) for c in colors]
@@ -0,0 +1,92 @@
+import re
+
+import pytest
+import torch
+
+from benchmarks.parser_engine import LegacyParser, same, synthetic_corpus
+from src.parsing import Parser
+
+
+def html_prediction(dataset="rico"):
+    prediction, _ = synthetic_corpus(dataset, "html", 1, 0)[0]
+    lines = prediction.split("\n")
+    elements = [
+        i for i, line in enumerate(lines) if line.startswith("<div") and "canvas" not in line
+    ]
+    return lines, elements
+
+
+def drop_element(parsed, i):
+    labels, bboxes = parsed
+    keep = torch.arange(len(labels)) != i
+    return labels[keep], bboxes[keep]
+
+
+@pytest.mark.parametrize("dataset", ["rico", "webui"])
+@pytest.mark.parametrize("output_format", ["html", "seq"])
+def test_well_formed_predictions_parse_as_before(dataset, output_format):
+    corpus = synthetic_corpus(dataset, output_format, 100, 0)
+    legacy = LegacyParser(dataset, output_format)
+    parser = Parser(dataset, output_format)
+    for prediction, _ in corpus:
+        expected = legacy.parse_one(prediction)
+        assert expected is not None
+        assert same(expected, parser.parse_one(prediction)), prediction
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [
+        lambda line: re.sub(r'class="[^"]*"', 'class="unknown-element"', line),
+        lambda line: re.sub(r"height: \d+px", "height: px", line),
+        lambda line: re.sub(r" height: \d+px", "", line),
+    ],
+    ids=["unknown label", "empty value", "missing value"],
+)
+def test_malformed_element_keeps_the_valid_ones(damage):
+    lines, elements = html_prediction()
+    expected = Parser("rico", "html").parse_one("\n".join(lines))
+    lines[elements[1]] = damage(lines[elements[1]])
+    prediction = "\n".join(lines)
+
+    parsed = Parser("rico", "html").parse_one(prediction)
+    assert parsed is not None
+    assert same(parsed, drop_element(expected, 1))
+    assert Parser("rico", "html", partial=False).parse_one(prediction) is None
+
+
+def test_truncated_last_element_keeps_the_others():
+    lines, elements = html_prediction()
+    expected = Parser("rico", "html").parse_one("\n".join(lines))
+    prediction = "\n".join(lines[: elements[-1]]) + "\n" + lines[elements[-1]][:40]
+    parsed = Parser("rico", "html").parse_one(prediction)
+    assert same(parsed, drop_element(expected, len(elements) - 1))
+
+
+def test_seq_skips_unknown_labels():
+    parser = Parser("rico", "seq")
+    parsed = parser.parse_one("icon 1 2 3 4 | unknownlabel 5 6 7 8 | text 9 10 11 12")
+    assert parsed[0].tolist() == [parser.label2id["icon"], parser.label2id["text"]]
+
+
+@pytest.mark.parametrize(
+    "output_format, prediction",
+    [
+        ("html", ""),
+        ("html", "I cannot help with that."),
+        (
+            "html",
+            '<html>\n<body>\n<div class="canvas" style="left: 0px; top: 0px; '
+            'width: 90px; height: 160px"></div>\n<div class="unknown-element" '
+            'style="left: 1px; top: 2px; width: 3px; height: 4px"></div>\n'
+            '<div class="icon" style="left: 1px"></div>\n</body>\n</html>',
+        ),
+        ("seq", "unknownlabel 1 2 3 4 | icon 1 2"),
+    ],
+    ids=["empty", "no layout", "html all invalid", "seq all invalid"],
+)
+def test_all_invalid_prediction_is_dropped(output_format, prediction):
+    parser = Parser("rico", output_format)
+    assert parser.parse_one(prediction) is None
+    valid = "icon 1 2 3 4" if output_format == "seq" else "\n".join(html_prediction()[0])
+    assert len(parser([prediction, valid])) == 1
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from benchmarks.stub_server import start_stub_server
+from src.transport import LLMTransport
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server, base_url = start_stub_server(latency=0.0, chunk_delay=0.0)
+    monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def pipeline(stub):
+    from main import TextToLayoutPipeline
+
+    return TextToLayoutPipeline(dataset="webui", num_return=4, transport=LLMTransport())
+
+
+async def collect(pipeline, prompts, return_exceptions=False):
+    return [
+        result
+        async for _, result in pipeline.astream_prompts(
+            prompts, prompts, contents=False, return_exceptions=return_exceptions
+        )
+    ]
+
+
+def fail_on(pipeline, bad_prompt):
+    call = pipeline.acall_model
+
+    async def acall_model(prompt, n=None, attempt=0):
+        if prompt == bad_prompt:
+            raise ConnectionError(prompt)
+        return await call(prompt, n, attempt)
+
+    pipeline.acall_model = acall_model
+
+
+def test_unparsable_response_gives_none(stub, pipeline):
+    stub.failure_rate = 1.0
+    assert asyncio.run(collect(pipeline, ["a", "b", "c"])) == [None, None, None]
+
+
+def test_failed_call_stops_batch(pipeline):
+    fail_on(pipeline, "b")
+    with pytest.raises(ConnectionError):
+        asyncio.run(collect(pipeline, ["a", "b", "c"]))
+
+
+def test_failed_call_returned_per_item(pipeline):
+    fail_on(pipeline, "b")
+    results = asyncio.run(collect(pipeline, ["a", "b", "c"], return_exceptions=True))
+    assert isinstance(results[1], ConnectionError)
+    assert results[0] is not None and results[2] is not None
+
+
+def test_async_runs_on_separate_loops(pipeline):
+    # no aclose in between: each asyncio.run needs a client on its own loop
+    first = asyncio.run(collect(pipeline, ["a", "b"]))
+    second = asyncio.run(collect(pipeline, ["a", "b"]))
+    assert len(first) == len(second) == 2
+    assert all(result is not None for result in first + second)
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from benchmarks.box_matching import legacy_select as legacy_box_select
+from benchmarks.box_matching import make_layouts
+from benchmarks.content_iou import legacy_scores as legacy_content_scores
+from benchmarks.content_iou import make_posters
+from benchmarks.label_selection import legacy_select as legacy_label_select
+from benchmarks.text_selection import legacy_select, make_train_data
+from src.selection import (
+    SELECTOR_MAP,
+    ContentAwareExemplarSelection,
+    TextToLayoutExemplarSelection,
+)
+
+
+def text_selector(train_data, num_prompt, **kwargs):
+    return TextToLayoutExemplarSelection(
+        train_data=train_data,
+        candidate_size=-1,
+        num_prompt=num_prompt,
+        shuffle=False,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("num_items", [100, 5000])
+def test_text_selection_matches_per_item_loop(num_items):
+    train_data = make_train_data(num_items)
+    queries = make_train_data(20, seed=1)
+    selector = text_selector(train_data, num_prompt=10)
+    for query in queries:
+        assert selector.select(query) == legacy_select(train_data, query, 10)
+
+
+def test_text_selection_breaks_ties_by_train_index():
+    train_data = make_train_data(200)
+    # exact duplicates score the same; the old stable sort keeps train order
+    for i in range(0, 200, 3):
+        train_data[i]["embedding"] = train_data[0]["embedding"].clone()
+    query = {"embedding": train_data[0]["embedding"].clone()}
+    selector = text_selector(train_data, num_prompt=30)
+    assert selector.select(query) == legacy_select(train_data, query, 30)
+    assert selector.select(query)[:5] == [0, 3, 6, 9, 12]
+
+
+def test_text_selection_float32_is_opt_in():
+    train_data = make_train_data(1000)
+    query = make_train_data(1, seed=1)[0]
+    selector = text_selector(train_data, num_prompt=10, score_dtype="float32")
+    assert selector.train_embeddings.dtype == np.float32
+    assert len(selector.select(query)) == 10
+    with pytest.raises(ValueError):
+        text_selector(train_data, num_prompt=10, score_dtype="bfloat16")
+
+
+@pytest.mark.parametrize("task", ["gents", "completion", "refinement"])
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_box_matching_matches_per_item_loop(task, num_workers):
+    train_data = make_layouts(400)
+    queries = make_layouts(4, seed=1)
+    selector = SELECTOR_MAP[task](
+        train_data=train_data,
+        candidate_size=-1,
+        num_prompt=10,
+        shuffle=False,
+        num_workers=num_workers,
+    )
+    try:
+        for query in queries:
+            expected = legacy_box_select(selector, query)
+            assert [id(x) for x in selector(query)] == [id(x) for x in expected]
+    finally:
+        selector.engine.close()
+
+
+@pytest.mark.parametrize("task", ["gent", "genr"])
+@pytest.mark.parametrize("max_elements", [3, 8, 25])
+def test_label_selection_matches_per_item_loop(task, max_elements):
+    # few elements per layout give many tied scores
+    train_data = make_layouts(2000, max_elements=max_elements)
+    queries = make_layouts(10, max_elements=max_elements, seed=1)
+    selector = SELECTOR_MAP[task](
+        train_data=train_data, candidate_size=-1, num_prompt=10, shuffle=False
+    )
+    for query in queries:
+        expected = legacy_label_select(selector, query)
+        assert [id(x) for x in selector(query)] == [id(x) for x in expected]
+
+
+@pytest.mark.parametrize("iou_mode", ["mask", "box"])
+def test_content_iou_matches_rasterized_loop(iou_mode):
+    train_data = make_posters(300)
+    queries = make_posters(5, seed=1)
+    selector = ContentAwareExemplarSelection(
+        train_data=train_data,
+        candidate_size=-1,
+        num_prompt=10,
+        shuffle=False,
+        iou_mode=iou_mode,
+    )
+    for query in queries:
+        content = query["discrete_content_bboxes"]
+        if iou_mode == "mask":
+            scores = selector._mask_scores(content)
+        else:
+            scores = selector._box_scores(content)
+        np.testing.assert_array_equal(scores, legacy_content_scores(selector, query))
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+import torch
+
+from benchmarks.batched_transforms import TASKS, make_layouts
+from benchmarks.relations import legacy_relations
+from benchmarks.relations import make_layouts as make_relation_layouts
+from src.preprocess import create_processor
+from src.transforms import AddRelation
+
+
+def assert_equal(expected, got):
+    assert len(expected) == len(got)
+    for a, b in zip(expected, got):
+        assert a.keys() == b.keys()
+        for key in a:
+            assert a[key].dtype == b[key].dtype, key
+            assert a[key].shape == b[key].shape, key
+            assert torch.equal(a[key], b[key]), key
+
+
+def process_both(dataset, task, layouts, batch_size):
+    random.seed(0)
+    torch.manual_seed(0)
+    processor = create_processor(dataset, task)
+    expected = [processor(data) for data in layouts]
+    random.seed(0)
+    torch.manual_seed(0)
+    got = create_processor(dataset, task).process_batch(layouts, batch_size=batch_size)
+    return expected, got
+
+
+@pytest.mark.parametrize("dataset", ["rico", "webui"])
+@pytest.mark.parametrize("task", TASKS)
+@pytest.mark.parametrize("batch_size", [1, 7, 64])
+def test_process_batch_matches_per_item(dataset, task, batch_size):
+    # ragged lengths from 1 to 25 elements, padded within each batch
+    layouts = make_layouts(dataset, 50, 25, seed=batch_size)
+    expected, got = process_both(dataset, task, layouts, batch_size)
+    assert_equal(expected, got)
+
+
+@pytest.mark.parametrize("task", TASKS)
+def test_process_batch_single_element_layouts(task):
+    layouts = make_layouts("rico", 20, 1)
+    expected, got = process_both("rico", task, layouts, batch_size=8)
+    assert_equal(expected, got)
+
+
+@pytest.mark.parametrize("ratio", [0.1, 0.5, 1.0])
+def test_add_relation_matches_loop(ratio):
+    layouts = make_relation_layouts(200, 25, seed=1)
+    legacy = AddRelation(seed=1024, ratio=ratio)
+    vectorized = AddRelation(seed=1024, ratio=ratio)
+    for data in layouts:
+        expected = legacy_relations(legacy, dict(data))
+        got = vectorized(dict(data))["relations"]
+        assert expected.shape == got.shape
+        assert torch.equal(expected, got)
@@ -1,12 +1,12 @@
 from typing import List, Dict, Annotated, Optional  
 from pydantic import BaseModel, Field  
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder  
-from langchain_openai import ChatOpenAI  
 from langchain_core.messages import AIMessage  
 from typing_extensions import TypedDict  
   
 from nodes.common import State, designer_tools  
 from utils import load_system_template  
+from tools.transport import get_transport
 from langgraph.graph.message import add_messages  
   
 # -------------------------------  
@@ -53,7 +53,7 @@ def designer(state: State) -> State:
     ])  
   
     # LLM 세팅 - 최신 방식으로 structured_output 사용  
-    llm = ChatOpenAI(model="gpt-4o-mini")  
+    llm = get_transport().chat_model("designer", model="gpt-4o-mini")  
       
     # designer_tools가 필요한 경우 도구 바인딩  
     if designer_tools:  
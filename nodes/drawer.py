@@ -2,10 +2,10 @@
 그리기 관련 노드 모듈
 """
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
 
 from nodes.common import State, drawer_tools
 from utils import load_system_template
+from tools.transport import get_transport
 
 
 def drawer(state: State) -> State:
@@ -58,7 +58,7 @@ def drawer(state: State) -> State:
         layout_spec=layout_spec,
         background_spec=background_spec
     )
-    llm = ChatOpenAI(model="gpt-4o-mini")
+    llm = get_transport().chat_model("drawer", model="gpt-4o-mini")
     # llm_with_tools = llm.bind_tools(drawer_tools)
     chain = prompt | llm
     
@@ -5,9 +5,9 @@ from typing import List, Dict, Optional
 from pydantic import BaseModel, Field
 from langchain_core.messages import AIMessage
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
 from nodes.common import State
 from utils import load_system_template
+from tools.transport import get_transport
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -45,7 +45,7 @@ def layout_node(state: State) -> State:
     ])  
       
     # LLM 초기화 및 구조화된 출력 설정  
-    llm = ChatOpenAI(model='gpt-4o-mini')
+    llm = get_transport().chat_model("layout_node", model='gpt-4o-mini')
     structured_llm = llm.with_structured_output(Layout)
       
     # 체인 구성: prompt -> structured_llm  
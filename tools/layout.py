@@ -5,8 +5,8 @@
 from langchain_core.tools import tool
 from typing import List, Dict
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
 from utils import load_system_template
+from tools.transport import get_transport
 
 from dotenv import load_dotenv
 
@@ -27,7 +27,7 @@ def layout_gen(query: str) -> List[Dict[str, list]]:
         MessagesPlaceholder(variable_name='messages'),
         ]
     )
-    llm = ChatOpenAI(model='gpt-4o-mini')
+    llm = get_transport().chat_model("layout_node", model='gpt-4o-mini')
     chain = prompt | llm
 
     # Invoke the chain with the query as a message
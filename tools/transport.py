@@ -0,0 +1,19 @@
+"""
+The pipeline's pooled LLM transport for the graph's nodes and tools.
+LayoutPrompter/ goes on sys.path so `src.transport` is imported under the
+name the pipeline uses: one module, so one transport, connection pool and
+rate limiter per process.
+"""
+import os
+import sys
+
+LAYOUTPROMPTER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LayoutPrompter"
+)
+
+if LAYOUTPROMPTER_DIR not in sys.path:
+    sys.path.append(LAYOUTPROMPTER_DIR)
+
+from src.transport import get_transport  # noqa: E402
+
+__all__ = ["get_transport"]